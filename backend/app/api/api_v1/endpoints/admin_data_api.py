@@ -2,12 +2,14 @@ from fastapi import APIRouter, HTTPException, UploadFile, File
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
+from contextlib import contextmanager
 import subprocess
 import time
 import os
 import re
 import json
 from app.core.config import settings
+from app.core.database import engine
 import app.services.rag_llm_recommendation_service as rag_mod
 
 router = APIRouter()
@@ -22,6 +24,47 @@ CONTEXTS_PATH = BACKEND_DIR / 'config' / 'model_contexts.json'
 _REGISTRY_CACHE = None  # type: Optional["ModelsRegistry"]
 _CONTEXTS_CACHE = None  # type: Optional[Dict[str, Any]]
 
+# 核心数据表（计数/向量覆盖统计）
+_DATA_TABLES = ('panels', 'topics', 'clinical_scenarios', 'procedure_dictionary', 'clinical_recommendations')
+
+
+def _approx_table_counts(cur) -> Dict[str, int]:
+    """按 pg_class.reltuples 读取估算行数（一次元数据查询，不扫表）；未 ANALYZE 的表回退 COUNT(*)"""
+    cur.execute(
+        "SELECT relname, reltuples::bigint FROM pg_class WHERE relname = ANY(%s) AND relkind = 'r'",
+        (list(_DATA_TABLES),),
+    )
+    approx = dict(cur.fetchall())
+    counts: Dict[str, int] = {}
+    for t in _DATA_TABLES:
+        n = approx.get(t)
+        if n is None or n < 0:
+            cur.execute(f"SELECT COUNT(*) FROM {t}")
+            n = cur.fetchone()[0]
+        counts[t] = int(n)
+    return counts
+
+
+@contextmanager
+def _pooled_cursor():
+    """从应用连接池借出 DBAPI 连接并返回游标，用完归还（不再每次请求新建 psycopg2 连接）"""
+    conn = engine.raw_connection()
+    try:
+        yield conn.cursor()
+    finally:
+        conn.close()
+
+
+def _exact_table_counts(cur) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """一次 UNION ALL 查询返回各表精确行数与 embedding 非空数 (tables, coverage)"""
+    cur.execute(
+        " UNION ALL ".join(
+            f"SELECT '{t}', COUNT(*), COUNT(embedding) FROM {t}" for t in _DATA_TABLES
+        )
+    )
+    rows = cur.fetchall()
+    return {t: int(n) for t, n, _ in rows}, {t: int(c) for t, _, c in rows}
+
 
 class ImportRequest(BaseModel):
     csv_path: Optional[str] = Field(None, description='服务器上的CSV路径（若已上传）')
@@ -115,29 +158,12 @@ async def system_status() -> Dict[str, Any]:
 
     # 数据库健康（计数与连接）
     try:
-        import psycopg2
-        cfg = {
-            'host': os.getenv('PGHOST','localhost'),
-            'port': int(os.getenv('PGPORT','5432')),
-            'database': os.getenv('PGDATABASE','acrac_db'),
-            'user': os.getenv('PGUSER','postgres'),
-            'password': os.getenv('PGPASSWORD','password'),
-        }
-        conn = psycopg2.connect(**cfg)
-        cur = conn.cursor()
-        def cnt(sql: str) -> int:
-            cur.execute(sql); return cur.fetchone()[0]
-        db = {
-            'status': 'ok',
-            'tables': {
-                'panels': cnt('SELECT COUNT(*) FROM panels'),
-                'topics': cnt('SELECT COUNT(*) FROM topics'),
-                'clinical_scenarios': cnt('SELECT COUNT(*) FROM clinical_scenarios'),
-                'procedure_dictionary': cnt('SELECT COUNT(*) FROM procedure_dictionary'),
-                'clinical_recommendations': cnt('SELECT COUNT(*) FROM clinical_recommendations'),
+        with _pooled_cursor() as cur:
+            # 健康检查只需量级，使用估算行数避免逐表全表扫描
+            db = {
+                'status': 'ok',
+                'tables': _approx_table_counts(cur),
             }
-        }
-        conn.close()
         status['db'] = db
     except Exception as e:
         status['db'] = { 'status': 'error', 'error': str(e) }
@@ -171,42 +197,16 @@ async def system_status() -> Dict[str, Any]:
 @router.get('/validate', summary='数据合规性校验（表计数、向量覆盖、孤儿推荐）')
 async def validate_data() -> Dict[str, Any]:
     try:
-        import psycopg2
-        cfg = {
-            'host': os.getenv('PGHOST','localhost'),
-            'port': int(os.getenv('PGPORT','5432')),
-            'database': os.getenv('PGDATABASE','acrac_db'),
-            'user': os.getenv('PGUSER','postgres'),
-            'password': os.getenv('PGPASSWORD','password'),
-        }
-        conn = psycopg2.connect(**cfg)
-        cur = conn.cursor()
-        def cnt(sql: str) -> int:
-            cur.execute(sql);
-            return cur.fetchone()[0]
-        tables = {
-            'panels': cnt('SELECT COUNT(*) FROM panels'),
-            'topics': cnt('SELECT COUNT(*) FROM topics'),
-            'clinical_scenarios': cnt('SELECT COUNT(*) FROM clinical_scenarios'),
-            'procedure_dictionary': cnt('SELECT COUNT(*) FROM procedure_dictionary'),
-            'clinical_recommendations': cnt('SELECT COUNT(*) FROM clinical_recommendations'),
-        }
-        coverage: Dict[str, int] = {}
-        for t in ['panels','topics','clinical_scenarios','procedure_dictionary','clinical_recommendations']:
-            try:
-                cur.execute(f"SELECT COUNT(embedding) FROM {t}")
-                coverage[t] = cur.fetchone()[0]
-            except Exception:
-                coverage[t] = 0
-        cur.execute(
-            """
-            SELECT COUNT(*) FROM clinical_recommendations cr
-            WHERE cr.scenario_id NOT IN (SELECT semantic_id FROM clinical_scenarios)
-               OR cr.procedure_id NOT IN (SELECT semantic_id FROM procedure_dictionary)
-            """
-        )
-        orphan = cur.fetchone()[0]
-        conn.close()
+        with _pooled_cursor() as cur:
+            tables, coverage = _exact_table_counts(cur)
+            cur.execute(
+                """
+                SELECT COUNT(*) FROM clinical_recommendations cr
+                WHERE cr.scenario_id NOT IN (SELECT semantic_id FROM clinical_scenarios)
+                   OR cr.procedure_id NOT IN (SELECT semantic_id FROM procedure_dictionary)
+                """
+            )
+            orphan = cur.fetchone()[0]
         return { 'tables': tables, 'embedding_coverage': coverage, 'orphan_recommendations': orphan }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -436,43 +436,16 @@ async def import_csv(req: ImportRequest) -> ImportResponse:
         # Quick compliance metrics
         metrics: Dict[str, Any] = {}
         try:
-            import psycopg2
-            cfg = {
-                'host': os.getenv('PGHOST','localhost'),
-                'port': int(os.getenv('PGPORT','5432')),
-                'database': os.getenv('PGDATABASE','acrac_db'),
-                'user': os.getenv('PGUSER','postgres'),
-                'password': os.getenv('PGPASSWORD','password'),
-            }
-            conn = psycopg2.connect(**cfg)
-            cur = conn.cursor()
-            def cnt(sql):
-                cur.execute(sql)
-                return cur.fetchone()[0]
-            metrics['tables'] = {
-                'panels': cnt('SELECT COUNT(*) FROM panels'),
-                'topics': cnt('SELECT COUNT(*) FROM topics'),
-                'clinical_scenarios': cnt('SELECT COUNT(*) FROM clinical_scenarios'),
-                'procedure_dictionary': cnt('SELECT COUNT(*) FROM procedure_dictionary'),
-                'clinical_recommendations': cnt('SELECT COUNT(*) FROM clinical_recommendations'),
-            }
-            cov = {}
-            for t in ['panels','topics','clinical_scenarios','procedure_dictionary','clinical_recommendations']:
-                try:
-                    cur.execute(f"SELECT COUNT(embedding) FROM {t}")
-                    cov[t] = cur.fetchone()[0]
-                except Exception:
-                    cov[t] = 0
-            metrics['embedding_coverage'] = cov
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM clinical_recommendations cr
-                WHERE cr.scenario_id NOT IN (SELECT semantic_id FROM clinical_scenarios)
-                   OR cr.procedure_id NOT IN (SELECT semantic_id FROM procedure_dictionary)
-                """
-            )
-            metrics['orphan_recommendations'] = cur.fetchone()[0]
-            conn.close()
+            with _pooled_cursor() as cur:
+                metrics['tables'], metrics['embedding_coverage'] = _exact_table_counts(cur)
+                cur.execute(
+                    """
+                    SELECT COUNT(*) FROM clinical_recommendations cr
+                    WHERE cr.scenario_id NOT IN (SELECT semantic_id FROM clinical_scenarios)
+                       OR cr.procedure_id NOT IN (SELECT semantic_id FROM procedure_dictionary)
+                    """
+                )
+                metrics['orphan_recommendations'] = cur.fetchone()[0]
         except Exception:
             metrics = {}
         return ImportResponse(started=True, log_path=str(log_path), command=' '.join(args), metrics=metrics)
@@ -693,16 +666,24 @@ async def check_models_connectivity(context: Optional[str] = None) -> Dict[str,
     return out
 
 
-def _update_env(text: str, key: str, value: Optional[str]) -> str:
-    pattern = re.compile(rf'^{re.escape(key)}\s*=.*$', re.M)
-    if value is None:
-        return pattern.sub('', text)
-    line = f'{key}={value}'
-    if pattern.search(text):
-        return pattern.sub(line, text)
-    if not text.endswith('\n'):
+def _update_env(text: str, updates: Dict[str, Optional[str]]) -> str:
+    """一次扫描 .env 文本应用全部更新：已有键原位替换，值为 None 的键清空该行，其余追加到末尾"""
+    if not updates:
+        return text
+    pattern = re.compile(rf"^({'|'.join(map(re.escape, updates))})\s*=.*$", re.M)
+    seen = set()
+
+    def _sub(m: 're.Match[str]') -> str:
+        key = m.group(1)
+        seen.add(key)
+        value = updates[key]
+        return '' if value is None else f'{key}={value}'
+
+    text = pattern.sub(_sub, text)
+    appended = ''.join(f'{k}={v}\n' for k, v in updates.items() if v is not None and k not in seen)
+    if appended and text and not text.endswith('\n'):
         text += '\n'
-    return text + line + '\n'
+    return text + appended
 
 
 def _load_registry() -> ModelsRegistry:
@@ -831,66 +812,45 @@ async def set_models_config(cfg: ModelsConfig) -> Dict[str, Any]:
         else:
             overrides_payload = stored_overrides
 
-        # 更新进程环境变量
+        # 需要同步到进程环境与 .env 的键值（同一份映射，避免两处维护）
         inference_for_env = updated_contexts.get('inference', {})
         evaluation_for_env = updated_contexts.get('evaluation', {})
-
-        if 'embedding_model' in inference_for_env:
-            os.environ['SILICONFLOW_EMBEDDING_MODEL'] = inference_for_env.get('embedding_model', '')
-        if 'llm_model' in inference_for_env:
-            os.environ['SILICONFLOW_LLM_MODEL'] = inference_for_env.get('llm_model', '')
-        if 'reranker_model' in inference_for_env:
-            os.environ['RERANKER_MODEL'] = inference_for_env.get('reranker_model', '')
-        if 'base_url' in inference_for_env:
-            os.environ['SILICONFLOW_BASE_URL'] = inference_for_env.get('base_url', '')
-
-        if 'llm_model' in evaluation_for_env:
-            os.environ['RAGAS_DEFAULT_LLM_MODEL'] = evaluation_for_env.get('llm_model', '')
-        if 'embedding_model' in evaluation_for_env:
-            os.environ['RAGAS_DEFAULT_EMBEDDING_MODEL'] = evaluation_for_env.get('embedding_model', '')
-        if 'base_url' in evaluation_for_env:
-            os.environ['RAGAS_DEFAULT_BASE_URL'] = evaluation_for_env.get('base_url', '')
-        if 'reranker_model' in evaluation_for_env:
-            os.environ['RAGAS_DEFAULT_RERANKER_MODEL'] = evaluation_for_env.get('reranker_model', '')
-
+        env_updates: Dict[str, Optional[str]] = {}
+        for env_key, ctx, field in (
+            ('SILICONFLOW_EMBEDDING_MODEL', inference_for_env, 'embedding_model'),
+            ('SILICONFLOW_LLM_MODEL', inference_for_env, 'llm_model'),
+            ('RERANKER_MODEL', inference_for_env, 'reranker_model'),
+            ('SILICONFLOW_BASE_URL', inference_for_env, 'base_url'),
+            ('RAGAS_DEFAULT_LLM_MODEL', evaluation_for_env, 'llm_model'),
+            ('RAGAS_DEFAULT_EMBEDDING_MODEL', evaluation_for_env, 'embedding_model'),
+            ('RAGAS_DEFAULT_BASE_URL', evaluation_for_env, 'base_url'),
+            ('RAGAS_DEFAULT_RERANKER_MODEL', evaluation_for_env, 'reranker_model'),
+        ):
+            if field in ctx:
+                env_updates[env_key] = ctx.get(field)
         if cfg.siliconflow_api_key is not None:
-            os.environ['SILICONFLOW_API_KEY'] = cfg.siliconflow_api_key
+            env_updates['SILICONFLOW_API_KEY'] = cfg.siliconflow_api_key
         if cfg.openai_api_key is not None:
-            os.environ['OPENAI_API_KEY'] = cfg.openai_api_key
+            env_updates['OPENAI_API_KEY'] = cfg.openai_api_key
         if cfg.rerank_provider is not None:
-            os.environ['RERANK_PROVIDER'] = cfg.rerank_provider
+            env_updates['RERANK_PROVIDER'] = cfg.rerank_provider
+
+        # 更新进程环境变量
+        os.environ.update({k: ('' if v is None else v) for k, v in env_updates.items()})
+
+        # 增强评估器缓存了解析后的模型环境变量，更新后使其失效
+        try:
+            from app.services.enhanced_ragas_evaluator import resolve_model_env
+            resolve_model_env.cache_clear()
+        except Exception:
+            pass
 
         # 在Docker环境中不写 .env（通过 env_file 注入），仅写入 JSON 并更新进程环境
         skip_env_write = (os.getenv('DOCKER_CONTEXT','').lower() in ('1','true','yes')) or (os.getenv('SKIP_LOCAL_DOTENV','').lower() in ('1','true','yes'))
         env_path = BACKEND_DIR / '.env'
         text = env_path.read_text(encoding='utf-8') if (env_path.exists() and not skip_env_write) else ''
-        env_updates: List[Tuple[str, Optional[str]]] = []
-        if 'embedding_model' in inference_for_env:
-            env_updates.append(('SILICONFLOW_EMBEDDING_MODEL', inference_for_env.get('embedding_model')))
-        if 'llm_model' in inference_for_env:
-            env_updates.append(('SILICONFLOW_LLM_MODEL', inference_for_env.get('llm_model')))
-        if 'reranker_model' in inference_for_env:
-            env_updates.append(('RERANKER_MODEL', inference_for_env.get('reranker_model')))
-        if 'base_url' in inference_for_env:
-            env_updates.append(('SILICONFLOW_BASE_URL', inference_for_env.get('base_url')))
-        if 'llm_model' in evaluation_for_env:
-            env_updates.append(('RAGAS_DEFAULT_LLM_MODEL', evaluation_for_env.get('llm_model')))
-        if 'embedding_model' in evaluation_for_env:
-            env_updates.append(('RAGAS_DEFAULT_EMBEDDING_MODEL', evaluation_for_env.get('embedding_model')))
-        if 'base_url' in evaluation_for_env:
-            env_updates.append(('RAGAS_DEFAULT_BASE_URL', evaluation_for_env.get('base_url')))
-        if 'reranker_model' in evaluation_for_env:
-            env_updates.append(('RAGAS_DEFAULT_RERANKER_MODEL', evaluation_for_env.get('reranker_model')))
-        if cfg.siliconflow_api_key is not None:
-            env_updates.append(('SILICONFLOW_API_KEY', cfg.siliconflow_api_key))
-        if cfg.openai_api_key is not None:
-            env_updates.append(('OPENAI_API_KEY', cfg.openai_api_key))
-        if cfg.rerank_provider is not None:
-            env_updates.append(('RERANK_PROVIDER', cfg.rerank_provider))
         if not skip_env_write:
-            for key, value in env_updates:
-                text = _update_env(text, key, value)
-            env_path.write_text(text, encoding='utf-8')
+            env_path.write_text(_update_env(text, env_updates), encoding='utf-8')
 
         _save_contexts_payload({
             'contexts': updated_contexts,
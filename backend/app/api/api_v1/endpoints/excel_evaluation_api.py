@@ -4,16 +4,17 @@ Excel评测数据处理API
 支持上传Excel文件并进行RAG评测
 """
 
+import io
 import os
 import json
 import time
-import pandas as pd
 import requests
+from openpyxl import Workbook, load_workbook
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from pathlib import Path
 from typing import Dict, List, Any, Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Body
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends, Body, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import logging
@@ -36,9 +37,42 @@ evaluation_status = {
     "total": 0,
     "current_case": None,
     "results": [],
-    "error": None
+    "error": None,
+    "version": 0  # 状态每次变化递增，供长轮询判断是否有更新
 }
 
+# 长轮询时检查状态版本的间隔（秒）
+_STATUS_POLL_INTERVAL = 0.25
+
+
+def _bump_status_version():
+    evaluation_status["version"] += 1
+
+_rag_api_session: Optional[requests.Session] = None
+
+
+def _get_rag_api_session() -> requests.Session:
+    """进程级共享的RAG API会话（连接池+重试），各次评测复用已建立的连接"""
+    global _rag_api_session
+    if _rag_api_session is None:
+        session = requests.Session()
+        retries = Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["POST"],
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _rag_api_session = session
+    return _rag_api_session
+
+
+def _cell_str(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
 class ExcelEvaluationService:
     """Excel评测服务"""
     
@@ -46,44 +80,40 @@ class ExcelEvaluationService:
         self.api_url = os.getenv("RAG_API_URL", "http://127.0.0.1:8002/api/v1/acrac/rag-llm/intelligent-recommendation")
         self.timeout = 300  # API超时时间（RAGAS评测较慢，适当放宽）
         self.db = db
-        # 复用HTTP连接，配置重试与连接池
-        self._session = requests.Session()
-        try:
-            retries = Retry(
-                total=3,
-                backoff_factor=0.5,
-                status_forcelist=[429, 500, 502, 503, 504],
-                allowed_methods=["POST"],
-            )
-            adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=retries)
-            self._session.mount('http://', adapter)
-            self._session.mount('https://', adapter)
-        except Exception:
-            pass
+        self._session = _get_rag_api_session()
         
     def parse_excel_file(self, file_content: bytes) -> List[Dict[str, Any]]:
         """解析Excel文件"""
         try:
-            # 使用pandas读取Excel
-            df = pd.read_excel(file_content)
-            
-            # 验证必需的列
-            required_columns = ['题号', '临床场景', '首选检查项目（标准化）']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                raise ValueError(f"Excel文件缺少必需的列: {missing_columns}")
-            
-            # 转换为评测数据格式
-            test_cases = []
-            for i, row in df.iterrows():
-                test_case = {
-                    "question_id": int(row['题号']),
-                    "clinical_query": str(row['临床场景']),
-                    "ground_truth": str(row['首选检查项目（标准化）']).strip('* '),
-                    "row_index": i
-                }
-                test_cases.append(test_case)
+            # 只读模式逐行流式读取，不构建完整的DataFrame
+            wb = load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+            try:
+                rows = wb.active.iter_rows(values_only=True)
+                header = [str(c) if c is not None else "" for c in next(rows, ())]
+                
+                # 验证必需的列
+                required_columns = ['题号', '临床场景', '首选检查项目（标准化）']
+                missing_columns = [col for col in required_columns if col not in header]
+                
+                if missing_columns:
+                    raise ValueError(f"Excel文件缺少必需的列: {missing_columns}")
+                
+                qid_col, query_col, gt_col = (header.index(col) for col in required_columns)
+                
+                # 转换为评测数据格式
+                test_cases = []
+                for i, row in enumerate(rows):
+                    if not row or all(v is None for v in row):
+                        continue
+                    test_case = {
+                        "question_id": int(row[qid_col]),
+                        "clinical_query": _cell_str(row[query_col]),
+                        "ground_truth": _cell_str(row[gt_col]).strip('* '),
+                        "row_index": i
+                    }
+                    test_cases.append(test_case)
+            finally:
+                wb.close()
             
             return test_cases
             
@@ -277,6 +307,7 @@ class ExcelEvaluationService:
             evaluation_status["total"] = len(test_cases)
             evaluation_status["results"] = []
             evaluation_status["error"] = None
+            _bump_status_version()
 
             try:
                 max_workers = int(os.getenv("EVAL_CONCURRENCY", "3"))
@@ -304,6 +335,7 @@ class ExcelEvaluationService:
                     results_map[idx] = res
                     evaluation_status["progress"] = len(results_map)
                     evaluation_status["current_case"] = res.get("clinical_query")
+                    _bump_status_version()
 
             # 按原顺序整理结果
             ordered = [results_map[i] for i in range(len(test_cases)) if i in results_map]
@@ -319,6 +351,7 @@ class ExcelEvaluationService:
         finally:
             evaluation_status["is_running"] = False
             evaluation_status["current_case"] = None
+            _bump_status_version()
 
 @router.post("/upload-excel")
 async def upload_excel_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
@@ -383,8 +416,15 @@ async def start_evaluation(
     }
 
 @router.get("/evaluation-status")
-async def get_evaluation_status():
-    """获取评测状态"""
+async def get_evaluation_status(
+    wait: float = Query(0, ge=0, le=30, description="长轮询最长等待秒数，0表示立即返回"),
+    since: Optional[int] = Query(None, description="客户端已知的状态版本号"),
+):
+    """获取评测状态；传入 since 与 wait 时阻塞至状态版本变化或超时再返回"""
+    if wait and since is not None:
+        deadline = time.monotonic() + wait
+        while evaluation_status["version"] == since and time.monotonic() < deadline:
+            await asyncio.sleep(_STATUS_POLL_INTERVAL)
     return evaluation_status
 
 @router.post("/stop-evaluation")
@@ -392,6 +432,7 @@ async def stop_evaluation():
     """停止评测"""
     global evaluation_status
     evaluation_status["is_running"] = False
+    _bump_status_version()
     
     return {
         "success": True,
@@ -408,6 +449,29 @@ async def get_evaluation_results():
         "completed": evaluation_status["progress"]
     }
 
+def _write_results_xlsx(results: List[Dict[str, Any]], path: Path) -> None:
+    """将评测结果写出为 Excel（write_only 模式逐行写出，不在内存中构建整张表）"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["题号", "临床场景", "标准答案", "评测状态", "模式",
+               "忠实度", "答案相关性", "上下文精确度", "上下文召回率", "错误信息"])
+    for result in results:
+        scores = result.get("ragas_scores", {})
+        ws.append([
+            result["question_id"],
+            result["clinical_query"],
+            result["ground_truth"],
+            result["status"],
+            result.get("mode", ""),
+            scores.get("faithfulness", 0),
+            scores.get("answer_relevancy", 0),
+            scores.get("context_precision", 0),
+            scores.get("context_recall", 0),
+            result.get("error", "")
+        ])
+    wb.save(path)
+
+
 @router.post("/export-results")
 async def export_results():
     """导出评测结果"""
@@ -417,32 +481,13 @@ async def export_results():
         if not results:
             raise HTTPException(status_code=400, detail="没有可导出的结果")
         
-        # 转换为DataFrame
-        df_data = []
-        for result in results:
-            row = {
-                "题号": result["question_id"],
-                "临床场景": result["clinical_query"],
-                "标准答案": result["ground_truth"],
-                "评测状态": result["status"],
-                "模式": result.get("mode", ""),
-                "忠实度": result.get("ragas_scores", {}).get("faithfulness", 0),
-                "答案相关性": result.get("ragas_scores", {}).get("answer_relevancy", 0),
-                "上下文精确度": result.get("ragas_scores", {}).get("context_precision", 0),
-                "上下文召回率": result.get("ragas_scores", {}).get("context_recall", 0),
-                "错误信息": result.get("error", "")
-            }
-            df_data.append(row)
-        
-        df = pd.DataFrame(df_data)
-        
         # 生成文件名
         timestamp = time.strftime('%Y%m%d_%H%M%S')
         filename = f"evaluation_results_{timestamp}.xlsx"
         
-        # 保存到临时目录
+        # 保存到临时目录：序列化与落盘放到线程池，后台评测任务写入的新结果不影响本次快照
         temp_path = Path("/tmp") / filename
-        df.to_excel(temp_path, index=False)
+        await asyncio.to_thread(_write_results_xlsx, list(results), temp_path)
         
         return {
             "success": True,
@@ -401,7 +401,15 @@ async def list_run_logs(
     page_size = max(1, min(100, page_size))
     db: Session = SessionLocal()
     try:
-        q = db.query(InferenceLog)
+        # 列表只展示摘要字段：按列查询，不加载 result 等大 JSON 列，也不构造 ORM 实例
+        q = db.query(
+            InferenceLog.id,
+            InferenceLog.query_text,
+            InferenceLog.success,
+            InferenceLog.inference_method,
+            InferenceLog.execution_time,
+            InferenceLog.created_at,
+        )
         # 状态过滤
         if status in ("success", "failed"):
             q = q.filter(InferenceLog.success == (status == "success"))
@@ -451,11 +459,12 @@ async def delete_run_logs(req: RunLogDeleteRequest):
         ids = list(set(req.ids or []))
         if not ids:
             return {"ok": True, "deleted": 0}
-        q = db.query(InferenceLog).filter(InferenceLog.id.in_(ids))
-        deleted = 0
-        for r in q.all():
-            db.delete(r)
-            deleted += 1
+        # 单条 DELETE ... WHERE id IN (...)，不逐行加载再删除
+        deleted = (
+            db.query(InferenceLog)
+            .filter(InferenceLog.id.in_(ids))
+            .delete(synchronize_session=False)
+        )
         db.commit()
         return {"ok": True, "deleted": deleted}
     except Exception as e:
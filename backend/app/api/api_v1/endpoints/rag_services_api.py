@@ -20,6 +20,12 @@ from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 
+try:  # orjson 为可选依赖，缺失时退回标准 JSONResponse
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # pragma: no cover
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
 import app.services.rag_llm_recommendation_service as rag_mod
 from app.services.rag.embeddings import embed_with_siliconflow
 from app.services.rag.reranker import rerank_scenarios
@@ -400,26 +406,28 @@ def _get_vector_service(db: Session = Depends(get_db)) -> VectorSearchService:
 
 
 @router.post("/search/comprehensive", response_model=ComprehensiveSearchResponse, summary="综合向量搜索（统一版）")
-async def comprehensive_search_v3(req: ComprehensiveSearchRequest, svc: VectorSearchService = Depends(_get_vector_service)) -> ComprehensiveSearchResponse:
+async def comprehensive_search_v3(req: ComprehensiveSearchRequest, svc: VectorSearchService = Depends(_get_vector_service)):
     import time as _t
     t0 = _t.time()
     try:
-        panels = svc.search_panels(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
-        topics = svc.search_topics(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
-        scenarios = svc.search_scenarios(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
-        procedures = svc.search_procedures(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
-        recommendations = svc.search_recommendations(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
+        found = await svc.asearch_all(req.query, top_k=req.top_k, similarity_threshold=req.similarity_threshold)
+        panels = found["panels"]
+        topics = found["topics"]
+        scenarios = found["scenarios"]
+        procedures = found["procedures"]
+        recommendations = found["recommendations"]
         dt = int((_t.time() - t0) * 1000)
-        return ComprehensiveSearchResponse(
-            query=req.query,
-            search_time_ms=dt,
-            panels=[PanelItem(**x) for x in panels],
-            topics=[TopicItem(**x) for x in topics],
-            scenarios=[ScenarioItemOut(**x) for x in scenarios],
-            procedures=[ProcedureItem(**x) for x in procedures],
-            recommendations=[RecommendationItem(**x) for x in recommendations],
-            total_results=len(panels)+len(topics)+len(scenarios)+len(procedures)+len(recommendations)
-        )
+        # 行字典的键已与响应模型一致，直接序列化，跳过逐行构造 Pydantic 模型
+        return FastJSONResponse({
+            "query": req.query,
+            "search_time_ms": dt,
+            "panels": panels,
+            "topics": topics,
+            "scenarios": scenarios,
+            "procedures": procedures,
+            "recommendations": recommendations,
+            "total_results": len(panels)+len(topics)+len(scenarios)+len(procedures)+len(recommendations),
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"comprehensive search failed: {e}")
 
@@ -13,7 +13,7 @@ from pathlib import Path
 from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, BackgroundTasks, Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func, text
+from sqlalchemy import and_, or_, desc, func, text, bindparam, select
 
 from app.core.database import get_db
 from app.schemas.ragas_schemas import (
@@ -25,7 +25,8 @@ from app.schemas.ragas_schemas import (
 )
 from app.models.ragas_models import EvaluationTask, ScenarioResult, EvaluationMetrics
 from app.services.ragas_service import (
-    validate_file, parse_uploaded_file, validate_test_cases, run_real_rag_evaluation as service_run_real_rag_evaluation
+    validate_file, parse_uploaded_file, validate_test_cases, run_real_rag_evaluation as service_run_real_rag_evaluation,
+    build_answer_text, build_contexts, get_rag_http_client, fetch_rag_result,
 )
 
 # 条件性导入 celery 任务，避免在没有 celery 的环境中出错
@@ -220,8 +221,8 @@ async def upload_file(
                 detail=f"文件大小超过限制: {len(content)} bytes > {MAX_FILE_SIZE} bytes"
             )
 
-        with open(file_path, 'wb') as f:
-            f.write(content)
+        # 落盘放到线程池，不阻塞事件循环
+        await asyncio.to_thread(file_path.write_bytes, content)
 
         logger.info(f"文件上传成功: {file.filename} -> {file_path}")
 
@@ -690,6 +691,43 @@ async def start_evaluation(
         logger.error(f"启动评测任务失败: {e}")
         raise HTTPException(status_code=500, detail=f"启动评测任务失败: {str(e)}")
 
+def _json_array_head(expr: str, n: int = 3) -> str:
+    """SQL：取 JSON 数组前 n 个元素（非数组返回 NULL）"""
+    return (
+        f"CASE WHEN json_typeof({expr}) = 'array' THEN "
+        f"(SELECT json_agg(e.value ORDER BY e.n) FROM json_array_elements({expr}) "
+        f"WITH ORDINALITY AS e(value, n) WHERE e.n <= {n}) END"
+    )
+
+
+def _json_array_length(expr: str) -> str:
+    return f"CASE WHEN json_typeof({expr}) = 'array' THEN json_array_length({expr}) END"
+
+
+# 任务状态轮询用：最近结果只回传预览字段，trace / evaluation_metadata 中的大 JSON 在库内截断，
+# 避免每次轮询把完整 rag_result 与 prompt 拉到应用端
+_RECENT_RESULTS_SQL = text(f"""
+    SELECT scenario_id, rag_question, clinical_scenario, standard_answer, rag_answer,
+           faithfulness_score, answer_relevancy_score, context_precision_score, context_recall_score,
+           inference_duration_ms, evaluation_duration_ms, created_at, status,
+           evaluation_metadata->>'model_name' AS model_name,
+           json_typeof(evaluation_metadata->'rag_result') = 'object' AS has_rag_result,
+           COALESCE(evaluation_metadata->'rag_result'->>'is_low_similarity_mode', 'false')
+               NOT IN ('false', 'null', '0', '') AS low_similarity_mode,
+           {_json_array_length("rag_trace_data->'recall_scenarios'")} AS recall_count,
+           {_json_array_length("rag_trace_data->'rerank_scenarios'")} AS rerank_count,
+           length(rag_trace_data->>'final_prompt') AS prompt_length,
+           left(rag_trace_data->>'final_prompt', 300) AS final_prompt_preview,
+           {_json_array_head("rag_trace_data->'recall_scenarios'")} AS recall_preview,
+           {_json_array_head("rag_trace_data->'rerank_scenarios'")} AS rerank_preview,
+           {_json_array_head("rag_trace_data->'llm_parsed'->'recommendations'")} AS llm_recommendations
+    FROM scenario_results
+    WHERE task_id = :task_id
+    ORDER BY created_at DESC
+    LIMIT 10
+""")
+
+
 @router.get("/evaluate/{task_id}/status")
 async def get_task_status(task_id: str, db: Session = Depends(get_db)):
     """获取评测任务状态（含中间过程与最近结果）"""
@@ -717,58 +755,44 @@ async def get_task_status(task_id: str, db: Session = Depends(get_db)):
             except Exception:
                 pass
 
-        # 最近结果（最多 10 条）
-        recent_q = (
-            db.query(ScenarioResult)
-            .filter(ScenarioResult.task_id == task_id)
-            .order_by(ScenarioResult.created_at.desc())
-            .limit(10)
-            .all()
-        )
+        # 最近结果（最多 10 条）：只取预览所需字段，JSON 列在库内截断后再传输
         recent_results = []
-        for r in recent_q:
+        for r in db.execute(_RECENT_RESULTS_SQL, {"task_id": task_id}).mappings():
             item = {
-                "question_id": r.scenario_id,
-                "clinical_query": r.rag_question or r.clinical_scenario,
-                "ground_truth": r.standard_answer,
-                "rag_answer": r.rag_answer,
+                "question_id": r["scenario_id"],
+                "clinical_query": r["rag_question"] or r["clinical_scenario"],
+                "ground_truth": r["standard_answer"],
+                "rag_answer": r["rag_answer"],
                 "ragas_scores": {
-                    "faithfulness": r.faithfulness_score,
-                    "answer_relevancy": r.answer_relevancy_score,
-                    "context_precision": r.context_precision_score,
-                    "context_recall": r.context_recall_score,
+                    "faithfulness": r["faithfulness_score"],
+                    "answer_relevancy": r["answer_relevancy_score"],
+                    "context_precision": r["context_precision_score"],
+                    "context_recall": r["context_recall_score"],
                 },
-                "inference_ms": r.inference_duration_ms,
-                "evaluation_ms": r.evaluation_duration_ms,
-                "created_at": r.created_at,
-                "model": (r.evaluation_metadata or {}).get("model_name") if isinstance(r.evaluation_metadata, dict) else None,
-                "status": r.status or "completed",
+                "inference_ms": r["inference_duration_ms"],
+                "evaluation_ms": r["evaluation_duration_ms"],
+                "created_at": r["created_at"],
+                "model": r["model_name"],
+                "status": r["status"] or "completed",
             }
-            # 从 trace 中提取中间过程指标
-            trace = r.rag_trace_data if isinstance(r.rag_trace_data, dict) else {}
-            rec = (trace.get("recall_scenarios") or []) if isinstance(trace, dict) else []
-            rr = (trace.get("rerank_scenarios") or []) if isinstance(trace, dict) else []
-            final_prompt = (trace.get("final_prompt") or "") if isinstance(trace, dict) else ""
-            llm_parsed = (trace.get("llm_parsed") or {}) if isinstance(trace, dict) else {}
-            llm_recs = (llm_parsed.get("recommendations") or []) if isinstance(llm_parsed, dict) else []
+            # 中间过程指标
+            llm_recs = r["llm_recommendations"] or []
             item.update({
-                "recall_count": len(rec),
-                "rerank_count": len(rr),
-                "prompt_length": len(final_prompt) if isinstance(final_prompt, str) else None,
-                "llm_recommendations": llm_recs[:3],
+                "recall_count": r["recall_count"] or 0,
+                "rerank_count": r["rerank_count"] or 0,
+                "prompt_length": r["prompt_length"] or 0,
+                "llm_recommendations": llm_recs,
             })
             # 轻量级中间过程预览，避免payload过大
             item["trace_preview"] = {
-                "recall_scenarios": rec[:3],
-                "rerank_scenarios": rr[:3],
-                "final_prompt_preview": (final_prompt or "")[:300],
-                "llm_recommendations": llm_recs[:3],
+                "recall_scenarios": r["recall_preview"] or [],
+                "rerank_scenarios": r["rerank_preview"] or [],
+                "final_prompt_preview": r["final_prompt_preview"] or "",
+                "llm_recommendations": llm_recs,
             }
             # 从元数据推断模式（RAG / no-RAG）
-            meta = r.evaluation_metadata if isinstance(r.evaluation_metadata, dict) else {}
-            rag_obj = meta.get("rag_result") if isinstance(meta, dict) else None
-            if isinstance(rag_obj, dict):
-                item["mode"] = "no-RAG" if rag_obj.get("is_low_similarity_mode") else "RAG"
+            if r["has_rag_result"]:
+                item["mode"] = "no-RAG" if r["low_similarity_mode"] else "RAG"
             recent_results.append(item)
 
         # 吞吐率（条/分钟）
@@ -805,6 +829,29 @@ async def get_task_status(task_id: str, db: Session = Depends(get_db)):
         logger.error(f"获取任务状态失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取任务状态失败: {str(e)}")
 
+# 结果详情只读取展示所需的列（不构造 ORM 实例，也不取 adapted_data 等大 JSON 列）；
+# 注意 ScenarioResult.clinical_scenario 实为关系属性，逐行访问会触发额外查询，这里不使用
+_RESULT_DETAIL_STMT = (
+    select(
+        ScenarioResult.scenario_id,
+        ScenarioResult.rag_question,
+        ScenarioResult.standard_answer,
+        ScenarioResult.faithfulness_score,
+        ScenarioResult.answer_relevancy_score,
+        ScenarioResult.context_precision_score,
+        ScenarioResult.context_recall_score,
+        ScenarioResult.rag_answer,
+        ScenarioResult.rag_contexts,
+        ScenarioResult.rag_trace_data,
+        ScenarioResult.evaluation_metadata,
+        ScenarioResult.inference_duration_ms,
+        ScenarioResult.evaluation_duration_ms,
+        ScenarioResult.created_at,
+    )
+    .where(ScenarioResult.task_id == bindparam("task_id"))
+)
+
+
 @router.get("/evaluate/{task_id}/results", response_model=TaskDetailResponse)
 async def get_task_results(task_id: str, db: Session = Depends(get_db)):
     """获取评测任务结果"""
@@ -818,7 +865,7 @@ async def get_task_results(task_id: str, db: Session = Depends(get_db)):
             raise HTTPException(status_code=400, detail=f"任务尚未完成，当前状态: {task.status}")
 
         # 获取评测结果
-        results = db.query(ScenarioResult).filter(ScenarioResult.task_id == task_id).all()
+        results = db.execute(_RESULT_DETAIL_STMT, {"task_id": task_id}).all()
 
         # 获取评测指标
         metrics = db.query(EvaluationMetrics).filter(EvaluationMetrics.task_id == task_id).first()
@@ -860,7 +907,7 @@ async def get_task_results(task_id: str, db: Session = Depends(get_db)):
             _meta = result.evaluation_metadata if isinstance(result.evaluation_metadata, dict) else {}
             evaluation_results.append({
                 "question_id": result.scenario_id or "unknown",
-                "clinical_query": result.clinical_scenario or result.rag_question or "模拟临床场景",
+                "clinical_query": result.rag_question or "模拟临床场景",
                 "ground_truth": result.standard_answer or "模拟标准答案",
                 "ragas_scores": {
                     "faithfulness": result.faithfulness_score or 0.0,
@@ -1021,51 +1068,35 @@ async def get_evaluation_history(
 async def get_evaluation_statistics(db: Session = Depends(get_db)):
     """获取评测统计信息"""
     try:
-        # 总任务数
-        total_tasks = db.query(EvaluationTask).count()
-
-        # 各状态任务数
-        status_counts = {}
-        for status in TaskStatus:
-            count = db.query(EvaluationTask).filter(EvaluationTask.status == status).count()
-            status_counts[status.value] = count
-
-        # 模型使用统计 - 从evaluation_config中提取模型信息
-        all_tasks = db.query(EvaluationTask.evaluation_config).filter(
-            EvaluationTask.evaluation_config.isnot(None)
-        ).all()
-
-        model_counts = {}
-        for (config,) in all_tasks:
-            if config and isinstance(config, dict) and 'model_name' in config:
-                model_name = config['model_name']
-                model_counts[model_name] = model_counts.get(model_name, 0) + 1
-            else:
-                model_counts['unknown'] = model_counts.get('unknown', 0) + 1
-
-        model_usage_dict = model_counts
-
-        # 最近7天的任务数
+        # 总任务数、各状态任务数、最近7天任务数、平均处理时间（分钟）合并为一条聚合查询（FILTER 子句），
+        # 一次往返取回，不加载任务行
         seven_days_ago = datetime.now() - timedelta(days=7)
-        recent_tasks = db.query(EvaluationTask).filter(
-            EvaluationTask.created_at >= seven_days_ago
-        ).count()
-
-        # 平均处理时间（已完成的任务）- 计算started_at和completed_at之间的时间差
-        completed_tasks = db.query(EvaluationTask).filter(
-            EvaluationTask.status == TaskStatus.COMPLETED,
-            EvaluationTask.started_at.isnot(None),
-            EvaluationTask.completed_at.isnot(None)
-        ).all()
-
-        if completed_tasks:
-            total_time = sum([
-                (task.completed_at - task.started_at).total_seconds() / 60  # 转换为分钟
-                for task in completed_tasks
-            ])
-            avg_processing_time = total_time / len(completed_tasks)
-        else:
-            avg_processing_time = None
+        statuses = list(TaskStatus)
+        row = db.query(
+            func.count(),
+            func.count().filter(EvaluationTask.created_at >= seven_days_ago),
+            func.avg(
+                func.extract("epoch", EvaluationTask.completed_at - EvaluationTask.started_at)
+            ).filter(
+                EvaluationTask.status == TaskStatus.COMPLETED,
+                EvaluationTask.started_at.isnot(None),
+                EvaluationTask.completed_at.isnot(None)
+            ) / 60,
+            *(func.count().filter(EvaluationTask.status == status) for status in statuses),
+        ).select_from(EvaluationTask).one()
+        total_tasks, recent_tasks, avg_processing_time = row[:3]
+        status_counts = {status.value: count for status, count in zip(statuses, row[3:])}
+
+        # 模型使用统计 - 在库内按 evaluation_config->>'model_name' 分组计数，不回传整列 JSON
+        model_name = func.coalesce(
+            EvaluationTask.evaluation_config["model_name"].as_string(), "unknown"
+        )
+        model_usage_dict = dict(
+            db.query(model_name, func.count())
+            .filter(EvaluationTask.evaluation_config.isnot(None))
+            .group_by(model_name)
+            .all()
+        )
 
         return {
             "total_tasks": total_tasks,
@@ -1089,7 +1120,7 @@ async def get_history_detail(task_id: str, db: Session = Depends(get_db)):
             raise HTTPException(status_code=404, detail=f"任务未找到: {task_id}")
 
         # 获取评测结果（如果有的话）
-        results = db.query(ScenarioResult).filter(ScenarioResult.task_id == task_id).all()
+        results = db.execute(_RESULT_DETAIL_STMT, {"task_id": task_id}).all()
 
         # 获取评测指标（如果有的话）
         metrics = db.query(EvaluationMetrics).filter(EvaluationMetrics.task_id == task_id).first()
@@ -1123,7 +1154,7 @@ async def get_history_detail(task_id: str, db: Session = Depends(get_db)):
         for result in results:
             evaluation_results.append({
                 "question_id": result.scenario_id or "unknown",
-                "clinical_query": result.clinical_scenario or result.rag_question or "模拟临床场景",
+                "clinical_query": result.rag_question or "模拟临床场景",
                 "ground_truth": result.standard_answer or "模拟标准答案",
                 "ragas_scores": {
                     "faithfulness": result.faithfulness_score or 0.0,
@@ -1284,7 +1315,18 @@ def _normalize_task_status(value: _Optional[str]):
 
 # ==================== 离线评测（基于历史推理） ====================
 from pydantic import BaseModel
-from app.models.system_models import InferenceLog
+
+# 按 ID 列表读取运行日志：expanding IN 参数使语句结构固定，编译结果可被 SQLAlchemy 缓存复用。
+# 只取 answer / contexts 所需的 JSON 子字段与 trace，不回传整个 result
+_RUNS_BY_IDS_STMT = text("""
+    SELECT l.id, l.query_text,
+           l.result->'llm_recommendations' AS llm_recommendations,
+           l.result->'scenarios' AS scenarios,
+           l.result->'trace' AS trace
+    FROM inference_logs l
+    WHERE l.id IN :ids
+    ORDER BY l.created_at ASC
+""").bindparams(bindparam("ids", expanding=True))
 
 class OfflineEvaluateRequest(BaseModel):
     run_ids: List[int]
@@ -1306,12 +1348,7 @@ async def offline_evaluate_from_runs(req: OfflineEvaluateRequest, db: Session =
             raise HTTPException(status_code=400, detail="run_ids 不能为空")
 
         # 读取运行日志
-        runs = (
-            db.query(InferenceLog)
-              .filter(InferenceLog.id.in_(run_ids))
-              .order_by(InferenceLog.created_at.asc())
-              .all()
-        )
+        runs = db.execute(_RUNS_BY_IDS_STMT, {"ids": run_ids}).all()
         if not runs:
             raise HTTPException(status_code=404, detail="未找到指定的运行记录")
 
@@ -1350,43 +1387,19 @@ async def offline_evaluate_from_runs(req: OfflineEvaluateRequest, db: Session =
         completed = 0
         failed = 0
         results: List[Dict[str, Any]] = []
+        # 增强评测器仅在首次需要回退时创建，本次请求内各样本复用（LLM/嵌入客户端与评分缓存只初始化一次）
+        enhanced = None
 
         for r in runs:
             try:
-                import json as _json
                 question = r.query_text or ""
-                raw_res = r.result
-                if isinstance(raw_res, str):
-                    try:
-                        rag_result = _json.loads(raw_res) or {}
-                    except Exception:
-                        rag_result = {}
-                elif isinstance(raw_res, dict):
-                    rag_result = raw_res
-                else:
-                    rag_result = {}
-
-                # 构造 answer（参考 app/services/ragas_service.py 的逻辑）
-                llm_recs = (rag_result or {}).get("llm_recommendations", {})
-                recs = llm_recs.get("recommendations", []) if isinstance(llm_recs, dict) else []
-                if recs:
-                    answer_text = "推荐的影像学检查：\n" + "\n".join([
-                        f"- {rec.get('procedure_name','')} (适宜性: {rec.get('appropriateness_rating','')})"
-                        for rec in recs[:3]
-                    ])
-                else:
-                    answer_text = "暂无推荐的影像学检查"
-
-                # 构造 contexts（参考 ragas_service 提取 scenarios）
-                contexts: List[str] = []
-                for sc in (rag_result or {}).get("scenarios", [])[:3]:
-                    try:
-                        ctx = f"场景: {sc.get('panel_name','')} - {sc.get('topic_name','')}"
-                        if sc.get("clinical_scenario"):
-                            ctx += f"\n临床场景: {sc['clinical_scenario']}"
-                        contexts.append(ctx)
-                    except Exception:
-                        continue
+                # 与在线评测共用 answer / contexts 的拼接逻辑
+                run_result = {
+                    "llm_recommendations": r.llm_recommendations or {},
+                    "scenarios": r.scenarios if isinstance(r.scenarios, list) else [],
+                }
+                answer_text = build_answer_text(run_result)
+                contexts: List[str] = build_contexts(run_result)
 
                 # ground truth：优先从请求提供的映射中取
                 gt = None
@@ -1422,8 +1435,9 @@ async def offline_evaluate_from_runs(req: OfflineEvaluateRequest, db: Session =
                 valid_scores_try = [v for v in ragas_scores.values() if isinstance(v, (int, float)) and v > 0]
                 if not valid_scores_try:
                     try:
-                        from app.services.enhanced_ragas_evaluator import EnhancedRAGASEvaluator, EvaluationConfig
-                        enhanced = EnhancedRAGASEvaluator(evaluation_config=EvaluationConfig())
+                        if enhanced is None:
+                            from app.services.enhanced_ragas_evaluator import EnhancedRAGASEvaluator, EvaluationConfig
+                            enhanced = EnhancedRAGASEvaluator(evaluation_config=EvaluationConfig())
                         detailed = await enhanced.evaluate_with_detailed_results({
                             "id": str(r.id),
                             "question": question,
@@ -1451,7 +1465,7 @@ async def offline_evaluate_from_runs(req: OfflineEvaluateRequest, db: Session =
                     rag_question=question,
                     rag_answer=answer_text,
                     rag_contexts=contexts,
-                    rag_trace_data=(rag_result.get("trace") if isinstance(rag_result, dict) else None) or {},
+                    rag_trace_data=r.trace if isinstance(r.trace, dict) else {},
                     standard_answer=gt,
                     faithfulness_score=ragas_scores.get("faithfulness", 0.0),
                     answer_relevancy_score=ragas_scores.get("answer_relevancy", 0.0),
@@ -1583,6 +1597,8 @@ async def run_real_rag_evaluation(
             except Exception:
                 pass
 
+        # 复用当前事件循环共享的异步客户端（keep-alive 连接池，不随单次评测关闭）
+        http_client = get_rag_http_client()
         for i, test_case in enumerate(test_cases):
             try:
                 # 从测试用例中提取信息
@@ -1612,40 +1628,17 @@ async def run_real_rag_evaluation(
                 # 调用RAG-LLM API
                 try:
                     inference_started_at = datetime.now()
-                    response = requests.post(rag_api_url, json=rag_payload, timeout=120)
-                    if response.status_code != 200:
-                        logger.error(f"RAG API调用失败: {response.status_code}, {response.text}")
-                        failed_cases += 1
-                        continue
-                    rag_result = response.json()
+                    # 与 ragas_service 共用推理调用（httpx 异步连接池 + 响应缓存），非 2xx 响应抛出异常
+                    rag_result = await fetch_rag_result(http_client, rag_api_url, rag_payload)
                     inference_completed_at = datetime.now()
                 except Exception as e:
                     logger.error(f"RAG API调用异常: {e}")
                     failed_cases += 1
                     continue
 
-                # 提取RAG响应信息
-                llm_recommendations = rag_result.get("llm_recommendations", {})
-                recommendations = llm_recommendations.get("recommendations", [])
-
-                # 构造答案文本
-                if recommendations:
-                    answer_text = "推荐的影像学检查：\n"
-                    for rec in recommendations[:3]:  # 取前3个推荐
-                        procedure = rec.get("procedure_name", "")
-                        rating = rec.get("appropriateness_rating", "")
-                        answer_text += f"- {procedure} (适宜性: {rating})\n"
-                else:
-                    answer_text = "暂无推荐的影像学检查"
-
-                # 提取上下文信息
-                contexts = []
-                scenarios = rag_result.get("scenarios", [])
-                for scenario in scenarios[:3]:  # 取前3个相关场景
-                    context_text = f"场景: {scenario.get('panel_name', '')} - {scenario.get('topic_name', '')}"
-                    if scenario.get('clinical_scenario'):
-                        context_text += f"\n临床场景: {scenario['clinical_scenario']}"
-                    contexts.append(context_text)
+                # 构造答案文本与上下文（与 ragas_service 共用同一套格式）
+                answer_text = build_answer_text(rag_result)
+                contexts = build_contexts(rag_result)
 
                 # 评估阶段时间戳
                 evaluation_started_at = None
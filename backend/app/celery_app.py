@@ -21,6 +21,9 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
     task_ignore_result=True,  # 忽略结果，避免序列化问题
+    # 评测任务的协程运行在每个 worker 进程的常驻事件循环上（见 app.tasks.ragas_tasks._run_async），
+    # 用例级并发由 evaluation_config.concurrency 控制，因此保持 prefork 池即可
+    worker_pool=settings.CELERY_WORKER_POOL,
 )
 
 # 任务路由配置
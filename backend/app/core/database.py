@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -6,17 +6,54 @@ import logging
 
 from app.core.config import settings
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时沿用 SQLAlchemy 默认的标准库 json
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+
+def _orjson_dumps(obj) -> str:
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+# JSON/JSONB 列（推理日志 result、评测 trace 等）的编解码使用 orjson
+_json_codec = (
+    {"json_serializer": _orjson_dumps, "json_deserializer": orjson.loads}
+    if orjson is not None else {}
+)
+
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
     pool_size=settings.DATABASE_POOL_SIZE,
     max_overflow=settings.DATABASE_MAX_OVERFLOW,
     pool_pre_ping=True,
+    pool_recycle=settings.DATABASE_POOL_RECYCLE if settings.DATABASE_POOL_RECYCLE > 0 else -1,
     echo=settings.DEBUG,  # Log SQL queries in debug mode
+    **_json_codec,
 )
 
+@event.listens_for(engine, "connect")
+def _set_pgvector_probes(dbapi_connection, connection_record):
+    """连接建立时设置会话级 ivfflat.probes，检索时仅在取值不同才 SET LOCAL。"""
+    probes = int(settings.PGVECTOR_PROBES or 0)
+    if probes <= 0:
+        return
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET ivfflat.probes = {probes}")
+        cursor.close()
+        # 提交，避免连接归还时的回滚撤销该设置
+        dbapi_connection.commit()
+    except Exception as e:
+        logger.warning(f"SET ivfflat.probes failed: {e}")
+        try:
+            dbapi_connection.rollback()
+        except Exception:
+            pass
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,5 +1,5 @@
 """RAGAS评测数据模型"""
-from sqlalchemy import Column, Integer, String, Text, Float, JSON, TIMESTAMP, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, Float, JSON, TIMESTAMP, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -97,7 +97,11 @@ class EvaluationTask(Base):
 class ScenarioResult(Base):
     """场景评测结果表"""
     __tablename__ = "scenario_results"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # 按任务取最近结果（ORDER BY created_at DESC LIMIT n）走索引反向扫描
+        Index("ix_scenario_results_task_created", "task_id", "created_at"),
+        {'extend_existing': True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     scenario_id = Column(String(50), nullable=False, index=True, comment="场景唯一标识")
@@ -16,6 +16,26 @@ from app.models.acrac_models import (
 # 延迟导入schemas以避免循环依赖
 # schemas将在方法中按需导入
 
+
+def _next_semantic_id_sql(prefix: str, table: str):
+    return text(
+        f"SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM {len(prefix) + 1}) AS INTEGER)), 0) + 1 FROM {table}"
+    )
+
+
+# 实体类型 -> (语义ID前缀, 数字位数, 取下一个编号的SQL)，按类型一次查表分派
+_SEMANTIC_ID_SPECS = {
+    entity_type: (prefix, width, _next_semantic_id_sql(prefix, table))
+    for entity_type, prefix, table, width in (
+        ('panel', 'P', 'panels', 4),
+        ('topic', 'T', 'topics', 4),
+        ('scenario', 'S', 'clinical_scenarios', 4),
+        ('procedure', 'PR', 'procedure_dictionary', 4),
+        ('recommendation', 'CR', 'clinical_recommendations', 6),
+    )
+}
+
+
 class ACRACService:
     """ACRAC核心服务"""
     
@@ -662,28 +682,12 @@ class ACRACService:
     
     def _generate_next_semantic_id(self, entity_type: str) -> str:
         """生成下一个语义化ID"""
-        if entity_type == 'panel':
-            result = self.db.execute(text("SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM 2) AS INTEGER)), 0) + 1 FROM panels"))
-            next_num = result.scalar()
-            return f"P{next_num:04d}"
-        elif entity_type == 'topic':
-            result = self.db.execute(text("SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM 2) AS INTEGER)), 0) + 1 FROM topics"))
-            next_num = result.scalar()
-            return f"T{next_num:04d}"
-        elif entity_type == 'scenario':
-            result = self.db.execute(text("SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM 2) AS INTEGER)), 0) + 1 FROM clinical_scenarios"))
-            next_num = result.scalar()
-            return f"S{next_num:04d}"
-        elif entity_type == 'procedure':
-            result = self.db.execute(text("SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM 3) AS INTEGER)), 0) + 1 FROM procedure_dictionary"))
-            next_num = result.scalar()
-            return f"PR{next_num:04d}"
-        elif entity_type == 'recommendation':
-            result = self.db.execute(text("SELECT COALESCE(MAX(CAST(SUBSTRING(semantic_id FROM 3) AS INTEGER)), 0) + 1 FROM clinical_recommendations"))
-            next_num = result.scalar()
-            return f"CR{next_num:06d}"
-        else:
+        spec = _SEMANTIC_ID_SPECS.get(entity_type)
+        if spec is None:
             raise ValueError(f"未知的实体类型: {entity_type}")
+        prefix, width, stmt = spec
+        next_num = self.db.execute(stmt).scalar()
+        return f"{prefix}{next_num:0{width}d}"
     
     def _generate_query_vector(self, text: str) -> List[float]:
         """生成查询向量"""
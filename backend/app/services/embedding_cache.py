@@ -0,0 +1,146 @@
+"""
+向量缓存服务
+按 (模型名, 文本内容哈希) 缓存 embedding，批量评测/重跑时相同的问题、上下文只向嵌入接口请求一次。
+缓存后端为 Redis；Redis 不可用时自动降级为直连嵌入接口。
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+
+try:
+    import redis
+except Exception:  # pragma: no cover - 可选依赖
+    redis = None
+
+try:  # ragas 仅对 LangChain Embeddings 子类做自动包装
+    from langchain_core.embeddings import Embeddings as _EmbeddingsBase
+except Exception:  # pragma: no cover - 可选依赖
+    _EmbeddingsBase = object
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "emb:"
+# 以 float16 存储，缓存体积与网络传输减半；用于相似度计算时精度损失可忽略
+_CACHE_DTYPE = np.float16
+
+
+def cache_key(model: str, text: str) -> str:
+    return _KEY_PREFIX + hashlib.sha256(f"{model}:{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """基于 Redis 的 embedding 缓存（MGET 读取，pipeline 批量 SET + TTL 写入）"""
+
+    def __init__(self, client=None, ttl: Optional[int] = None):
+        self.client = client
+        self.ttl = ttl if ttl is not None else settings.EMBEDDING_CACHE_TTL
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        if self.client is None or not texts:
+            return [None] * len(texts)
+        try:
+            raw = self.client.mget([cache_key(model, t) for t in texts])
+        except Exception as e:
+            logger.warning(f"读取向量缓存失败，跳过缓存: {e}")
+            return [None] * len(texts)
+        return [
+            np.frombuffer(b, dtype=_CACHE_DTYPE).astype(np.float32).tolist() if b else None
+            for b in raw
+        ]
+
+    def set_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if self.client is None or not texts:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for t, v in zip(texts, vectors):
+                pipe.set(cache_key(model, t), np.asarray(v, dtype=_CACHE_DTYPE).tobytes(), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入向量缓存失败: {e}")
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        model: str,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """读取缓存，仅将未命中（且去重后）的文本交给 embed_fn，再回写缓存"""
+        texts = list(texts)
+        vectors = self.get_many(model, texts)
+        misses = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if misses:
+            fresh = dict(zip(misses, embed_fn(misses)))
+            self.set_many(model, misses, [fresh[t] for t in misses])
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+    async def aembed(self, texts: Sequence[str], model: str, aembed_fn) -> List[List[float]]:
+        """embed 的异步版本：Redis 读写放到线程池，未命中部分调用异步 aembed_fn"""
+        texts = list(texts)
+        vectors = await asyncio.to_thread(self.get_many, model, texts)
+        misses = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        if misses:
+            fresh = dict(zip(misses, await aembed_fn(misses)))
+            await asyncio.to_thread(self.set_many, model, misses, [fresh[t] for t in misses])
+            vectors = [v if v is not None else fresh[t] for t, v in zip(texts, vectors)]
+        return vectors
+
+
+class CachedEmbeddings(_EmbeddingsBase):
+    """
+    为 LangChain Embeddings 对象加一层内容哈希缓存，接口保持一致，
+    可直接传给 ragas.evaluate(embeddings=...)。
+    """
+
+    def __init__(self, inner, model: str, cache: EmbeddingCache):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embed(texts, self.model, self.inner.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.cache.aembed(texts, self.model, self.inner.aembed_documents)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+_default_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """进程级共享缓存；未启用或 Redis 不可用时返回不做缓存的实例"""
+    global _default_cache
+    if _default_cache is None:
+        client = None
+        if settings.EMBEDDING_CACHE_ENABLED and redis is not None:
+            try:
+                client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1.0)
+                client.ping()
+            except Exception as e:
+                logger.warning(f"向量缓存 Redis 不可用，已禁用缓存: {e}")
+                client = None
+        _default_cache = EmbeddingCache(client)
+    return _default_cache
+
+
+def cached_embeddings(inner, model: str):
+    """包装 LangChain Embeddings；缓存不可用时原样返回"""
+    cache = get_embedding_cache()
+    if cache.client is None:
+        return inner
+    return CachedEmbeddings(inner, model, cache)
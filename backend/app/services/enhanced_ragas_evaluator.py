@@ -4,15 +4,19 @@
 专门处理中文医学内容，提供可配置的模型管理和评测指标
 """
 import os
+import re
+import hashlib
+import sqlite3
 import json
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional, Union
+import weakref
+from functools import lru_cache
+from typing import Dict, List, Any, Iterator, Optional, Tuple, Union
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, astuple
 from enum import Enum
 import numpy as np
-import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
@@ -20,14 +24,227 @@ try:
     from ragas.dataset_schema import SingleTurnSample
     from ragas.metrics import Faithfulness, ContextPrecision, ContextRecall
     from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-    from langchain.schema import HumanMessage
+    from langchain.schema import HumanMessage, SystemMessage
+    import httpx
     RAGAS_AVAILABLE = True
 except ImportError as e:
     logging.warning(f"RAGAS相关依赖未安装: {e}")
     RAGAS_AVAILABLE = False
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库解析
+    orjson = None
+
+try:
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+from app.services.embedding_cache import cached_embeddings
+from app.services.metric_agg import overlap_ratio, token_ids
+
 logger = logging.getLogger(__name__)
 
+# 批量评测时同时在途的LLM请求上限（受API并发/限流约束）
+DEFAULT_BATCH_CONCURRENCY = 16
+
+# create_sample 在没有有效上下文时填充的占位上下文
+_PLACEHOLDER_CONTEXT = "相关医学知识"
+
+def _loads_json(content: Any) -> Any:
+    """解析LLM返回的JSON内容（优先使用orjson）"""
+    if not isinstance(content, (str, bytes)):
+        content = str(content)
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _tokenize(text: str) -> set:
+    """小写后按单词字符切分为词集合（中文连续字符视为一个词）"""
+    return set(_WORD_RE.findall((text or "").lower()))
+
+
+# 评分标准与输出格式作为固定的 system 前缀（不含任何动态内容，保证逐字节一致），
+# 样本内容只放在 user 消息中，便于服务端命中前缀缓存
+_FAITHFULNESS_RUBRIC = """请评估用户给出的答案是否忠实于给定的上下文，判断答案中的信息是否都能从上下文中找到支持。
+请返回JSON格式：
+{
+  "faithfulness_score": 0.8,
+  "explanation": "评估说明"
+}
+
+评分标准：
+- 1.0: 答案完全基于上下文
+- 0.8: 答案大部分基于上下文
+- 0.6: 答案部分基于上下文
+- 0.4: 答案少部分基于上下文
+- 0.2: 答案基本不基于上下文
+- 0.0: 答案与上下文无关
+"""
+
+_CONTEXT_PRECISION_RUBRIC = """请评估用户给出的上下文对回答问题的精确度，判断每个上下文是否对回答问题有用。
+请返回JSON格式：
+{
+  "precision_score": 0.8,
+  "useful_contexts": [1, 2],
+  "explanation": "评估说明"
+}
+
+评分 = 有用的上下文数量 / 总上下文数量
+"""
+
+_CONTEXT_RECALL_RUBRIC = """请评估用户给出的上下文是否包含了回答问题所需的关键信息。
+请返回JSON格式：
+{
+  "recall_score": 0.8,
+  "explanation": "评估说明"
+}
+
+评分标准：
+- 1.0: 上下文包含所有必要信息
+- 0.8: 上下文包含大部分必要信息
+- 0.6: 上下文包含部分必要信息
+- 0.4: 上下文包含少量必要信息
+- 0.2: 上下文包含很少必要信息
+- 0.0: 上下文不包含必要信息
+"""
+
+_ANSWER_RELEVANCY_RUBRIC = """请评估用户给出的答案与问题的相关性，判断答案是否直接回答了问题。
+请返回JSON格式：
+{
+  "relevancy_score": 0.8,
+  "explanation": "评估说明"
+}
+
+评分标准：
+- 1.0: 答案完全回答了问题
+- 0.8: 答案大部分回答了问题
+- 0.6: 答案部分回答了问题
+- 0.4: 答案少部分回答了问题
+- 0.2: 答案基本没有回答问题
+- 0.0: 答案与问题无关
+"""
+
+_ALL_METRICS_RUBRIC = """请对用户给出的RAG问答结果同时给出四项评分（0.0-1.0）。
+
+评分说明：
+- faithfulness: 答案中的信息能从上下文中找到支持的程度（1.0完全基于上下文，0.0与上下文无关）
+- context_precision: 对回答问题有用的上下文数量 / 总上下文数量
+- context_recall: 上下文包含回答问题所需关键信息的程度（1.0包含所有必要信息，0.0不包含）
+- answer_relevancy: 答案直接回答问题的程度（1.0完全回答，0.0与问题无关）
+
+请只返回JSON格式：
+{
+  "faithfulness": 0.8,
+  "context_precision": 0.8,
+  "context_recall": 0.8,
+  "answer_relevancy": 0.8,
+  "explanation": "评估说明"
+}
+"""
+
+
+# ---- 共享的LLM/嵌入客户端 ----
+# 所有评估器实例复用同一组 httpx 连接池（keep-alive，可用时启用 HTTP/2 多路复用），
+# 避免每次实例化都重新建立 TLS 连接。AsyncClient 与事件循环绑定，因此按循环分别缓存。
+_HTTP_MAX_CONNECTIONS = 64
+_sync_http_client = None
+_loop_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+class _NoLoop:
+    """无运行中事件循环时的缓存键"""
+
+
+_NO_LOOP = _NoLoop()
+
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=_HTTP_MAX_CONNECTIONS,
+    )
+
+
+def _clients_for_current_loop() -> Dict[str, Any]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = _NO_LOOP
+    clients = _loop_clients.get(loop)
+    if clients is None:
+        clients = {'http_async_client': httpx.AsyncClient(http2=_HTTP2_AVAILABLE, limits=_http_limits())}
+        _loop_clients[loop] = clients
+    return clients
+
+
+def _shared_sync_http_client():
+    global _sync_http_client
+    if _sync_http_client is None:
+        _sync_http_client = httpx.Client(http2=_HTTP2_AVAILABLE, limits=_http_limits())
+    return _sync_http_client
+
+
+def get_llm(model_config: "ModelConfig") -> "ChatOpenAI":
+    """按模型配置复用 ChatOpenAI 实例（同一事件循环内共享连接池）"""
+    clients = _clients_for_current_loop()
+    key = ('llm', astuple(model_config))
+    if key not in clients:
+        clients[key] = ChatOpenAI(
+            model=model_config.llm_model,
+            api_key=model_config.api_key,
+            base_url=model_config.base_url,
+            temperature=model_config.temperature,
+            timeout=model_config.timeout,
+            max_retries=model_config.max_retries,
+            http_client=_shared_sync_http_client(),
+            http_async_client=clients['http_async_client'],
+        )
+    return clients[key]
+
+
+def get_embeddings(model_config: "ModelConfig") -> "OpenAIEmbeddings":
+    """按模型配置复用 OpenAIEmbeddings 实例（外层按内容哈希缓存向量）"""
+    clients = _clients_for_current_loop()
+    key = ('embeddings', astuple(model_config))
+    if key not in clients:
+        clients[key] = cached_embeddings(
+            OpenAIEmbeddings(
+                model=model_config.embedding_model,
+                api_key=model_config.api_key,
+                base_url=model_config.base_url,
+                timeout=model_config.timeout,
+                max_retries=model_config.max_retries,
+                http_client=_shared_sync_http_client(),
+                http_async_client=clients['http_async_client'],
+            ),
+            model_config.embedding_model,
+        )
+    return clients[key]
+
+
+@lru_cache(maxsize=1)
+def resolve_model_env() -> Tuple[str, str, str, str]:
+    """
+    从环境变量解析 (api_key, base_url, llm_model, embedding_model)，进程内只解析一次。
+    运行时修改了模型环境变量后需调用 resolve_model_env.cache_clear()。
+    """
+    api_key = os.getenv("SILICONFLOW_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("未找到API密钥，请设置 SILICONFLOW_API_KEY")
+    return (
+        api_key,
+        os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1"),
+        os.getenv("SILICONFLOW_LLM_MODEL", "Qwen/Qwen2.5-32B-Instruct"),
+        os.getenv("SILICONFLOW_EMBEDDING_MODEL", "BAAI/bge-m3"),
+    )
+
 
 class EvaluationStatus(Enum):
     """评测状态枚举"""
@@ -59,6 +276,55 @@ class EvaluationConfig:
     use_enhanced_methods: bool = True
     chinese_optimization: bool = True
     medical_domain: bool = True
+    # 批量评测逐条落盘的 sqlite 文件路径；为空则不落盘
+    score_db_path: Optional[str] = None
+
+
+_SCORE_COLUMNS = ('faithfulness', 'context_precision', 'context_recall', 'answer_relevancy')
+
+
+class ScoreStore:
+    """
+    批量评测分数的 sqlite 存储（WAL 模式）。
+    每个样本评完即写入一行，进程中断时已完成的结果不会丢失；均值直接用 SQL 聚合。
+    """
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "task_id TEXT NOT NULL, sample_idx INTEGER NOT NULL, "
+            + ", ".join(f"{c} REAL" for c in _SCORE_COLUMNS)
+            + ", PRIMARY KEY (task_id, sample_idx))"
+        )
+
+    def persist(self, task_id: str, sample_idx: int, scores: Dict[str, float]) -> None:
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO scores (task_id, sample_idx, {', '.join(_SCORE_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(_SCORE_COLUMNS))})",
+            (task_id, sample_idx, *(scores.get(c) for c in _SCORE_COLUMNS)),
+        )
+
+    def iter_scores(self, task_id: str) -> Iterator[Dict[str, Any]]:
+        cur = self._conn.execute(
+            f"SELECT sample_idx, {', '.join(_SCORE_COLUMNS)} FROM scores "
+            "WHERE task_id = ? ORDER BY sample_idx",
+            (task_id,),
+        )
+        for row in cur:
+            yield {'sample_idx': row[0], **dict(zip(_SCORE_COLUMNS, row[1:]))}
+
+    def averages(self, task_id: str) -> Dict[str, Optional[float]]:
+        row = self._conn.execute(
+            f"SELECT {', '.join(f'AVG({c})' for c in _SCORE_COLUMNS)} FROM scores WHERE task_id = ?",
+            (task_id,),
+        ).fetchone()
+        return dict(zip(_SCORE_COLUMNS, row))
+
+    def close(self) -> None:
+        self._conn.close()
 
 
 @dataclass
@@ -113,6 +379,14 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
         # 初始化评测指标
         self._init_metrics()
         
+        # 内容哈希 -> 评分，同一评估器内重复样本不再调用LLM
+        self._score_cache: Dict[str, Dict[str, float]] = {}
+        
+        self.score_store = (
+            ScoreStore(self.evaluation_config.score_db_path)
+            if self.evaluation_config.score_db_path else None
+        )
+        
         logger.info(f"增强版RAGAS评估器初始化完成 - LLM: {self.model_config.llm_model}")
 
     def _setup_event_loop(self):
@@ -124,35 +398,20 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
 
     def _load_default_model_config(self) -> ModelConfig:
         """加载默认模型配置"""
-        api_key = os.getenv("SILICONFLOW_API_KEY") or os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("未找到API密钥，请设置 SILICONFLOW_API_KEY")
-        
+        api_key, base_url, llm_model, embedding_model = resolve_model_env()
         return ModelConfig(
             api_key=api_key,
-            base_url=os.getenv("SILICONFLOW_BASE_URL", "https://api.siliconflow.cn/v1"),
-            llm_model=os.getenv("SILICONFLOW_LLM_MODEL", "Qwen/Qwen2.5-32B-Instruct"),
-            embedding_model=os.getenv("SILICONFLOW_EMBEDDING_MODEL", "BAAI/bge-m3")
+            base_url=base_url,
+            llm_model=llm_model,
+            embedding_model=embedding_model
         )
 
     def _init_models(self):
-        """初始化LLM和嵌入模型"""
-        self.llm = ChatOpenAI(
-            model=self.model_config.llm_model,
-            api_key=self.model_config.api_key,
-            base_url=self.model_config.base_url,
-            temperature=self.model_config.temperature,
-            timeout=self.model_config.timeout,
-            max_retries=self.model_config.max_retries
-        )
-        
-        self.embeddings = OpenAIEmbeddings(
-            model=self.model_config.embedding_model,
-            api_key=self.model_config.api_key,
-            base_url=self.model_config.base_url,
-            timeout=self.model_config.timeout,
-            max_retries=self.model_config.max_retries
-        )
+        """初始化LLM和嵌入模型（复用进程内共享的客户端与连接池）"""
+        self.llm = get_llm(self.model_config)
+        # 评分提示词均要求JSON输出，开启JSON模式约束解码，避免Markdown包裹/夹带说明导致解析失败
+        self.llm_json = self.llm.bind(response_format={"type": "json_object"})
+        self.embeddings = get_embeddings(self.model_config)
 
     def _init_metrics(self):
         """初始化评测指标"""
@@ -183,7 +442,7 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
         # 过滤空的上下文
         contexts = [ctx for ctx in contexts if ctx and str(ctx).strip()]
         if not contexts:
-            contexts = ["相关医学知识"]  # 默认上下文
+            contexts = [_PLACEHOLDER_CONTEXT]  # 默认上下文
         
         return SingleTurnSample(
             user_input=question,
@@ -192,43 +451,37 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
             reference=ground_truth
         )
 
-    async def _evaluate_faithfulness_enhanced(self, sample: SingleTurnSample) -> Dict[str, Any]:
+    @staticmethod
+    def _prepare(sample: SingleTurnSample) -> Dict[str, Any]:
+        """预先计算各评估项共用的拼接文本与词集合，每个样本只计算一次"""
+        contexts = sample.retrieved_contexts
+        ref = (sample.reference or "").strip()
+        return {
+            'reference': sample.reference if ref else sample.response,  # 无标准答案时以答案本身作为参考
+            # 标准答案缺失或与答案完全相同（常见于以答案回填标准答案）时，参考类LLM评估没有意义
+            'has_reference': bool(ref) and ref != (sample.response or "").strip(),
+            'contexts_text': "\n".join(contexts),
+            'contexts_numbered': "\n".join(f"{i}. {ctx}" for i, ctx in enumerate(contexts, 1)),
+            'question_tokens': _tokenize(sample.user_input),
+            'answer_tokens': _tokenize(sample.response),
+            'context_tokens': [_tokenize(ctx) for ctx in contexts],
+        }
+
+    async def _evaluate_faithfulness_enhanced(self, sample: SingleTurnSample,
+                                              prepared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """增强版忠实度评估"""
+        prepared = prepared or self._prepare(sample)
         try:
             # 使用简化的忠实度评估
-            contexts_text = "\n".join(sample.retrieved_contexts)
-            prompt = f"""请评估以下答案是否忠实于给定的上下文。
-
-上下文：
-{contexts_text}
-
-问题：{sample.user_input}
-
-答案：{sample.response}
-
-请判断答案中的信息是否都能从上下文中找到支持。
-请返回JSON格式：
-{{
-  "faithfulness_score": 0.8,
-  "explanation": "评估说明"
-}}
-
-评分标准：
-- 1.0: 答案完全基于上下文
-- 0.8: 答案大部分基于上下文
-- 0.6: 答案部分基于上下文
-- 0.4: 答案少部分基于上下文
-- 0.2: 答案基本不基于上下文
-- 0.0: 答案与上下文无关
-"""
+            prompt = f"上下文：\n{prepared['contexts_text']}\n\n问题：{sample.user_input}\n\n答案：{sample.response}"
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = await self.llm_json.ainvoke([SystemMessage(content=_FAITHFULNESS_RUBRIC), HumanMessage(content=prompt)])
             
             try:
-                result = json.loads(response.content)
+                result = _loads_json(response.content)
                 score = float(result.get('faithfulness_score', 0.0))
                 explanation = result.get('explanation', '')
-                logger.info(f"增强版faithfulness: {score:.4f}")
+                logger.debug(f"增强版faithfulness: {score:.4f}")
                 return {
                     'score': score,
                     'explanation': explanation,
@@ -267,38 +520,21 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 'fallback_method': 'error_fallback'
             }
 
-    async def _evaluate_context_precision_enhanced(self, sample: SingleTurnSample) -> Dict[str, Any]:
+    async def _evaluate_context_precision_enhanced(self, sample: SingleTurnSample,
+                                                   prepared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """增强版上下文精确度评估"""
+        prepared = prepared or self._prepare(sample)
         try:
-            contexts_numbered = "\n".join([f"{i+1}. {ctx}" for i, ctx in enumerate(sample.retrieved_contexts)])
-            prompt = f"""请评估以下上下文对回答问题的精确度。
-
-问题：{sample.user_input}
-
-上下文：
-{contexts_numbered}
-
-答案：{sample.response}
-
-请判断每个上下文是否对回答问题有用。
-请返回JSON格式：
-{{
-  "precision_score": 0.8,
-  "useful_contexts": [1, 2],
-  "explanation": "评估说明"
-}}
-
-评分 = 有用的上下文数量 / 总上下文数量
-"""
+            prompt = f"问题：{sample.user_input}\n\n上下文：\n{prepared['contexts_numbered']}\n\n答案：{sample.response}"
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = await self.llm_json.ainvoke([SystemMessage(content=_CONTEXT_PRECISION_RUBRIC), HumanMessage(content=prompt)])
             
             try:
-                result = json.loads(response.content)
+                result = _loads_json(response.content)
                 score = float(result.get('precision_score', 0.0))
                 useful_contexts = result.get('useful_contexts', [])
                 explanation = result.get('explanation', '')
-                logger.info(f"增强版context_precision: {score:.4f}")
+                logger.debug(f"增强版context_precision: {score:.4f}")
                 return {
                     'score': score,
                     'useful_contexts': useful_contexts,
@@ -318,18 +554,15 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                         'fallback_method': 'heuristic'
                     }
                 
-                # 检查上下文与问题的相关性
-                question_lower = sample.user_input.lower()
-                useful_count = 0
-                
-                for ctx in sample.retrieved_contexts:
-                    ctx_lower = ctx.lower()
-                    # 简单的关键词匹配
-                    if any(word in ctx_lower for word in question_lower.split() if len(word) > 1):
-                        useful_count += 1
+                # 检查上下文与问题的相关性：问题词集合与上下文词集合求交
+                question_tokens = {w for w in prepared['question_tokens'] if len(w) > 1}
+                useful_count = sum(
+                    1 for ctx_tokens in prepared['context_tokens']
+                    if not question_tokens.isdisjoint(ctx_tokens)
+                )
                 
                 score = useful_count / total_contexts
-                logger.info(f"增强版context_precision (启发式): {score:.4f}")
+                logger.debug(f"增强版context_precision (启发式): {score:.4f}")
                 return {
                     'score': score,
                     'useful_contexts': list(range(1, useful_count + 1)),
@@ -348,56 +581,23 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 'fallback_method': 'error_fallback'
             }
 
-    async def _evaluate_context_recall_enhanced(self, sample: SingleTurnSample) -> Dict[str, Any]:
+    async def _evaluate_context_recall_enhanced(self, sample: SingleTurnSample,
+                                                prepared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """增强版上下文召回率评估"""
+        prepared = prepared or self._prepare(sample)
         try:
-            if not sample.reference or sample.reference.strip() == "":
-                # 如果没有标准答案，使用答案本身作为参考
-                reference = sample.response
-            else:
-                reference = sample.reference
-            
-            contexts_text = "\n".join(sample.retrieved_contexts)
-            prompt = f"""请评估上下文是否包含了回答问题所需的信息。
-
-问题：{sample.user_input}
-
-标准答案/参考答案：{reference}
-
-上下文：
-{contexts_text}
-
-请判断上下文是否包含了回答问题所需的关键信息。
-请返回JSON格式：
-{{
-  "recall_score": 0.8,
-  "explanation": "评估说明"
-}}
-
-评分标准：
-- 1.0: 上下文包含所有必要信息
-- 0.8: 上下文包含大部分必要信息
-- 0.6: 上下文包含部分必要信息
-- 0.4: 上下文包含少量必要信息
-- 0.2: 上下文包含很少必要信息
-- 0.0: 上下文不包含必要信息
-"""
+            reference = prepared['reference']
+            contexts_text = prepared['contexts_text']
+            prompt = f"问题：{sample.user_input}\n\n标准答案/参考答案：{reference}\n\n上下文：\n{contexts_text}"
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = await self.llm_json.ainvoke([SystemMessage(content=_CONTEXT_RECALL_RUBRIC), HumanMessage(content=prompt)])
             
             try:
-                result = json.loads(response.content)
+                result = _loads_json(response.content)
                 score = float(result.get('recall_score', 0.0))
                 explanation = result.get('explanation', '')
-                # 结合GT出现与否进行保守校准
-                if isinstance(reference, str) and reference.strip():
-                    ref = reference.strip()
-                    ctx_text = contexts_text
-                    if ref in ctx_text:
-                        score = max(score, 0.8)
-                    else:
-                        score = min(score, 0.6)
-                logger.info(f"增强版context_recall: {score:.4f}")
+                score = self._calibrate_recall(score, reference, contexts_text)
+                logger.debug(f"增强版context_recall: {score:.4f}")
                 return {
                     'score': score,
                     'explanation': explanation,
@@ -405,23 +605,7 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                     'fallback_method': None
                 }
             except:
-                # 启发式评估
-                if len(sample.retrieved_contexts) > 0:
-                    # 若GT存在且未出现在任何上下文中，则给0.6；否则0.8
-                    gt = (reference or "").strip() if isinstance(reference, str) else ""
-                    if gt and all((gt not in (c or "")) for c in sample.retrieved_contexts):
-                        score = 0.6
-                    else:
-                        score = 0.8
-                else:
-                    score = 0.0
-                logger.info(f"增强版context_recall (启发式): {score:.4f}")
-                return {
-                    'score': score,
-                    'explanation': f'启发式评估: {"有上下文" if len(sample.retrieved_contexts) > 0 else "无上下文"}',
-                    'llm_parsing_success': False,
-                    'fallback_method': 'heuristic'
-                }
+                return self._recall_heuristic(sample, reference)
                 
         except Exception as e:
             logger.error(f"增强版context_recall评估失败: {e}")
@@ -432,47 +616,66 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 'fallback_method': 'error_fallback'
             }
 
-    async def _evaluate_answer_relevancy_enhanced(self, sample: SingleTurnSample) -> Dict[str, Any]:
-        """增强版答案相关性评估"""
-        try:
-            prompt = f"""请评估答案与问题的相关性。
-
-问题：{sample.user_input}
-
-答案：{sample.response}
+    @staticmethod
+    def _recall_heuristic(sample: SingleTurnSample, reference: str) -> Dict[str, Any]:
+        """上下文召回率启发式评估：若GT存在且未出现在任何上下文中，则给0.6；否则0.8"""
+        if len(sample.retrieved_contexts) > 0:
+            gt = (reference or "").strip() if isinstance(reference, str) else ""
+            if gt and all((gt not in (c or "")) for c in sample.retrieved_contexts):
+                score = 0.6
+            else:
+                score = 0.8
+        else:
+            score = 0.0
+        logger.debug(f"增强版context_recall (启发式): {score:.4f}")
+        return {
+            'score': score,
+            'explanation': f'启发式评估: {"有上下文" if len(sample.retrieved_contexts) > 0 else "无上下文"}',
+            'llm_parsing_success': False,
+            'fallback_method': 'heuristic'
+        }
 
-请判断答案是否直接回答了问题。
-请返回JSON格式：
-{{
-  "relevancy_score": 0.8,
-  "explanation": "评估说明"
-}}
+    @staticmethod
+    def _relevancy_heuristic(sample: SingleTurnSample, prepared: Dict[str, Any]) -> Dict[str, Any]:
+        """答案相关性启发式评估：问题与答案的词汇重叠度，并结合标准答案再校准"""
+        question_words = prepared['question_tokens']
+        
+        # 计算词汇重叠度
+        total_question_words = len(question_words)
+        score = overlap_ratio(token_ids(question_words), token_ids(prepared['answer_tokens']))
+        overlap = round(score * total_question_words)
+        # 结合标准答案进行再校准
+        if sample.reference and isinstance(sample.reference, str):
+            ref = sample.reference.strip()
+            if ref:
+                if ref in (sample.response or ""):
+                    score = max(score, 0.8)
+                else:
+                    score = min(score, 0.4)
+        
+        logger.debug(f"增强版answer_relevancy (启发式): {score:.4f}")
+        return {
+            'score': score,
+            'explanation': f'启发式评估: 词汇重叠度 {overlap}/{total_question_words}',
+            'llm_parsing_success': False,
+            'fallback_method': 'heuristic'
+        }
 
-评分标准：
-- 1.0: 答案完全回答了问题
-- 0.8: 答案大部分回答了问题
-- 0.6: 答案部分回答了问题
-- 0.4: 答案少部分回答了问题
-- 0.2: 答案基本没有回答问题
-- 0.0: 答案与问题无关
-"""
+    async def _evaluate_answer_relevancy_enhanced(self, sample: SingleTurnSample,
+                                                  prepared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """增强版答案相关性评估"""
+        prepared = prepared or self._prepare(sample)
+        try:
+            prompt = f"问题：{sample.user_input}\n\n答案：{sample.response}"
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = await self.llm_json.ainvoke([SystemMessage(content=_ANSWER_RELEVANCY_RUBRIC), HumanMessage(content=prompt)])
             
             try:
-                result = json.loads(response.content)
+                result = _loads_json(response.content)
                 score = float(result.get('relevancy_score', 0.0))
                 explanation = result.get('explanation', '')
-                # 若存在标准答案，优先进行一致性校准
-                if sample.reference and isinstance(sample.reference, str):
-                    ref = sample.reference.strip()
-                    ans = (sample.response or "").strip()
-                    if ref:
-                        if ref in ans:
-                            score = max(score, 0.8)  # 命中GT至少0.8
-                        else:
-                            score = min(score, 0.4)  # 未命中GT，收敛保守
-                logger.info(f"增强版answer_relevancy: {score:.4f}")
+                score = self._calibrate_relevancy(score, sample)
+                logger.debug(f"增强版answer_relevancy: {score:.4f}")
                 return {
                     'score': score,
                     'explanation': explanation,
@@ -481,33 +684,7 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 }
             except:
                 # 简单的相关性检查
-                question_words = set(sample.user_input.lower().split())
-                answer_words = set(sample.response.lower().split())
-                
-                # 计算词汇重叠度
-                overlap = len(question_words & answer_words)
-                total_question_words = len(question_words)
-                
-                if total_question_words > 0:
-                    score = min(overlap / total_question_words, 1.0)
-                else:
-                    score = 0.0
-                # 结合标准答案进行再校准
-                if sample.reference and isinstance(sample.reference, str):
-                    ref = sample.reference.strip()
-                    if ref:
-                        if ref in (sample.response or ""):
-                            score = max(score, 0.8)
-                        else:
-                            score = min(score, 0.4)
-                
-                logger.info(f"增强版answer_relevancy (启发式): {score:.4f}")
-                return {
-                    'score': score,
-                    'explanation': f'启发式评估: 词汇重叠度 {overlap}/{total_question_words}',
-                    'llm_parsing_success': False,
-                    'fallback_method': 'heuristic'
-                }
+                return self._relevancy_heuristic(sample, prepared)
                 
         except Exception as e:
             logger.error(f"增强版answer_relevancy评估失败: {e}")
@@ -518,31 +695,122 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 'fallback_method': 'error_fallback'
             }
 
+    @staticmethod
+    def _calibrate_recall(score: float, reference: str, contexts_text: str) -> float:
+        """结合GT出现与否进行保守校准"""
+        if isinstance(reference, str) and reference.strip():
+            if reference.strip() in contexts_text:
+                return max(score, 0.8)
+            return min(score, 0.6)
+        return score
+
+    @staticmethod
+    def _calibrate_relevancy(score: float, sample: SingleTurnSample) -> float:
+        """若存在标准答案，优先进行一致性校准"""
+        if sample.reference and isinstance(sample.reference, str):
+            ref = sample.reference.strip()
+            ans = (sample.response or "").strip()
+            if ref:
+                if ref in ans:
+                    return max(score, 0.8)  # 命中GT至少0.8
+                return min(score, 0.4)  # 未命中GT，收敛保守
+        return score
+
+    def _enabled_metrics(self) -> List[str]:
+        cfg = self.evaluation_config
+        flags = {
+            'faithfulness': cfg.enable_faithfulness,
+            'context_precision': cfg.enable_context_precision,
+            'context_recall': cfg.enable_context_recall,
+            'answer_relevancy': cfg.enable_answer_relevancy,
+        }
+        return [name for name, enabled in flags.items() if enabled]
+
+    async def _evaluate_all_enhanced(self, sample: SingleTurnSample,
+                                     prepared: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, float]]:
+        """
+        单次LLM调用同时给出四项评分（问题/答案/上下文只发送一次）。
+        JSON解析失败或缺项时返回None，由调用方回退到逐项评估。
+        """
+        prepared = prepared or self._prepare(sample)
+        reference = prepared['reference']
+        prompt = (
+            f"问题：{sample.user_input}\n\n答案：{sample.response}\n\n"
+            f"标准答案/参考答案：{reference}\n\n上下文：\n{prepared['contexts_numbered']}"
+        )
+        try:
+            response = await self.llm_json.ainvoke([SystemMessage(content=_ALL_METRICS_RUBRIC), HumanMessage(content=prompt)])
+            result = _loads_json(response.content)
+            scores = {name: float(result[name]) for name in self._enabled_metrics()}
+        except Exception as e:
+            logger.warning(f"合并评估解析失败，回退逐项评估: {e}")
+            return None
+
+        if 'context_recall' in scores:
+            if prepared['has_reference']:
+                scores['context_recall'] = self._calibrate_recall(scores['context_recall'], reference, prepared['contexts_text'])
+            else:
+                # 与逐项评估一致：无真实标准答案时召回率使用启发式
+                scores['context_recall'] = self._recall_heuristic(sample, reference)['score']
+        if 'answer_relevancy' in scores:
+            scores['answer_relevancy'] = self._calibrate_relevancy(scores['answer_relevancy'], sample)
+        logger.debug(f"增强版合并评估: {scores}")
+        return scores
+
+    @staticmethod
+    def _sample_key(sample: SingleTurnSample) -> str:
+        """按 (问题, 答案, 上下文, 标准答案) 内容计算缓存键"""
+        payload = "\x1e".join([
+            sample.user_input or "",
+            sample.response or "",
+            "\x1f".join(sample.retrieved_contexts),
+            sample.reference or "",
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _fast_path_scores(self, sample: SingleTurnSample,
+                          prepared: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """
+        退化样本直接给分，不调用LLM：
+        - 答案为空：全部指标为0
+        - 仅有占位上下文：上下文相关指标为0，答案相关性使用启发式
+        """
+        metrics = self._enabled_metrics()
+        if not (sample.response or "").strip():
+            return dict.fromkeys(metrics, 0.0)
+        if sample.retrieved_contexts == [_PLACEHOLDER_CONTEXT]:
+            scores = dict.fromkeys(metrics, 0.0)
+            if 'answer_relevancy' in scores:
+                scores['answer_relevancy'] = self._relevancy_heuristic(sample, prepared)['score']
+            return scores
+        return None
+
     async def evaluate_sample(self, sample: SingleTurnSample) -> Dict[str, float]:
-        """评测单个样本"""
+        """评测单个样本（命中内容哈希缓存时直接返回，不调用LLM）"""
+        key = self._sample_key(sample)
+        cached = self._score_cache.get(key)
+        if cached is not None:
+            return dict(cached)
         try:
-            logger.info(f"评估样本: {sample.user_input[:50]}...")
-            
-            results = {}
+            prepared = self._prepare(sample)
+            results = self._fast_path_scores(sample, prepared)
+            source = "退化样本，跳过LLM"
+            # 只缓存LLM实际给出的评分；调用异常得到的兜底0分不缓存，下次重新评估
+            cacheable = False
+            if results is None:
+                results = await self._evaluate_all_enhanced(sample, prepared)
+                source = "合并评估"
+                cacheable = results is not None
+            if results is None:
+                # 合并评估失败时回退到逐项评估
+                results, cacheable = await self._evaluate_per_metric(sample, prepared)
+                source = "逐项评估"
             
-            # 使用增强版评估方法
-            if self.evaluation_config.enable_faithfulness:
-                faithfulness_result = await self._evaluate_faithfulness_enhanced(sample)
-                results['faithfulness'] = faithfulness_result['score']
-            
-            if self.evaluation_config.enable_context_precision:
-                precision_result = await self._evaluate_context_precision_enhanced(sample)
-                results['context_precision'] = precision_result['score']
-            
-            if self.evaluation_config.enable_context_recall:
-                recall_result = await self._evaluate_context_recall_enhanced(sample)
-                results['context_recall'] = recall_result['score']
-            
-            if self.evaluation_config.enable_answer_relevancy:
-                relevancy_result = await self._evaluate_answer_relevancy_enhanced(sample)
-                results['answer_relevancy'] = relevancy_result['score']
-            
-            return results
+            # 每个样本只输出一行汇总日志（各指标明细为 debug 级别）
+            logger.info(f"评估样本: {sample.user_input[:50]}... [{source}] {results}")
+            if cacheable:
+                self._score_cache[key] = results
+            return dict(results)
             
         except Exception as e:
             logger.error(f"样本评估失败: {e}")
@@ -553,17 +821,68 @@ class EnhancedRAGASEvaluator(BaseEvaluator):
                 'context_recall': 0.0
             }
 
-    async def evaluate_batch(self, samples: List[SingleTurnSample]) -> List[Dict[str, float]]:
-        """批量评测样本"""
+    async def _evaluate_per_metric(self, sample: SingleTurnSample,
+                                   prepared: Dict[str, Any]) -> Tuple[Dict[str, float], bool]:
+        """逐项调用各指标的增强评估；第二个返回值表示没有指标因调用异常而兜底（结果可缓存）"""
+        details = {}
+        
+        if self.evaluation_config.enable_faithfulness:
+            details['faithfulness'] = await self._evaluate_faithfulness_enhanced(sample, prepared)
+        
+        if self.evaluation_config.enable_context_precision:
+            details['context_precision'] = await self._evaluate_context_precision_enhanced(sample, prepared)
+        
+        if self.evaluation_config.enable_context_recall:
+            if prepared['has_reference']:
+                details['context_recall'] = await self._evaluate_context_recall_enhanced(sample, prepared)
+            else:
+                # 无真实标准答案时以答案自身作参考，LLM评分没有意义，直接使用启发式
+                details['context_recall'] = self._recall_heuristic(sample, prepared['reference'])
+        
+        if self.evaluation_config.enable_answer_relevancy:
+            details['answer_relevancy'] = await self._evaluate_answer_relevancy_enhanced(sample, prepared)
+        
+        results = {name: detail['score'] for name, detail in details.items()}
+        cacheable = all(detail.get('fallback_method') != 'error_fallback' for detail in details.values())
+        return results, cacheable
+
+    async def evaluate_batch(self, samples: List[SingleTurnSample],
+                             concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                             task_id: Optional[str] = None) -> List[Dict[str, float]]:
+        """
+        批量评测样本（并发调用LLM，信号量限制同时在途请求数，结果顺序与输入一致）。
+        内容相同的样本只评估一次，结果分发给所有重复项。
+        配置了 score_db_path 且传入 task_id 时，每个样本评完即写入 sqlite。
+        """
         if not samples:
             return []
         
-        results = []
+        groups: Dict[str, List[int]] = {}
         for i, sample in enumerate(samples):
-            logger.info(f"评估样本 {i+1}/{len(samples)}")
-            result = await self.evaluate_sample(sample)
-            results.append(result)
+            groups.setdefault(self._sample_key(sample), []).append(i)
+        if len(groups) < len(samples):
+            logger.info(f"批量评测去重: {len(samples)} 个样本 -> {len(groups)} 个唯一样本")
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
         
+        persist = self.score_store is not None and task_id is not None
+        
+        async def bounded(n: int, indices: List[int]) -> Dict[str, float]:
+            async with semaphore:
+                logger.debug(f"评估样本 {n+1}/{len(groups)}")
+                scores = await self.evaluate_sample(samples[indices[0]])
+            if persist:
+                for i in indices:
+                    self.score_store.persist(task_id, i, scores)
+            return scores
+        
+        unique_results = await asyncio.gather(
+            *[bounded(n, indices) for n, indices in enumerate(groups.values())]
+        )
+        results: List[Dict[str, float]] = [{}] * len(samples)
+        for indices, scores in zip(groups.values(), unique_results):
+            for i in indices:
+                results[i] = dict(scores)
         return results
 
     async def evaluate_with_detailed_results(self, data: Dict[str, Any]) -> EvaluationResult:
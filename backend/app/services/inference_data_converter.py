@@ -70,8 +70,11 @@ class InferenceDataConverter(BaseInferenceDataConverter):
     async def convert_inference_data(self, inference_data: Dict[str, Any]) -> ConversionResult:
         """转换推理数据"""
         try:
-            # 验证推理数据
-            validation = await self.validate_inference_data(inference_data)
+            # 问题/答案/上下文只提取一次，校验与样本构建共用；校验不通过时不再提取其余字段
+            question = self._extract_question(inference_data)
+            answer = self._extract_answer(inference_data)
+            contexts = self._extract_contexts(inference_data)
+            validation = self._validate_extracted(question, answer, contexts)
             if not validation.is_valid:
                 return ConversionResult(
                     success=False,
@@ -80,8 +83,13 @@ class InferenceDataConverter(BaseInferenceDataConverter):
                     processing_info={'validation_errors': validation.errors}
                 )
             
-            # 提取推理字段
-            extracted_fields = self._extract_inference_fields(inference_data)
+            extracted_fields = {
+                'question': question,
+                'answer': answer,
+                'contexts': contexts,
+                'ground_truth': self._extract_ground_truth(inference_data),
+                'id': self._extract_id(inference_data),
+            }
             
             # 创建 RAGAS 样本
             sample = self._create_ragas_sample(extracted_fields)
@@ -110,27 +118,6 @@ class InferenceDataConverter(BaseInferenceDataConverter):
                 processing_info={'error': str(e)}
             )
     
-    def _extract_inference_fields(self, inference_data: Dict[str, Any]) -> Dict[str, Any]:
-        """提取推理字段"""
-        extracted = {}
-        
-        # 提取问题（检查项目推荐的问题）
-        extracted['question'] = self._extract_question(inference_data)
-        
-        # 提取答案（推荐的检查项目）
-        extracted['answer'] = self._extract_answer(inference_data)
-        
-        # 提取上下文（推理依据）
-        extracted['contexts'] = self._extract_contexts(inference_data)
-        
-        # 提取标准答案（如果有）
-        extracted['ground_truth'] = self._extract_ground_truth(inference_data)
-        
-        # 提取ID
-        extracted['id'] = self._extract_id(inference_data)
-        
-        return extracted
-    
     def _extract_question(self, inference_data: Dict[str, Any]) -> str:
         """提取问题字段"""
         # 可能的字段名
@@ -160,7 +147,7 @@ class InferenceDataConverter(BaseInferenceDataConverter):
                 
                 # 如果答案是列表，转换为字符串
                 if isinstance(answer, list):
-                    return '\n'.join([str(item) for item in answer])
+                    return '\n'.join(str(item) for item in answer)
                 
                 # 如果答案是字典，尝试提取文本内容
                 if isinstance(answer, dict):
@@ -188,14 +175,13 @@ class InferenceDataConverter(BaseInferenceDataConverter):
             if field in inference_data and inference_data[field]:
                 contexts = inference_data[field]
                 
-                # 确保是列表
-                if isinstance(contexts, str):
+                # 确保是列表（单个字符串或其他标量包装为单元素列表）
+                if not isinstance(contexts, list):
                     contexts = [contexts]
-                elif not isinstance(contexts, list):
-                    contexts = [str(contexts)]
                 
-                # 过滤空上下文
-                contexts = [str(ctx).strip() for ctx in contexts if ctx and str(ctx).strip()]
+                # 过滤空上下文（每个元素只做一次 str().strip()）
+                stripped = (str(ctx).strip() for ctx in contexts if ctx)
+                contexts = [ctx for ctx in stripped if ctx]
                 
                 if contexts:
                     return contexts
@@ -270,19 +256,24 @@ class InferenceDataConverter(BaseInferenceDataConverter):
     
     async def validate_inference_data(self, inference_data: Dict[str, Any]) -> ValidationResult:
         """验证推理数据"""
+        return self._validate_extracted(
+            self._extract_question(inference_data),
+            self._extract_answer(inference_data),
+            self._extract_contexts(inference_data),
+        )
+    
+    def _validate_extracted(self, question: str, answer: str, contexts: List[str]) -> ValidationResult:
+        """基于已提取的字段做校验"""
         errors = []
         warnings = []
         
         # 检查必需字段
-        question = self._extract_question(inference_data)
         if not question:
             errors.append("缺少问题字段（question/query/user_input等）")
         
-        answer = self._extract_answer(inference_data)
         if not answer:
             errors.append("缺少答案字段（answer/response/result等）")
         
-        contexts = self._extract_contexts(inference_data)
         if not contexts:
             warnings.append("缺少上下文字段（contexts/retrieved_contexts等）")
         
@@ -21,8 +21,13 @@ except ImportError as e:
     logging.warning(f"RAGAS相关依赖未安装: {e}")
     RAGAS_AVAILABLE = False
 
+from app.services.embedding_cache import cached_embeddings
+
 logger = logging.getLogger(__name__)
 
+# 批量评测时同时在途的样本数
+DEFAULT_BATCH_CONCURRENCY = 8
+
 
 class EvaluationStatus(Enum):
     """评测状态枚举"""
@@ -108,12 +113,16 @@ class InferenceRAGASEvaluator:
             max_retries=self.model_config.max_retries
         )
         
-        self.embeddings = OpenAIEmbeddings(
-            model=self.model_config.embedding_model,
-            api_key=self.model_config.api_key,
-            base_url=self.model_config.base_url,
-            timeout=self.model_config.timeout,
-            max_retries=self.model_config.max_retries
+        # 按内容哈希缓存向量，重跑同一批数据时不再重复请求嵌入接口
+        self.embeddings = cached_embeddings(
+            OpenAIEmbeddings(
+                model=self.model_config.embedding_model,
+                api_key=self.model_config.api_key,
+                base_url=self.model_config.base_url,
+                timeout=self.model_config.timeout,
+                max_retries=self.model_config.max_retries
+            ),
+            self.model_config.embedding_model,
         )
     
     def _init_metrics(self):
@@ -255,18 +264,21 @@ class InferenceRAGASEvaluator:
                 created_at=datetime.now().isoformat()
             )
     
-    async def evaluate_batch(self, data_list: List[Dict[str, Any]]) -> List[EvaluationResult]:
-        """批量评测"""
+    async def evaluate_batch(self, data_list: List[Dict[str, Any]],
+                             concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> List[EvaluationResult]:
+        """批量评测（样本间相互独立，信号量限制并发，结果顺序与输入一致）"""
         if not data_list:
             return []
         
-        results = []
-        for i, data in enumerate(data_list):
-            logger.info(f"评测样本 {i+1}/{len(data_list)}")
-            result = await self.evaluate_sample(data)
-            results.append(result)
+        n = len(data_list)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def bounded(i: int, data: Dict[str, Any]) -> EvaluationResult:
+            async with semaphore:
+                logger.info(f"评测样本 {i+1}/{n}")
+                return await self.evaluate_sample(data)
         
-        return results
+        return list(await asyncio.gather(*[bounded(i, data) for i, data in enumerate(data_list)]))
     
     async def get_evaluation_statistics(self, results: List[EvaluationResult]) -> Dict[str, Any]:
         """获取评测统计信息"""
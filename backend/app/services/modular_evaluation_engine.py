@@ -23,6 +23,8 @@ except ImportError as e:
     logging.warning(f"RAGAS相关依赖未安装: {e}")
     RAGAS_AVAILABLE = False
 
+from app.services.embedding_cache import cached_embeddings
+
 logger = logging.getLogger(__name__)
 
 
@@ -168,12 +170,16 @@ class ModularEvaluationEngine(BaseEvaluationEngine):
             max_retries=self.model_config.max_retries
         )
         
-        self.embeddings = OpenAIEmbeddings(
-            model=self.model_config.embedding_model,
-            api_key=self.model_config.api_key,
-            base_url=self.model_config.base_url,
-            timeout=self.model_config.timeout,
-            max_retries=self.model_config.max_retries
+        # 按内容哈希缓存向量，重跑同一批数据时不再重复请求嵌入接口
+        self.embeddings = cached_embeddings(
+            OpenAIEmbeddings(
+                model=self.model_config.embedding_model,
+                api_key=self.model_config.api_key,
+                base_url=self.model_config.base_url,
+                timeout=self.model_config.timeout,
+                max_retries=self.model_config.max_retries
+            ),
+            self.model_config.embedding_model,
         )
         
         # 如果有重排序模型，初始化它
@@ -333,26 +339,33 @@ class ModularEvaluationEngine(BaseEvaluationEngine):
         if not results:
             return {}
         
-        statistics = {}
-        
-        # 获取所有指标名称
-        all_metrics = set()
-        for result in results:
-            all_metrics.update(result.keys())
+        # 获取所有指标名称（按首次出现顺序）
+        all_metrics = list(dict.fromkeys(name for result in results for name in result))
         
-        for metric_name in all_metrics:
-            scores = [result.get(metric_name, 0.0) for result in results if metric_name in result]
-            
-            if scores:
-                statistics[metric_name] = {
-                    'mean': np.mean(scores),
-                    'std': np.std(scores),
-                    'min': np.min(scores),
-                    'max': np.max(scores),
-                    'count': len(scores)
-                }
+        # 构造 (样本数, 指标数) 分数矩阵，缺失记为 NaN；各统计量按列一次向量化计算
+        scores = np.array(
+            [[result.get(name, np.nan) for name in all_metrics] for result in results],
+            dtype=np.float64,
+        )
+        valid = ~np.isnan(scores)
+        counts = valid.sum(axis=0)
+        filled = np.where(valid, scores, 0.0)
+        means = filled.sum(axis=0) / np.maximum(counts, 1)
+        stds = np.sqrt((np.where(valid, scores - means, 0.0) ** 2).sum(axis=0) / np.maximum(counts, 1))
+        mins = np.where(valid, scores, np.inf).min(axis=0)
+        maxs = np.where(valid, scores, -np.inf).max(axis=0)
         
-        return statistics
+        return {
+            name: {
+                'mean': float(means[j]),
+                'std': float(stds[j]),
+                'min': float(mins[j]),
+                'max': float(maxs[j]),
+                'count': int(counts[j]),
+            }
+            for j, name in enumerate(all_metrics)
+            if counts[j]
+        }
 
 
 class EvaluationEngineFactory:
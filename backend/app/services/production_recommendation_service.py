@@ -116,7 +116,12 @@ class ProductionRecommendationService:
     # ----------------------------------------------------------------------------------
     # Public API
     # ----------------------------------------------------------------------------------
-    def recommend(self, query: str, top_k: Optional[int] = None) -> Dict[str, Any]:
+    def recommend(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        query_vector: Optional[Sequence[float]] = None,
+    ) -> Dict[str, Any]:
         clean_query = (query or "").strip()
         if not clean_query:
             raise ValueError("query must not be empty")
@@ -124,7 +129,21 @@ class ProductionRecommendationService:
         limit = max(1, int(top_k or self._default_top_k))
         start = time.time()
 
-        query_vector = self._vector_service.generate_embedding(clean_query)
+        if query_vector is None:
+            query_vector = self._vector_service.embed_query(clean_query)
+        if query_vector is None:
+            # 非严格模式下嵌入失败：与 search_* 一致降级为空结果（不走LLM兜底）
+            return {
+                "query": clean_query,
+                "recommendations": [],
+                "scenarios": [],
+                "processing_time_ms": int((time.time() - start) * 1000),
+                "top_k": limit,
+                "similarity_threshold": self._similarity_threshold,
+                "max_similarity": 0.0,
+                "mode": "embedding-unavailable",
+                "source": "none",
+            }
         scenarios = self._vector_service.search_scenarios_by_vector(
             query_vector,
             top_k=max(self._top_scenarios * 2, self._top_scenarios),
@@ -197,9 +216,12 @@ class ProductionRecommendationService:
     ) -> Dict[str, Any]:
         results: List[Dict[str, Any]] = []
         errors: List[Dict[str, Any]] = []
+        vectors = self._batch_embed(queries)
         for idx, raw_query in enumerate(queries):
             try:
-                result = self.recommend(raw_query, top_k=top_k)
+                result = self.recommend(
+                    raw_query, top_k=top_k, query_vector=vectors.get(idx)
+                )
                 result["index"] = idx
                 results.append(result)
             except Exception as exc:  # pragma: no cover - defensive catch for user data
@@ -221,6 +243,19 @@ class ProductionRecommendationService:
     # ----------------------------------------------------------------------------------
     # Internal helpers
     # ----------------------------------------------------------------------------------
+    def _batch_embed(self, queries: Sequence[str]) -> Dict[int, List[float]]:
+        """一次请求预计算全部查询向量；失败时返回空映射，由 recommend 逐条生成。"""
+        indexed = [
+            (idx, (q or "").strip()) for idx, q in enumerate(queries) if (q or "").strip()
+        ]
+        if not indexed:
+            return {}
+        try:
+            vectors = self._vector_service.generate_embeddings([q for _, q in indexed])
+        except Exception:
+            return {}
+        return {idx: vec for (idx, _), vec in zip(indexed, vectors)}
+
     def _rank_candidates(
         self,
         scenarios: Sequence[Dict[str, Any]],
@@ -4,6 +4,8 @@ from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field
 
+_JSON_DECODER = json.JSONDecoder()
+
 
 def parse_llm_response(llm_response: str) -> Dict[str, Any]:
     """Parse LLM output into a normalized JSON object.
@@ -59,36 +61,47 @@ def parse_llm_response(llm_response: str) -> Dict[str, Any]:
                             return s[start : i + 1]
             return None
 
-        candidate = extract_balanced_json(text)
-        if not candidate:
-            # Fallback: return minimal dict with summary snippet
-            return {
-                "recommendations": [],
-                "summary": (original_text[:200] if original_text else "解析失败: 未找到有效的JSON对象"),
-                "no_rag": True,
-                "rag_note": "LLM未输出JSON，已回退最小结构",
-            }
-
-        # remove trailing commas
-        candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+        # Fast path: strict JSON decoded by the C scanner straight from the first "{",
+        # skipping the per-character balance scan and regex repairs below
+        data = None
+        start = text.find("{")
+        if start != -1:
+            try:
+                data, _ = _JSON_DECODER.raw_decode(text, start)
+            except ValueError:
+                data = None
+
+        if data is None:
+            candidate = extract_balanced_json(text)
+            if not candidate:
+                # Fallback: return minimal dict with summary snippet
+                return {
+                    "recommendations": [],
+                    "summary": (original_text[:200] if original_text else "解析失败: 未找到有效的JSON对象"),
+                    "no_rag": True,
+                    "rag_note": "LLM未输出JSON，已回退最小结构",
+                }
+
+            # remove trailing commas
+            candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
 
-        try:
-            data = json.loads(candidate)
-        except Exception:
-            relaxed = candidate
-            relaxed = re.sub(r"([\{,]\s*)'([^'\n\r]+?)'(\s*:)", r'\1"\2"\3', relaxed)
-            relaxed = re.sub(r"(:\s*)'([^'\n\r]*?)'", r'\1"\2"', relaxed)
-            relaxed = re.sub(
-                r"([\{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)(\s*:)", r'\1"\2"\3', relaxed
-            )
-            relaxed = re.sub(r",\s*([}\]])", r"\1", relaxed)
             try:
-                data = json.loads(relaxed)
+                data = json.loads(candidate)
             except Exception:
-                import ast
-
-                data_py = ast.literal_eval(relaxed)
-                data = json.loads(json.dumps(data_py, ensure_ascii=False))
+                relaxed = candidate
+                relaxed = re.sub(r"([\{,]\s*)'([^'\n\r]+?)'(\s*:)", r'\1"\2"\3', relaxed)
+                relaxed = re.sub(r"(:\s*)'([^'\n\r]*?)'", r'\1"\2"', relaxed)
+                relaxed = re.sub(
+                    r"([\{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)(\s*:)", r'\1"\2"\3', relaxed
+                )
+                relaxed = re.sub(r",\s*([}\]])", r"\1", relaxed)
+                try:
+                    data = json.loads(relaxed)
+                except Exception:
+                    import ast
+
+                    data_py = ast.literal_eval(relaxed)
+                    data = json.loads(json.dumps(data_py, ensure_ascii=False))
 
         if not isinstance(data, dict):
             data = {"recommendations": data}
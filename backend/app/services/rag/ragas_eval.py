@@ -5,42 +5,65 @@ import subprocess
 import sys
 from typing import Any, Dict, List
 
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 
+def ragas_run_config():
+    """RunConfig for ragas.evaluate: rows x metrics judge calls share one bounded worker pool."""
+    from ragas.run_config import RunConfig  # type: ignore
+
+    return RunConfig(
+        max_workers=max(1, settings.RAGAS_MAX_WORKERS),
+        max_retries=settings.RAGAS_MAX_RETRIES,
+        max_wait=settings.RAGAS_MAX_WAIT,
+    )
+
+
 def build_contexts_from_payload(payload: Dict[str, Any]) -> List[str]:
-    contexts: List[str] = []
+    # A scenario usually appears in both lists (and several recommendations can
+    # share one reason); keep the first occurrence of each text so every context
+    # is judged once. dict keeps insertion order with O(1) membership.
+    seen: Dict[str, None] = {}
     for sc in payload.get("scenarios_with_recommendations") or []:
         desc = sc.get("scenario_description") or sc.get("description_zh")
         if desc:
-            contexts.append(desc)
+            seen[desc] = None
         for r in (sc.get("recommendations") or []):
             reason = r.get("reasoning_zh")
             if reason:
-                contexts.append(reason)
+                seen[reason] = None
     for sc in payload.get("scenarios") or []:
         desc = sc.get("description_zh")
         if desc:
-            contexts.append(desc)
-    return contexts
+            seen[desc] = None
+    return list(seen)
 
 
 def format_answer_for_ragas(parsed: Dict[str, Any]) -> str:
-    lines: List[str] = []
-    for r in parsed.get("recommendations") or []:
-        name = r.get("procedure_name", "")
-        mod = r.get("modality", "")
-        rating = r.get("appropriateness_rating", "")
-        reason = r.get("recommendation_reason", "")
-        t = f"{name} ({mod}) - 评分: {rating}"
-        if reason:
-            t += f"\n理由: {reason}"
-        lines.append(t)
-    if parsed.get("summary"):
-        lines.append(f"总结: {parsed.get('summary')}")
+    # One f-string per recommendation, joined once; no per-line += concatenation
+    lines: List[str] = [
+        f"{r.get('procedure_name', '')} ({r.get('modality', '')}) - 评分: {r.get('appropriateness_rating', '')}"
+        + (f"\n理由: {r['recommendation_reason']}" if r.get("recommendation_reason") else "")
+        for r in parsed.get("recommendations") or []
+    ]
+    summary = parsed.get("summary")
+    if summary:
+        lines.append(f"总结: {summary}")
     return "\n".join(lines) if lines else "无"
 
 
+def has_real_reference(reference: Any, answer: Any) -> bool:
+    """True when a non-empty reference exists and is not just a copy of the answer.
+
+    Reference-based metrics (context_precision / context_recall) judged against
+    the answer itself cost extra LLM calls without measuring anything.
+    """
+    ref = str(reference).strip() if reference else ""
+    return bool(ref) and ref != str(answer or "").strip()
+
+
 def compute_ragas_scores(user_input: str, answer: str, contexts: List[str], reference: str,
                          eval_context: Dict[str, Any]) -> Dict[str, float]:
     """Compute RAGAS metrics in-process with fallback to an isolated subprocess.
@@ -72,8 +95,11 @@ def compute_ragas_scores(user_input: str, answer: str, contexts: List[str], refe
 
         llm = ChatOpenAI(model=llm_model, api_key=api_key, base_url=base_url, temperature=temperature, top_p=top_p)
         emb = OpenAIEmbeddings(model=emb_model, api_key=api_key, base_url=base_url)
+        # Reuse vectors for identical questions/contexts across samples and reruns
+        from app.services.embedding_cache import cached_embeddings
+        emb = cached_embeddings(emb, emb_model)
 
-        has_ref = bool(reference and str(reference).strip())
+        has_ref = has_real_reference(reference, answer)
         if has_ref:
             data_dict = {
                 "question": [user_input],
@@ -87,7 +113,9 @@ def compute_ragas_scores(user_input: str, answer: str, contexts: List[str], refe
             metrics = [faithfulness, answer_relevancy]
 
         data = Dataset.from_dict(data_dict)
-        res = ragas.evaluate(dataset=data, metrics=metrics, llm=llm, embeddings=emb)
+        res = ragas.evaluate(
+            dataset=data, metrics=metrics, llm=llm, embeddings=emb, run_config=ragas_run_config()
+        )
         if isinstance(res, dict):
             base = res
         elif hasattr(res, "scores") and isinstance(res.scores, dict):
@@ -161,7 +189,8 @@ llm_model = os.getenv('SILICONFLOW_LLM_MODEL', cfg.get('llm_model', 'Qwen/Qwen2.
 emb_model = os.getenv('SILICONFLOW_EMBEDDING_MODEL', cfg.get('embedding_model', 'BAAI/bge-m3'))
 llm = ChatOpenAI(model=llm_model, api_key=api_key, base_url=base_url, temperature=0)
 emb = OpenAIEmbeddings(model=emb_model, api_key=api_key, base_url=base_url)
-has_ref = bool(reference and str(reference).strip())
+# A reference identical to the answer carries no signal; skip reference-based metrics
+has_ref = bool(reference and str(reference).strip() and str(reference).strip() != str(answer or '').strip())
 if has_ref:
     data_dict = { 'question': [user_input], 'answer': [answer], 'contexts': [contexts], 'ground_truth': [reference] }
     metrics = [faithfulness, answer_relevancy, context_precision, context_recall]
@@ -18,7 +18,11 @@ import openai
 from app.core.config import settings
 from app.services.rules_engine import load_engine
 from app.services.query_signals import QuerySignalExtractor
-from dotenv import load_dotenv
+from app.services.rag.ragas_eval import (
+    build_contexts_from_payload,
+    format_answer_for_ragas,
+    has_real_reference,
+)
 from pydantic import BaseModel, ValidationError, Field
 from typing import Union
 from pathlib import Path
@@ -26,20 +30,12 @@ import threading
 import hashlib
 from collections import OrderedDict
 
-# 加载环境变量：默认读取 backend/.env；若在容器环境可通过 SKIP_LOCAL_DOTENV/DOCKER_CONTEXT 禁用
-try:
-    if os.getenv('SKIP_LOCAL_DOTENV', '').lower() == 'true' or os.getenv('DOCKER_CONTEXT', '').lower() == 'true':
-        pass
-    else:
-        env_path = Path(__file__).resolve().parents[2] / ".env"
-        if env_path.exists():
-            load_dotenv(str(env_path))
-        else:
-            load_dotenv()
-except Exception:
-    pass
+# backend/.env 已由 app.core.config 在导入时载入进程环境
 
 logger = logging.getLogger(__name__)
+
+_JSON_DECODER = json.JSONDecoder()
+
 # 严格嵌入模式：默认开启。为兼容本地调试，可通过 STRICT_EMBEDDING=false 放宽为随机向量兜底（仅调试）。
 STRICT_EMBEDDING = (os.getenv("STRICT_EMBEDDING", "true").lower() in ("1", "true", "yes"))
 
@@ -932,40 +928,51 @@ JSON中不允许出现尾随逗号
                                 return s[start:i+1]
                 return None
 
-            candidate = extract_balanced_json(text)
-            if not candidate:
-                raise ValueError("未找到有效的JSON对象")
+            # 快速路径：严格 JSON 直接由 C 实现的解码器从首个 "{" 解析，
+            # 省去逐字符的括号平衡扫描与正则修复
+            data = None
+            start = text.find('{')
+            if start != -1:
+                try:
+                    data, _ = _JSON_DECODER.raw_decode(text, start)
+                except ValueError:
+                    data = None
 
-            # 去掉可能的尾随逗号
-            candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+            if data is None:
+                candidate = extract_balanced_json(text)
+                if not candidate:
+                    raise ValueError("未找到有效的JSON对象")
 
-            # 一次尝试：严格JSON解析
-            try:
-                data = json.loads(candidate)
-            except Exception:
-                # 针对部分模型（如 Ollama 上的 gpt-oss）输出的宽松JSON：
-                # 1) 单引号键/值 -> 双引号；2) 未加引号的键 -> 自动补双引号
-                relaxed = candidate
-                # 单引号包裹的键：{'key': → {"key":
-                relaxed = re.sub(r"([\{,]\s*)'([^'\n\r]+?)'(\s*:)", r'\1"\2"\3', relaxed)
-                # 单引号包裹的字符串值：: 'val' → : "val"
-                relaxed = re.sub(r"(:\s*)'([^'\n\r]*?)'", r'\1"\2"', relaxed)
-                # 未加引号的简单键：{ key: → { "key":
-                relaxed = re.sub(r"([\{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)(\s*:)", r'\1"\2"\3', relaxed)
-                # 再次移除尾随逗号
-                relaxed = re.sub(r",\s*([}\]])", r"\1", relaxed)
+                # 去掉可能的尾随逗号
+                candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+
+                # 一次尝试：严格JSON解析
                 try:
-                    data = json.loads(relaxed)
+                    data = json.loads(candidate)
                 except Exception:
-                    # 最后兜底：尝试使用 ast.literal_eval 解析 python风格字典
+                    # 针对部分模型（如 Ollama 上的 gpt-oss）输出的宽松JSON：
+                    # 1) 单引号键/值 -> 双引号；2) 未加引号的键 -> 自动补双引号
+                    relaxed = candidate
+                    # 单引号包裹的键：{'key': → {"key":
+                    relaxed = re.sub(r"([\{,]\s*)'([^'\n\r]+?)'(\s*:)", r'\1"\2"\3', relaxed)
+                    # 单引号包裹的字符串值：: 'val' → : "val"
+                    relaxed = re.sub(r"(:\s*)'([^'\n\r]*?)'", r'\1"\2"', relaxed)
+                    # 未加引号的简单键：{ key: → { "key":
+                    relaxed = re.sub(r"([\{,]\s*)([A-Za-z_][A-Za-z0-9_\-]*)(\s*:)", r'\1"\2"\3', relaxed)
+                    # 再次移除尾随逗号
+                    relaxed = re.sub(r",\s*([}\]])", r"\1", relaxed)
                     try:
-                        import ast
-                        data_py = ast.literal_eval(relaxed)
-                        # 确保可序列化
-                        data = json.loads(json.dumps(data_py, ensure_ascii=False))
-                    except Exception as _:
-                        # 维持原有异常流程，由下方容错解析兜底
-                        raise
+                        data = json.loads(relaxed)
+                    except Exception:
+                        # 最后兜底：尝试使用 ast.literal_eval 解析 python风格字典
+                        try:
+                            import ast
+                            data_py = ast.literal_eval(relaxed)
+                            # 确保可序列化
+                            data = json.loads(json.dumps(data_py, ensure_ascii=False))
+                        except Exception as _:
+                            # 维持原有异常流程，由下方容错解析兜底
+                            raise
 
             # 结果规范化
             if not isinstance(data, dict):
@@ -1672,35 +1679,12 @@ JSON中不允许出现尾随逗号
         return signals
 
     def _build_ragas_contexts_from_payload(self, payload: Dict[str, Any]) -> List[str]:
-        contexts = []
-        for sc in payload.get('scenarios_with_recommendations') or []:
-            desc = sc.get('scenario_description') or sc.get('description_zh')
-            if desc:
-                contexts.append(desc)
-            for r in (sc.get('recommendations') or []):
-                reason = r.get('reasoning_zh')
-                if reason:
-                    contexts.append(reason)
-        for sc in payload.get('scenarios') or []:
-            desc = sc.get('description_zh')
-            if desc:
-                contexts.append(desc)
-        return contexts
+        # 与模块化实现共用同一逻辑（按首次出现去重）
+        return build_contexts_from_payload(payload)
 
     def _format_answer_for_ragas(self, parsed: Dict[str, Any]) -> str:
-        lines = []
-        for r in parsed.get('recommendations') or []:
-            name = r.get('procedure_name', '')
-            mod = r.get('modality', '')
-            rating = r.get('appropriateness_rating', '')
-            reason = r.get('recommendation_reason', '')
-            t = f"{name} ({mod}) - 评分: {rating}"
-            if reason:
-                t += f"\n理由: {reason}"
-            lines.append(t)
-        if parsed.get('summary'):
-            lines.append(f"总结: {parsed.get('summary')}")
-        return "\n".join(lines) if lines else "无"
+        # 与模块化实现共用同一格式化逻辑
+        return format_answer_for_ragas(parsed)
 
     def _compute_ragas_scores(self, user_input: str, answer: str, contexts: List[str], reference: str) -> Dict[str, float]:
         """Compute RAGAS scores.
@@ -1727,8 +1711,12 @@ JSON中不允许出现尾随逗号
 
             llm = ChatOpenAI(model=llm_model, api_key=api_key, base_url=base_url, temperature=temperature, top_p=top_p)
             emb = OpenAIEmbeddings(model=emb_model, api_key=api_key, base_url=base_url)
+            # 相同问题/上下文跨样本、跨批次复用向量
+            from app.services.embedding_cache import cached_embeddings
+            emb = cached_embeddings(emb, emb_model)
 
-            has_ref = bool(reference and str(reference).strip())
+            # 标准答案为空或与答案相同时，不计算依赖标准答案的指标
+            has_ref = has_real_reference(reference, answer)
             if has_ref:
                 data_dict = {
                     "question": [user_input],
@@ -1755,11 +1743,14 @@ JSON中不允许出现尾随逗号
                 ]
 
             data = Dataset.from_dict(data_dict)
+            # 显式指定执行器并发与重试，各指标的评测 LLM 调用并行发出
+            from app.services.rag.ragas_eval import ragas_run_config
             res = ragas.evaluate(
                 dataset=data,
                 metrics=metrics,
                 llm=llm,
                 embeddings=emb,
+                run_config=ragas_run_config(),
             )
             # Normalize possible output formats
             if isinstance(res, dict):
@@ -1860,7 +1851,8 @@ emb_model = os.getenv('SILICONFLOW_EMBEDDING_MODEL', 'BAAI/bge-m3')
 llm = ChatOpenAI(model=llm_model, api_key=api_key, base_url=base_url, temperature=0)
 emb = OpenAIEmbeddings(model=emb_model, api_key=api_key, base_url=base_url)
 
-has_ref = bool(reference and str(reference).strip())
+# A reference identical to the answer carries no signal; skip reference-based metrics
+has_ref = bool(reference and str(reference).strip() and str(reference).strip() != str(answer or '').strip())
 if has_ref:
     data_dict = {
         'question': [user_input],
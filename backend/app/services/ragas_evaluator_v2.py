@@ -4,11 +4,12 @@
 """
 import os
 import json
+import math
+import time
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional
-import numpy as np
-import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterator
 from pathlib import Path
 
 try:
@@ -20,8 +21,27 @@ except ImportError as e:
     logging.warning(f"RAGAS相关依赖未安装: {e}")
     RAGAS_AVAILABLE = False
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库 json
+    orjson = None
+
+from app.services.embedding_cache import cached_embeddings
+
 logger = logging.getLogger(__name__)
 
+METRICS = ('faithfulness', 'answer_relevancy', 'context_precision', 'context_recall')
+# 批量评估时同时在途的样本数（各样本独立，耗时主要在等待 LLM 接口）
+DEFAULT_BATCH_CONCURRENCY = 8
+
+
+def _score_or_zero(score: Any) -> float:
+    """指标分数转 float，None/NaN 记为 0"""
+    if score is None:
+        return 0.0
+    score = float(score)
+    return 0.0 if math.isnan(score) else score
+
 class ACRACRAGASEvaluator:
     """ACRAC专用RAGAS评估器"""
     
@@ -75,12 +95,16 @@ class ACRACRAGASEvaluator:
             max_retries=2
         )
         
-        self.embeddings = OpenAIEmbeddings(
-            model=self.embedding_model,
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=60,
-            max_retries=2
+        # 按内容哈希缓存向量，重跑同一批数据时不再重复请求嵌入接口
+        self.embeddings = cached_embeddings(
+            OpenAIEmbeddings(
+                model=self.embedding_model,
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=60,
+                max_retries=2
+            ),
+            self.embedding_model,
         )
         # 统一对外可见的模型名字段（供上层记录/展示）
         self.llm_model_name = self.llm_model
@@ -131,7 +155,7 @@ class ACRACRAGASEvaluator:
             # 评估faithfulness
             try:
                 score = await self.faithfulness.single_turn_ascore(sample)
-                results['faithfulness'] = float(score) if not pd.isna(score) else 0.0
+                results['faithfulness'] = _score_or_zero(score)
                 logger.info(f"faithfulness: {results['faithfulness']:.4f}")
             except Exception as e:
                 logger.error(f"faithfulness评估失败: {e}")
@@ -140,7 +164,7 @@ class ACRACRAGASEvaluator:
             # 评估context_precision
             try:
                 score = await self.context_precision.single_turn_ascore(sample)
-                results['context_precision'] = float(score) if not pd.isna(score) else 0.0
+                results['context_precision'] = _score_or_zero(score)
                 logger.info(f"context_precision: {results['context_precision']:.4f}")
             except Exception as e:
                 logger.error(f"context_precision评估失败: {e}")
@@ -149,7 +173,7 @@ class ACRACRAGASEvaluator:
             # 评估context_recall
             try:
                 score = await self.context_recall.single_turn_ascore(sample)
-                results['context_recall'] = float(score) if not pd.isna(score) else 0.0
+                results['context_recall'] = _score_or_zero(score)
                 logger.info(f"context_recall: {results['context_recall']:.4f}")
             except Exception as e:
                 logger.error(f"context_recall评估失败: {e}")
@@ -187,39 +211,72 @@ class ACRACRAGASEvaluator:
                 'context_recall': 0.0
             }
 
-    def evaluate_batch(self, data_list: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """批量评估"""
+    async def evaluate_batch_async(self, data_list: List[Dict[str, Any]],
+                                   concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> List[Dict[str, float]]:
+        """并发评估多个样本（信号量限制同时在途数，结果顺序与输入一致）"""
+        n = len(data_list)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def bounded(i: int, data: Dict[str, Any]) -> Dict[str, float]:
+            async with semaphore:
+                logger.info(f"评估样本 {i+1}/{n}")
+                return await self.evaluate_sample_async(data)
+        
+        return list(await asyncio.gather(*[bounded(i, data) for i, data in enumerate(data_list)]))
+
+    def evaluate_batch(self, data_list: List[Dict[str, Any]],
+                       concurrency: int = DEFAULT_BATCH_CONCURRENCY) -> Dict[str, Any]:
+        """批量评估（单个事件循环内并发执行）"""
         if not data_list:
             return {
-                'avg_scores': {'faithfulness': 0.0, 'answer_relevancy': 0.0, 'context_precision': 0.0, 'context_recall': 0.0},
+                'avg_scores': {metric: 0.0 for metric in METRICS},
                 'individual_scores': [],
+                'metric_scores': {metric: [] for metric in METRICS},
                 'total_samples': 0
             }
         
-        individual_scores = []
+        n = len(data_list)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            individual_scores = loop.run_until_complete(self.evaluate_batch_async(data_list, concurrency))
+        finally:
+            loop.close()
         
-        for i, data in enumerate(data_list):
-            logger.info(f"评估样本 {i+1}/{len(data_list)}")
-            scores = self.evaluate_sample(data)
-            individual_scores.append(scores)
+        # 按指标分列存放（预分配），同步累加后直接求平均
+        metric_scores = {metric: [0.0] * n for metric in METRICS}
+        sums = dict.fromkeys(METRICS, 0.0)
         
-        # 计算平均分
-        avg_scores = {}
-        for metric in ['faithfulness', 'answer_relevancy', 'context_precision', 'context_recall']:
-            scores = [s[metric] for s in individual_scores]
-            avg_scores[metric] = np.mean(scores) if scores else 0.0
+        for i, scores in enumerate(individual_scores):
+            for metric in METRICS:
+                value = scores.get(metric, 0.0)
+                metric_scores[metric][i] = value
+                sums[metric] += value
         
         return {
-            'avg_scores': avg_scores,
+            'avg_scores': {metric: sums[metric] / n for metric in METRICS},
             'individual_scores': individual_scores,
-            'total_samples': len(data_list)
+            'metric_scores': metric_scores,
+            'total_samples': n
         }
 
+    @staticmethod
+    def iter_real_data(file_path: str) -> Iterator[Dict[str, Any]]:
+        """逐行读取 JSON Lines 格式的推理数据（每行一条），内存占用与文件大小无关"""
+        loads = orjson.loads if orjson is not None else json.loads
+        with open(file_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+
     def load_real_data(self, file_path: str) -> List[Dict[str, Any]]:
-        """加载真实推理数据"""
+        """加载真实推理数据（.jsonl 按行流式解析，其余按单个 JSON 数组解析）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if str(file_path).endswith('.jsonl'):
+                data = list(self.iter_real_data(file_path))
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
             
             logger.info(f"加载了 {len(data)} 条真实推理数据")
             return data
@@ -236,14 +293,18 @@ class ACRACRAGASEvaluator:
             
             # 添加时间戳和元数据
             results['evaluation_metadata'] = {
-                'timestamp': pd.Timestamp.now().isoformat(),
+                'timestamp': datetime.now().isoformat(),
                 'evaluator_version': 'ACRAC_RAGAS_V2',
                 'llm_model': self.llm_model,
                 'embedding_model': self.embedding_model
             }
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
+            if orjson is not None:
+                with open(output_file, 'wb') as f:
+                    f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            else:
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    json.dump(results, f, ensure_ascii=False, indent=2)
             
             logger.info(f"评估结果已保存到: {output_path}")
             
@@ -258,15 +319,10 @@ if __name__ == "__main__":
     # 设置详细日志
     logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
     
-    # 加载环境变量
-    env_file = Path(__file__).parent.parent.parent / '.env'
-    if env_file.exists():
-        with open(env_file, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
+    # 加载环境变量（已由进程环境提供密钥时跳过读取文件；不覆盖已有变量）
+    if not os.getenv("SILICONFLOW_API_KEY"):
+        from dotenv import load_dotenv
+        load_dotenv(Path(__file__).parent.parent.parent / '.env', override=False)
     
     try:
         # 创建评估器
@@ -290,7 +346,7 @@ if __name__ == "__main__":
                 print(f"  {status} {metric}: {score:.4f}")
             
             # 保存结果
-            output_file = f"acrac_ragas_evaluation_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json"
+            output_file = f"acrac_ragas_evaluation_{time.strftime('%Y%m%d_%H%M%S')}.json"
             evaluator.save_results(results, output_file)
             
             print(f"\n🎯 评估完成，结果已保存到: {output_file}")
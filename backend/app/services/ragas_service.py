@@ -2,23 +2,60 @@
 import os
 import json
 import uuid
+import hashlib
 import time
 import logging
-import requests
 import asyncio
-from typing import List, Dict, Any, Optional
+import weakref
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 
+import httpx
+import numpy as np
+
+try:
+    import redis
+except ImportError:  # 可选依赖，未安装时推理响应只做进程内缓存
+    redis = None
+
 from fastapi import HTTPException
+from sqlalchemy import bindparam, select, text
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.schemas.ragas_schemas import TestCaseBase, EvaluationResult, TaskStatus
 from app.models.ragas_models import EvaluationTask, ScenarioResult, EvaluationMetrics
+from app.services.metric_agg import nanmean_columns
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# RAG 推理请求超时（秒）
+RAG_API_TIMEOUT = 120.0
+
+# 单次评测并发度上限；共享连接池按此上限设定大小
+MAX_EVAL_CONCURRENCY = 32
+
+# AsyncClient 与事件循环绑定，按循环缓存：Celery worker 的常驻循环上各次任务复用 keep-alive 连接与 TLS 会话
+_rag_http_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_rag_http_client() -> httpx.AsyncClient:
+    """返回当前事件循环共享的 RAG API 异步客户端（不随单次评测关闭）"""
+    loop = asyncio.get_running_loop()
+    client = _rag_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=RAG_API_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MAX_EVAL_CONCURRENCY, max_keepalive_connections=MAX_EVAL_CONCURRENCY
+            ),
+        )
+        _rag_http_clients[loop] = client
+    return client
+
 # 文件上传配置
 UPLOAD_DIR = Path("uploads/ragas")
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
@@ -163,17 +200,420 @@ def validate_test_cases(test_cases: List[TestCaseBase]) -> tuple[List[TestCaseBa
     
     return valid_cases, errors
 
+
+RAGAS_METRIC_KEYS = ("faithfulness", "answer_relevancy", "context_precision", "context_recall")
+
+
+def summarize_ragas_scores(results: List[Dict[str, Any]]) -> Optional[Dict[str, Optional[float]]]:
+    """各项 RAGAS 指标的均值：按 (N, 4) 矩阵逐列求均值，缺失值/NaN 不计入"""
+    if not results:
+        return None
+    scores = np.array(
+        [[(r.get("ragas_scores") or {}).get(k) for k in RAGAS_METRIC_KEYS] for r in results],
+        dtype=np.float64,
+    )
+    means = nanmean_columns(scores)
+    return {k: (None if np.isnan(m) else float(m)) for k, m in zip(RAGAS_METRIC_KEYS, means)}
+
+
+def overall_ragas_score(summary: Optional[Dict[str, Optional[float]]]) -> Optional[float]:
+    """总体得分：各项均值的平均（忽略缺失项）"""
+    values = [v for v in (summary or {}).values() if v is not None]
+    return float(np.mean(values)) if values else None
+
+
+# 批量评测默认并发度与进度提交间隔（每完成 K 条用例提交一次）
+DEFAULT_EVAL_CONCURRENCY = 8
+_PROGRESS_COMMIT_EVERY = 5
+
+# ==================== 推理响应缓存 ====================
+# 以 (RAG_API_URL, 请求载荷) 的哈希精确匹配：进程内 LRU 为第一层，Redis 为跨进程/跨次运行的第二层。
+# 不做语义近似匹配——临床查询仅差侧别、增强与否时推荐即不同，近似命中会污染评测结果。
+
+_RAG_RESPONSE_KEY_PREFIX = "ragresp:"
+_RAG_RESPONSE_MEMO_SIZE = 1024
+_rag_response_memo: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_rag_response_redis = None
+_rag_response_redis_checked = False
+
+
+def _rag_response_key(rag_api_url: str, payload: Dict[str, Any]) -> str:
+    raw = json.dumps([rag_api_url, payload], ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return _RAG_RESPONSE_KEY_PREFIX + hashlib.sha256(raw).hexdigest()
+
+
+def _get_rag_response_redis():
+    """懒加载 Redis 客户端；不可用时返回 None 且不再重试"""
+    global _rag_response_redis, _rag_response_redis_checked
+    if not _rag_response_redis_checked:
+        _rag_response_redis_checked = True
+        if redis is not None:
+            try:
+                client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1.0)
+                client.ping()
+                _rag_response_redis = client
+            except Exception as e:
+                logger.warning(f"推理响应缓存 Redis 不可用，仅使用进程内缓存: {e}")
+    return _rag_response_redis
+
+
+def _remember_rag_response(key: str, rag_result: Dict[str, Any]) -> None:
+    _rag_response_memo[key] = rag_result
+    _rag_response_memo.move_to_end(key)
+    if len(_rag_response_memo) > _RAG_RESPONSE_MEMO_SIZE:
+        _rag_response_memo.popitem(last=False)
+
+
+def _redis_get_rag_response(key: str) -> Optional[Dict[str, Any]]:
+    client = _get_rag_response_redis()
+    if client is None:
+        return None
+    try:
+        raw = client.get(key)
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"读取推理响应缓存失败: {e}")
+        return None
+
+
+def _redis_set_rag_response(key: str, rag_result: Dict[str, Any]) -> None:
+    client = _get_rag_response_redis()
+    if client is None:
+        return
+    try:
+        client.set(
+            key,
+            json.dumps(rag_result, ensure_ascii=False, default=str),
+            ex=settings.RAG_EVAL_RESPONSE_CACHE_TTL,
+        )
+    except Exception as e:
+        logger.warning(f"写入推理响应缓存失败: {e}")
+
+
+async def fetch_rag_result(
+    http_client: httpx.AsyncClient, rag_api_url: str, payload: Dict[str, Any]
+) -> Dict[str, Any]:
+    """调用 RAG-LLM 推理接口；启用 RAG_EVAL_RESPONSE_CACHE_ENABLED 时先查缓存，未命中才发请求"""
+    if not settings.RAG_EVAL_RESPONSE_CACHE_ENABLED:
+        resp = await http_client.post(rag_api_url, json=payload)
+        resp.raise_for_status()
+        return resp.json()
+
+    key = _rag_response_key(rag_api_url, payload)
+    rag_result = _rag_response_memo.get(key)
+    if rag_result is None:
+        rag_result = await asyncio.to_thread(_redis_get_rag_response, key)
+    if rag_result is None:
+        resp = await http_client.post(rag_api_url, json=payload)
+        resp.raise_for_status()
+        rag_result = resp.json()
+        await asyncio.to_thread(_redis_set_rag_response, key, rag_result)
+    _remember_rag_response(key, rag_result)
+    return rag_result
+
+
+def _build_trace(rag_result: Dict[str, Any]) -> Dict[str, Any]:
+    """构造/兜底 trace（以便前端中间过程展示）"""
+    trace = (rag_result or {}).get("trace") or {}
+    if trace:
+        return trace
+    scenarios = (rag_result or {}).get("scenarios") or []
+    # 构造 recall 视图
+    recall_list = []
+    for s in scenarios:
+        recall_list.append({
+            "id": s.get("semantic_id") or s.get("id"),
+            "similarity": s.get("similarity"),
+            "panel": s.get("panel_name"),
+            "topic": s.get("topic_name"),
+            "_rerank_score": s.get("_rerank_score"),
+        })
+    # 构造 rerank 视图
+    rerank_list = sorted(
+        recall_list,
+        key=lambda x: (
+            x.get("_rerank_score") is None,
+            -(x.get("_rerank_score") or 0.0),
+            -(x.get("similarity") or 0.0),
+        ),
+    )
+    # 最终 prompt 预览/长度
+    dbg = (rag_result or {}).get("debug_info") or {}
+    final_prompt = dbg.get("step_6_prompt_preview") if isinstance(dbg.get("step_6_prompt_preview"), str) else None
+    return {
+        "recall_scenarios": recall_list,
+        "rerank_scenarios": rerank_list,
+        "final_prompt": final_prompt,
+        "llm_parsed": (rag_result or {}).get("llm_recommendations") or {},
+    }
+
+
+def build_answer_text(rag_result: Optional[Dict[str, Any]]) -> str:
+    """由 RAG 响应的前 3 条 LLM 推荐拼接评测用答案文本"""
+    llm_recs = (rag_result or {}).get("llm_recommendations", {})
+    recommendations = llm_recs.get("recommendations", []) if isinstance(llm_recs, dict) else []
+    if recommendations:
+        return "推荐的影像学检查：\n" + "\n".join(
+            f"- {rec.get('procedure_name','')} (适宜性: {rec.get('appropriateness_rating','')})"
+            for rec in recommendations[:3]
+        )
+    return "暂无推荐的影像学检查"
+
+
+def build_contexts(rag_result: Optional[Dict[str, Any]]) -> List[str]:
+    """由 RAG 响应的前 3 个场景构造 RAGAS 评分用上下文"""
+    contexts: List[str] = []
+    for sc in (rag_result or {}).get("scenarios", [])[:3]:
+        try:
+            ctx = f"场景: {sc.get('panel_name','')} - {sc.get('topic_name','')}"
+            if sc.get("clinical_scenario"):
+                ctx += f"\n临床场景: {sc['clinical_scenario']}"
+            contexts.append(ctx)
+        except Exception:
+            continue
+    return contexts
+
+
+def _case_fields(i: int, test_case: Dict[str, Any]) -> Tuple[str, str, str]:
+    """提取用例的 (临床查询, 标准答案, 题号)"""
+    clinical_query = (
+        test_case.get("clinical_query")
+        or test_case.get("question")
+        or test_case.get("clinical_scenario")
+        or ""
+    )
+    ground_truth = test_case.get("ground_truth") or test_case.get("standard_answer") or ""
+    question_id = test_case.get("question_id") or test_case.get("scenario_id") or f"case_{i+1}"
+    return clinical_query, ground_truth, question_id
+
+
+def _case_key(i: int, test_case: Dict[str, Any]) -> bytes:
+    """用例去重键：对 (临床查询, 标准答案) 做字节级哈希，与题号无关"""
+    clinical_query, ground_truth, _ = _case_fields(i, test_case)
+    payload = json.dumps([clinical_query, ground_truth], ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+def _rebind_outcome(outcome: Dict[str, Any], i: int, test_case: Dict[str, Any]) -> Dict[str, Any]:
+    """将去重后的评测结果复制给重复用例，仅替换题号"""
+    _, _, question_id = _case_fields(i, test_case)
+    return {
+        "result": {**outcome["result"], "question_id": question_id},
+        "record": {**outcome["record"], "scenario_id": str(question_id)},
+    }
+
+
+# 按 task_id 取任务：语句在导入时构造一次，执行时命中 SQLAlchemy 编译缓存
+TASK_BY_ID_STMT = select(EvaluationTask).where(EvaluationTask.task_id == bindparam("tid"))
+
+_TASK_PROGRESS_SQL = text(
+    """
+    UPDATE evaluation_tasks
+    SET completed_scenarios = :completed,
+        failed_scenarios = :failed,
+        progress_percentage = :pct
+    WHERE task_id = :task_id
+    """
+)
+
+
+def _report_task_progress(
+    db: Session, task_id: str, completed: int, failed: int, total: int,
+    rows: Optional[List[Dict[str, Any]]] = None,
+) -> None:
+    """
+    批量写入自上次提交以来完成的单条结果，并以单条 UPDATE 写入任务进度（不经过 ORM 加载/脏检查），
+    二者同一事务提交：轮询接口可看到已完成的结果，进程中断时已提交的用例不会丢失。
+    """
+    if rows:
+        db.bulk_insert_mappings(ScenarioResult, rows)
+    pct = int(((completed + failed) / max(total, 1)) * 100)
+    db.execute(
+        _TASK_PROGRESS_SQL,
+        {"completed": completed, "failed": failed, "pct": pct, "task_id": task_id},
+    )
+    db.commit()
+
+
+async def _infer_case(
+    i: int,
+    test_case: Dict[str, Any],
+    rag_api_url: str,
+    rag_params: Dict[str, Any],
+    http_client: httpx.AsyncClient,
+) -> Optional[Dict[str, Any]]:
+    """
+    推理阶段：经共享的异步 HTTP 客户端调用 RAG-LLM 推理接口。
+
+    Returns:
+        {"rag_result", "inference_started_at", "inference_completed_at"}；RAG API 调用失败时返回 None
+    """
+    clinical_query, ground_truth, _ = _case_fields(i, test_case)
+
+    # 构造 RAG 推理请求载荷（开启 debug 便于前端展示 trace）
+    rag_payload = {
+        "clinical_query": clinical_query,
+        **rag_params,
+        "show_reasoning": True,
+        "debug_mode": True,
+        "include_raw_data": True,
+        # 评分在本函数内进行，避免与远端重复
+        "compute_ragas": False,
+        "ground_truth": ground_truth,
+    }
+
+    inference_started_at = None
+    inference_completed_at = None
+
+    # 调用 RAG-LLM HTTP API
+    try:
+        inference_started_at = datetime.now()
+        rag_result = await fetch_rag_result(http_client, rag_api_url, rag_payload)
+        inference_completed_at = datetime.now()
+    except Exception as e:
+        logger.error(f"RAG API 调用失败: {e}")
+        # 限流/退避（占用推理槽位，避免立即重试打满下游）
+        await asyncio.sleep(0.5)
+        return None
+    return {
+        "rag_result": rag_result,
+        "inference_started_at": inference_started_at,
+        "inference_completed_at": inference_completed_at,
+    }
+
+
+async def _score_case(
+    i: int,
+    test_case: Dict[str, Any],
+    inferred: Dict[str, Any],
+    model_name: str,
+    eva_ctx: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    评分阶段：由推理结果提取答案与上下文并计算 RAGAS 分数（阻塞的评分调用放到线程池执行）。
+
+    Returns:
+        {"result": 返回给调用方的结果, "record": ScenarioResult 字段}
+    """
+    clinical_query, ground_truth, question_id = _case_fields(i, test_case)
+    rag_result = inferred["rag_result"]
+    inference_started_at = inferred["inference_started_at"]
+    inference_completed_at = inferred["inference_completed_at"]
+
+    # 提取 LLM 推荐并拼接文本答案
+    answer_text = build_answer_text(rag_result)
+
+    trace = _build_trace(rag_result)
+
+    # 提取场景上下文（用于 RAGAS 评分）
+    contexts = build_contexts(rag_result)
+
+    # 计算 RAGAS 分数（若可用）
+    evaluation_started_at = None
+    evaluation_completed_at = None
+    ragas_scores = {
+        "faithfulness": 0.0,
+        "answer_relevancy": 0.0,
+        "context_precision": 0.0,
+        "context_recall": 0.0,
+    }
+    if contexts and answer_text and ground_truth:
+        try:
+            evaluation_started_at = datetime.now()
+            # 使用主服务中的统一实现，确保四项指标（含 answer_relevancy）一致
+            from app.services.rag_llm_recommendation_service import rag_llm_service  # 延迟导入避免环依赖
+            ragas_scores = await asyncio.to_thread(
+                rag_llm_service._compute_ragas_scores,
+                user_input=clinical_query,
+                answer=answer_text,
+                contexts=contexts,
+                reference=ground_truth,
+            )
+            evaluation_completed_at = datetime.now()
+            logger.info(f"RAGAS评分计算完成: {ragas_scores}")
+        except Exception as e:
+            logger.warning(f"RAGAS评分计算失败，已跳过该样本评分: {e}")
+            evaluation_completed_at = datetime.now() if evaluation_started_at else None
+
+    # 单条整体得分
+    try:
+        overall_score = (
+            ragas_scores.get("faithfulness", 0.0)
+            + ragas_scores.get("answer_relevancy", 0.0)
+            + ragas_scores.get("context_precision", 0.0)
+            + ragas_scores.get("context_recall", 0.0)
+        ) / 4.0
+    except Exception:
+        overall_score = None
+
+    record = dict(
+        scenario_id=str(question_id),
+        clinical_scenario=clinical_query,
+        rag_question=clinical_query,
+        rag_answer=answer_text,
+        rag_contexts=contexts,
+        rag_trace_data=trace,
+        standard_answer=ground_truth,
+        faithfulness_score=ragas_scores.get("faithfulness", 0.0),
+        answer_relevancy_score=ragas_scores.get("answer_relevancy", 0.0),
+        context_precision_score=ragas_scores.get("context_precision", 0.0),
+        context_recall_score=ragas_scores.get("context_recall", 0.0),
+        overall_score=overall_score,
+        evaluation_metadata={
+            "rag_result": rag_result,
+            "contexts": contexts,
+            "model_name": model_name,
+            "ragas_llm_model": eva_ctx.get('llm_model'),
+            "ragas_embedding_model": eva_ctx.get('embedding_model'),
+        },
+        status="completed",
+        processing_stage="evaluation",
+        inference_started_at=inference_started_at,
+        inference_completed_at=inference_completed_at,
+        evaluation_started_at=evaluation_started_at,
+        evaluation_completed_at=evaluation_completed_at,
+        inference_duration_ms=int(
+            (inference_completed_at - inference_started_at).total_seconds() * 1000
+        )
+        if (inference_started_at and inference_completed_at)
+        else None,
+        evaluation_duration_ms=int(
+            (evaluation_completed_at - evaluation_started_at).total_seconds() * 1000
+        )
+        if (evaluation_started_at and evaluation_completed_at)
+        else None,
+        total_duration_ms=int(
+            (evaluation_completed_at - inference_started_at).total_seconds() * 1000
+        )
+        if (inference_started_at and evaluation_completed_at)
+        else None,
+    )
+
+    # 收集结果（返回给调用方/前端）
+    result = {
+        "question_id": question_id,
+        "clinical_query": clinical_query,
+        "rag_answer": answer_text,
+        "ground_truth": ground_truth,
+        "ragas_scores": ragas_scores,
+        "contexts": contexts,
+    }
+    return {"result": result, "record": record}
+
+
 async def run_real_rag_evaluation(
     test_cases: List[Dict[str, Any]],
     model_name: str,
     base_url: Optional[str] = None,
     task_id: Optional[str] = None,
     db: Optional[Session] = None,
+    concurrency: int = DEFAULT_EVAL_CONCURRENCY,
 ) -> Dict[str, Any]:
     """
     执行真实的RAG评测流水线：
-    - 逐条调用 RAG-LLM 推理（通过 HTTP API）
+    - 并发调用 RAG-LLM 推理（通过 HTTP API）
     - 可选计算 RAGAS 指标（若依赖与 API Key 可用）
+    - 推理与评分两个阶段各自最多 concurrency 个用例同时进行
     - 将单条结果与汇总结果写入数据库（若提供 db 与 task_id）
 
     注意：为在缺省环境下也能运行，本实现对外部依赖做了降级处理：
@@ -185,8 +625,8 @@ async def run_real_rag_evaluation(
         "http://127.0.0.1:8002/api/v1/acrac/rag-llm/intelligent-recommendation",
     )
 
-    evaluation_results: List[Dict[str, Any]] = []
-    total_cases = len(test_cases or [])
+    test_cases = list(test_cases or [])
+    total_cases = len(test_cases)
     completed_cases = 0
     failed_cases = 0
 
@@ -194,282 +634,117 @@ async def run_real_rag_evaluation(
     import app.services.rag_llm_recommendation_service as rag_mod  # type: ignore
     _eva_ctx = getattr(getattr(rag_mod.rag_llm_service, 'contexts', {}), 'default_evaluation_context', {}) or {}
 
-    for i, test_case in enumerate(test_cases or []):
-        try:
-            clinical_query = (
-                test_case.get("clinical_query")
-                or test_case.get("question")
-                or test_case.get("clinical_scenario")
-                or ""
-            )
-            ground_truth = test_case.get("ground_truth") or test_case.get("standard_answer") or ""
-            question_id = test_case.get("question_id") or test_case.get("scenario_id") or f"case_{i+1}"
-
-            # 构造 RAG 推理请求载荷（开启 debug 便于前端展示 trace）
-            from app.core.config import settings as _settings
-            # 从配置/环境读取检索参数，保持与RAG助手一致
-            _top_scenarios = int(os.getenv('RAG_TOP_SCENARIOS', str(getattr(_settings, 'RAG_TOP_SCENARIOS', 3))))
-            _top_recs = int(os.getenv('RAG_TOP_RECOMMENDATIONS_PER_SCENARIO', str(getattr(_settings, 'RAG_TOP_RECOMMENDATIONS_PER_SCENARIO', 3))))
-            _sim_threshold = float(os.getenv('VECTOR_SIMILARITY_THRESHOLD', str(getattr(_settings, 'VECTOR_SIMILARITY_THRESHOLD', 0.6))))
-            rag_payload = {
-                "clinical_query": clinical_query,
-                "top_scenarios": _top_scenarios,
-                "top_recommendations_per_scenario": _top_recs,
-                "show_reasoning": True,
-                "similarity_threshold": _sim_threshold,
-                "debug_mode": True,
-                "include_raw_data": True,
-                # 评分在本函数内进行，避免与远端重复
-                "compute_ragas": False,
-                "ground_truth": ground_truth,
-            }
-
-            inference_started_at = None
-            inference_completed_at = None
+    # 从配置/环境读取检索参数，保持与RAG助手一致
+    from app.core.config import settings as _settings
+    rag_params = {
+        "top_scenarios": int(os.getenv('RAG_TOP_SCENARIOS', str(getattr(_settings, 'RAG_TOP_SCENARIOS', 3)))),
+        "top_recommendations_per_scenario": int(os.getenv('RAG_TOP_RECOMMENDATIONS_PER_SCENARIO', str(getattr(_settings, 'RAG_TOP_RECOMMENDATIONS_PER_SCENARIO', 3)))),
+        "similarity_threshold": float(os.getenv('VECTOR_SIMILARITY_THRESHOLD', str(getattr(_settings, 'VECTOR_SIMILARITY_THRESHOLD', 0.6)))),
+    }
 
-            # 调用 RAG-LLM HTTP API
-            try:
-                inference_started_at = datetime.now()
-                resp = requests.post(rag_api_url, json=rag_payload, timeout=120)
-                resp.raise_for_status()
-                rag_result = resp.json()
-                inference_completed_at = datetime.now()
-            except Exception as e:
-                logger.error(f"RAG API 调用失败: {e}")
-                failed_cases += 1
-                # 更新进度（失败也计入）
-                if db and task_id:
-                    task = db.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
-                    if task:
-                        task.completed_scenarios = completed_cases
-                        task.failed_scenarios = failed_cases
-                        task.progress_percentage = int(((completed_cases + failed_cases) / max(total_cases, 1)) * 100)
-                        db.commit()
-                # 限流/退避
-                await asyncio.sleep(0.5)
-                continue
+    # 问题与标准答案完全相同的用例只推理/评分一次，结果回填给重复用例
+    groups: Dict[bytes, List[int]] = {}
+    for i, case in enumerate(test_cases):
+        groups.setdefault(_case_key(i, case), []).append(i)
+    if len(groups) < total_cases:
+        logger.info(
+            f"评测用例去重: {total_cases} -> {len(groups)} "
+            f"(去重率 {1 - len(groups) / total_cases:.1%})"
+        )
 
-            # 提取 LLM 推荐并拼接文本答案
-            llm_recs = (rag_result or {}).get("llm_recommendations", {})
-            recommendations = llm_recs.get("recommendations", []) if isinstance(llm_recs, dict) else []
-            if recommendations:
-                answer_text = "推荐的影像学检查：\n" + "\n".join(
-                    [
-                        f"- {rec.get('procedure_name','')} (适宜性: {rec.get('appropriateness_rating','')})"
-                        for rec in recommendations[:3]
-                    ]
-                )
-            else:
-                answer_text = "暂无推荐的影像学检查"
-
-            # 构造/兜底 trace（以便前端中间过程展示）
-            trace = (rag_result or {}).get("trace") or {}
-            if not trace:
-                scenarios = (rag_result or {}).get("scenarios") or []
-                # 构造 recall 视图
-                recall_list = []
-                for s in scenarios:
-                    recall_list.append({
-                        "id": s.get("semantic_id") or s.get("id"),
-                        "similarity": s.get("similarity"),
-                        "panel": s.get("panel_name"),
-                        "topic": s.get("topic_name"),
-                        "_rerank_score": s.get("_rerank_score"),
-                    })
-                # 构造 rerank 视图
-                rerank_list = sorted(
-                    recall_list,
-                    key=lambda x: (
-                        x.get("_rerank_score") is None,
-                        -(x.get("_rerank_score") or 0.0),
-                        -(x.get("similarity") or 0.0),
-                    ),
-                )
-                # 最终 prompt 预览/长度
-                dbg = (rag_result or {}).get("debug_info") or {}
-                final_prompt = dbg.get("step_6_prompt_preview") if isinstance(dbg.get("step_6_prompt_preview"), str) else None
-                trace = {
-                    "recall_scenarios": recall_list,
-                    "rerank_scenarios": rerank_list,
-                    "final_prompt": final_prompt,
-                    "llm_parsed": (rag_result or {}).get("llm_recommendations") or {},
-                }
-
-            # 提取场景上下文（用于 RAGAS 评分）
-            contexts: List[str] = []
-            for sc in (rag_result or {}).get("scenarios", [])[:3]:
-                try:
-                    ctx = f"场景: {sc.get('panel_name','')} - {sc.get('topic_name','')}"
-                    if sc.get("clinical_scenario"):
-                        ctx += f"\n临床场景: {sc['clinical_scenario']}"
-                    contexts.append(ctx)
-                except Exception:
-                    continue
-
-            # 计算 RAGAS 分数（若可用）
-            evaluation_started_at = None
-            evaluation_completed_at = None
-            ragas_scores = {
-                "faithfulness": 0.0,
-                "answer_relevancy": 0.0,
-                "context_precision": 0.0,
-                "context_recall": 0.0,
-            }
-            if contexts and answer_text and ground_truth:
-                try:
-                    evaluation_started_at = datetime.now()
-                    # 使用主服务中的统一实现，确保四项指标（含 answer_relevancy）一致
-                    from app.services.rag_llm_recommendation_service import rag_llm_service  # 延迟导入避免环依赖
-                    ragas_scores = rag_llm_service._compute_ragas_scores(
-                        user_input=clinical_query,
-                        answer=answer_text,
-                        contexts=contexts,
-                        reference=ground_truth,
-                    )
-                    evaluation_completed_at = datetime.now()
-                    logger.info(f"RAGAS评分计算完成: {ragas_scores}")
-                except Exception as e:
-                    logger.warning(f"RAGAS评分计算失败，已跳过该样本评分: {e}")
-                    evaluation_completed_at = datetime.now() if evaluation_started_at else None
+    concurrency = min(max(1, int(concurrency or 1)), MAX_EVAL_CONCURRENCY)
+    # 两级流水线：推理与评分分别限流。用例拿到推理结果即释放推理槽位，
+    # 后续用例的 RAG 调用与先到用例的评分 LLM 调用并行，两个下游各自最多 concurrency 个在途请求
+    infer_sem = asyncio.Semaphore(concurrency)
+    score_sem = asyncio.Semaphore(concurrency)
+    # 复用当前事件循环的共享异步客户端：请求直接在事件循环上并发，不占线程池；
+    # keep-alive 连接在用例间及同一 worker 的多次评测间复用
+    http_client = get_rag_http_client()
 
-            # 单条整体得分
-            try:
-                overall_score = (
-                    ragas_scores.get("faithfulness", 0.0)
-                    + ragas_scores.get("answer_relevancy", 0.0)
-                    + ragas_scores.get("context_precision", 0.0)
-                    + ragas_scores.get("context_recall", 0.0)
-                ) / 4.0
-            except Exception:
-                overall_score = None
-
-            # 写入数据库（若提供）
-            if db and task_id:
-                sr = ScenarioResult(
-                    task_id=task_id,
-                    scenario_id=str(question_id),
-                    clinical_scenario=clinical_query,
-                    rag_question=clinical_query,
-                    rag_answer=answer_text,
-                    rag_contexts=contexts,
-                    rag_trace_data=trace,
-                    standard_answer=ground_truth,
-                    faithfulness_score=ragas_scores.get("faithfulness", 0.0),
-                    answer_relevancy_score=ragas_scores.get("answer_relevancy", 0.0),
-                    context_precision_score=ragas_scores.get("context_precision", 0.0),
-                    context_recall_score=ragas_scores.get("context_recall", 0.0),
-                    overall_score=overall_score,
-                    evaluation_metadata={
-                        "rag_result": rag_result,
-                        "contexts": contexts,
-                        "model_name": model_name,
-                        "ragas_llm_model": _eva_ctx.get('llm_model'),
-                        "ragas_embedding_model": _eva_ctx.get('embedding_model'),
-                    },
-                    status="completed",
-                    processing_stage="evaluation",
-                    inference_started_at=inference_started_at,
-                    inference_completed_at=inference_completed_at,
-                    evaluation_started_at=evaluation_started_at,
-                    evaluation_completed_at=evaluation_completed_at,
-                    inference_duration_ms=int(
-                        (inference_completed_at - inference_started_at).total_seconds() * 1000
-                    )
-                    if (inference_started_at and inference_completed_at)
-                    else None,
-                    evaluation_duration_ms=int(
-                        (evaluation_completed_at - evaluation_started_at).total_seconds() * 1000
-                    )
-                    if (evaluation_started_at and evaluation_completed_at)
-                    else None,
-                )
-                try:
-                    sr.update_duration()
-                except Exception:
-                    pass
-                db.add(sr)
-
-            # 收集结果（返回给调用方/前端）
-            evaluation_results.append(
-                {
-                    "question_id": question_id,
-                    "clinical_query": clinical_query,
-                    "rag_answer": answer_text,
-                    "ground_truth": ground_truth,
-                    "ragas_scores": ragas_scores,
-                    "contexts": contexts,
-                }
-            )
+    async def _one(members: List[int]):
+        i = members[0]
+        try:
+            async with infer_sem:
+                inferred = await _infer_case(i, test_cases[i], rag_api_url, rag_params, http_client)
+            if inferred is None:
+                return members, None
+            async with score_sem:
+                return members, await _score_case(i, test_cases[i], inferred, model_name, _eva_ctx)
+        except Exception as e:
+            logger.error(f"处理测试用例失败: {e}")
+            return members, None
 
+    # 按完成顺序落库与更新进度，结果按输入顺序返回
+    outcomes: List[Optional[Dict[str, Any]]] = [None] * total_cases
+    # 单条结果先累积为字典，随每 K 条的进度提交一次 bulk_insert_mappings 写入
+    scenario_rows: List[Dict[str, Any]] = []
+    done = 0
+    last_commit = 0
+    for fut in asyncio.as_completed([_one(members) for members in groups.values()]):
+        members, outcome = await fut
+        for j in members:
+            if outcome is None:
+                failed_cases += 1
+                continue
+            if j != members[0]:
+                outcome = _rebind_outcome(outcome, j, test_cases[j])
+            outcomes[j] = outcome
             completed_cases += 1
-
-            # 更新任务进度
             if db and task_id:
-                task = db.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
-                if task:
-                    task.completed_scenarios = completed_cases
-                    task.failed_scenarios = failed_cases
-                    task.progress_percentage = int(((completed_cases + failed_cases) / max(total_cases, 1)) * 100)
-                    db.commit()
+                scenario_rows.append({"task_id": task_id, **outcome["record"]})
+        done += len(members)
 
-            # 避免外部API限流
-            await asyncio.sleep(1.0)
+        # 每 K 条（及最后一批）落库一次已完成结果与任务进度（失败也计入）；
+        # 同步 DB 调用放到线程池，事件循环在此期间继续驱动其它用例的 I/O（db 仅在此处使用，不会并发访问）
+        if db and task_id and (done - last_commit >= _PROGRESS_COMMIT_EVERY or done == total_cases):
+            last_commit = done
+            rows, scenario_rows = scenario_rows, []
+            try:
+                await asyncio.to_thread(
+                    _report_task_progress, db, task_id, completed_cases, failed_cases, total_cases, rows
+                )
+            except Exception as e:
+                logger.warning(f"更新任务进度失败: {e}")
+                db.rollback()
+                # 未写入的结果留到下一次提交重试
+                scenario_rows = rows + scenario_rows
 
-        except Exception as e:
-            logger.error(f"处理测试用例失败: {e}")
-            failed_cases += 1
-            # 更新任务进度（失败也计入）
-            if db and task_id:
-                task = db.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
-                if task:
-                    task.completed_scenarios = completed_cases
-                    task.failed_scenarios = failed_cases
-                    task.progress_percentage = int(((completed_cases + failed_cases) / max(total_cases, 1)) * 100)
-                    db.commit()
-            continue
+    evaluation_results = [o["result"] for o in outcomes if o is not None]
 
     # 汇总统计
     summary = None
     if evaluation_results:
-        scores = [r.get("ragas_scores", {}) for r in evaluation_results]
         try:
-            summary = {
-                "faithfulness": sum(s.get("faithfulness", 0.0) for s in scores) / len(scores),
-                "answer_relevancy": sum(s.get("answer_relevancy", 0.0) for s in scores) / len(scores),
-                "context_precision": sum(s.get("context_precision", 0.0) for s in scores) / len(scores),
-                "context_recall": sum(s.get("context_recall", 0.0) for s in scores) / len(scores),
-            }
+            summary = summarize_ragas_scores(evaluation_results)
         except Exception:
             summary = None
 
-        # 写回任务聚合与指标历史
+        # 写回单条结果、任务聚合与指标历史
         if db and task_id:
-            task = db.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
+            # 进度提交失败时残留的结果在此补写
+            if scenario_rows:
+                db.bulk_insert_mappings(ScenarioResult, scenario_rows)
+            task = db.execute(TASK_BY_ID_STMT, {"tid": task_id}).scalar_one_or_none()
             if task and summary:
                 task.avg_faithfulness = summary.get("faithfulness")
                 task.avg_answer_relevancy = summary.get("answer_relevancy")
                 task.avg_context_precision = summary.get("context_precision")
                 task.avg_context_recall = summary.get("context_recall")
-                try:
-                    task.avg_overall_score = (
-                        (task.avg_faithfulness or 0)
-                        + (task.avg_answer_relevancy or 0)
-                        + (task.avg_context_precision or 0)
-                        + (task.avg_context_recall or 0)
-                    ) / 4.0
-                except Exception:
-                    task.avg_overall_score = None
+                task.avg_overall_score = overall_ragas_score(summary)
                 task.completed_scenarios = completed_cases
                 task.failed_scenarios = failed_cases
                 task.progress_percentage = 100
                 task.completed_at = datetime.now()
                 task.status = TaskStatus.COMPLETED if failed_cases < total_cases else TaskStatus.FAILED
-                db.commit()
+            db.commit()
 
+            if task and summary:
                 # 指标历史记录
                 try:
                     sample_size = len(evaluation_results)
                     for name, value in summary.items():
+                        if value is None:
+                            continue
                         db.add(
                             EvaluationMetrics(
                                 task_id=task_id,
@@ -65,14 +65,14 @@ def main():
     
     try:
         # 读取测试数据
-        with open(test_data_file, 'r', encoding='utf-8') as f:
-            test_data = json.load(f)
+        with open(test_data_file, 'rb') as f:
+            test_data = json.loads(f.read())
         
         # 运行评估
         result = run_ragas_evaluation(test_data)
         
-        # 输出结果
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        # 输出结果（由父进程解析，不缩进）
+        print(json.dumps(result, ensure_ascii=False))
         
     except Exception as e:
         error_result = {
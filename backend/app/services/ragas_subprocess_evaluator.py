@@ -11,6 +11,11 @@ import os
 import logging
 from typing import Dict, List, Any
 
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库 json
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 class RAGASSubprocessEvaluator:
@@ -26,9 +31,12 @@ class RAGASSubprocessEvaluator:
         运行 RAGAS 评估
         """
         try:
-            # 创建临时文件保存测试数据
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                json.dump(test_data, f, ensure_ascii=False, indent=2)
+            # 创建临时文件保存测试数据（仅供子进程读取，不缩进）
+            with tempfile.NamedTemporaryFile(mode='wb', suffix='.json', delete=False) as f:
+                if orjson is not None:
+                    f.write(orjson.dumps(test_data))
+                else:
+                    f.write(json.dumps(test_data, ensure_ascii=False).encode('utf-8'))
                 temp_file = f.name
             
             try:
@@ -39,6 +47,7 @@ class RAGASSubprocessEvaluator:
                 
                 if result.returncode == 0:
                     # 解析结果
+                    # 分数可能为 NaN（orjson 不接受），此处保留标准库解析
                     evaluation_result = json.loads(result.stdout)
                     logger.info(f"RAGAS 评估成功完成")
                     return evaluation_result
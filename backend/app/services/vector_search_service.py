@@ -2,32 +2,372 @@
 向量搜索服务 - 基于SiliconFlow API
 """
 import os
+import asyncio
+import math
+import functools
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 import time
 import logging
-from typing import List, Optional, Dict, Any, Sequence
+from typing import List, Optional, Dict, Any, Sequence, NamedTuple, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from dotenv import load_dotenv
-from pathlib import Path
-
-# 加载环境变量（统一 backend/.env），在容器可通过 SKIP_LOCAL_DOTENV/DOCKER_CONTEXT 禁用
-try:
-    if (
-        os.getenv("SKIP_LOCAL_DOTENV", "").lower() != "true"
-        and os.getenv("DOCKER_CONTEXT", "").lower() != "true"
-    ):
-        env_path = Path(__file__).resolve().parents[2] / ".env"
-        if env_path.exists():
-            load_dotenv(str(env_path))
-        else:
-            load_dotenv()
-except Exception:
-    pass
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.config import settings  # 导入时已载入 backend/.env
 
 logger = logging.getLogger(__name__)
 
+try:  # 指标为可选依赖，缺失时不影响检索
+    from prometheus_client import Counter
+
+    EMBEDDING_FAILURES = Counter(
+        "embedding_failures_total",
+        "Embedding requests that failed before vector search",
+        ["endpoint"],
+    )
+except Exception:  # pragma: no cover - prometheus_client 未安装或重复注册
+    EMBEDDING_FAILURES = None
+
+# 严格模式（默认）：嵌入失败直接抛错；关闭后检索返回空结果，不再发起SQL
+STRICT_EMBEDDING = os.getenv("STRICT_EMBEDDING", "true").lower() in ("1", "true", "yes")
+
+
+@functools.lru_cache(maxsize=8)
+def _vector_literal_template(dim: int) -> str:
+    """按维度缓存 pgvector 字面量模板（6位有效数字，约为 str() 的一半长度）。"""
+    return "[" + ",".join(["%.6g"] * dim) + "]"
+
+
+def _vector_literal(vector: Sequence[float]) -> str:
+    values = np.asarray(vector, dtype=np.float32).ravel()
+    return _vector_literal_template(values.size) % tuple(values.tolist())
+
+
+class _QueryVector:
+    """查询向量参数包装；只有该类型由驱动编码为 pgvector 文本字面量，其他 ndarray 不受影响。"""
+
+    __slots__ = ("values",)
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+
+
+class _QueryVectorAdapter:
+    """psycopg2 适配器：_QueryVector 参数编码为 pgvector 文本字面量。"""
+
+    def __init__(self, param: _QueryVector):
+        self._values = param.values
+
+    def getquoted(self) -> bytes:
+        return ("'" + _vector_literal(self._values) + "'").encode("ascii")
+
+
+try:  # 仅在使用 psycopg2 驱动时注册；pgvector 自带适配器格式化更慢，不使用
+    from psycopg2.extensions import register_adapter
+
+    register_adapter(_QueryVector, _QueryVectorAdapter)
+except Exception:  # pragma: no cover - psycopg2 未安装
+    pass
+
+
+# asearch_all 的独立会话在进程内共享该上限：每次请求扇出 5 个连接，
+# 不加限制时 pool_size=20、max_overflow=0 下约 4 个并发请求即可耗尽连接池，阻塞其它接口
+_ISOLATED_SESSIONS = threading.BoundedSemaphore(max(1, settings.VECTOR_SEARCH_MAX_SESSIONS))
+
+
+# ivfflat 索引 lists 参数缓存（(表名, 操作符类) -> lists；None 表示无匹配索引，查询失败不缓存）
+_IVFFLAT_LISTS: Dict[Tuple[str, str], Optional[int]] = {}
+# 小 top_k 时 probes 上限，超过后召回已饱和
+_MAX_PROBES_SMALL_K = 256
+
+_IVFFLAT_LISTS_SQL = text(
+    """
+    SELECT c.reloptions
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_am a ON a.oid = c.relam
+    JOIN pg_opclass o ON o.oid = i.indclass[0]
+    WHERE i.indrelid = CAST(:table AS regclass)
+      AND a.amname = 'ivfflat'
+      AND o.opcname = :opclass
+    """
+)
+
+
+_STATS_TABLES = (
+    "panels",
+    "topics",
+    "clinical_scenarios",
+    "procedure_dictionary",
+    "clinical_recommendations",
+)
+
+_DATABASE_STATS_SQL = text(
+    "\nUNION ALL\n".join(
+        f"""
+        SELECT
+            '{table}' AS table_name,
+            COUNT(*) AS total_count,
+            COUNT(embedding) AS vector_count,
+            (SELECT reltuples::bigint FROM pg_class WHERE oid = '{table}'::regclass)
+                AS approx_count
+        FROM {table}
+        """
+        for table in _STATS_TABLES
+    )
+)
+
+
+def _knn_sql(
+    table: str,
+    alias: str,
+    inner_columns: Sequence[str],
+    outer_columns: Sequence[str],
+    joins: Sequence[str] = (),
+    with_threshold: bool = True,
+    halfvec: bool = False,
+    inner_product: bool = False,
+) -> TextClause:
+    """生成 KNN 检索 SQL：子查询只计算一次距离并 LIMIT，外层再关联与阈值过滤。
+
+    在模块加载时构建一次 text() 对象，避免每次请求重新解析绑定参数。
+    阈值 <= 0 时恒成立，使用不带 WHERE 的变体。
+    halfvec=True 时先按 embedding_hv (FP16) 粗排取 top_k*overfetch，再用 FP32 精排。
+    inner_product=True 时要求库内向量已归一化，用 <#>（负内积）代替余弦距离。
+    """
+    op = "<#>" if inner_product else "<=>"
+    # 单位向量上 -(a <#> b) 即余弦相似度
+    similarity = f"-{alias}.distance" if inner_product else f"1 - {alias}.distance"
+    inner = ",\n                ".join(inner_columns)
+    outer = ",\n            ".join(outer_columns)
+    join_sql = "".join(f"\n        {j}" for j in joins)
+    where_sql = f"\n        WHERE {similarity} >= :sim" if with_threshold else ""
+    query_vector = "SELECT CAST(:qv AS vector) AS v"
+    if halfvec:
+        query_vector = f"SELECT v, v::halfvec AS hv FROM ({query_vector}) x"
+        candidates = ",\n                    ".join(inner_columns)
+        source = f"""(
+                SELECT
+                    {candidates},
+                    embedding
+                FROM {table}
+                WHERE embedding_hv IS NOT NULL
+                ORDER BY embedding_hv {op} (SELECT hv FROM q)
+                LIMIT :top_k * :overfetch
+            ) c"""
+    else:
+        source = f"""{table}
+            WHERE embedding IS NOT NULL"""
+    return text(
+        f"""
+        WITH q AS ({query_vector}),
+        knn AS (
+            SELECT
+                {inner},
+                embedding {op} (SELECT v FROM q) AS distance
+            FROM {source}
+            ORDER BY distance
+            LIMIT :top_k
+        )
+        SELECT
+            {outer},
+            ({similarity})::real AS similarity_score
+        FROM knn {alias}{join_sql}{where_sql}
+        ORDER BY {alias}.distance
+        """
+    )
+
+
+class _KnnQuery(NamedTuple):
+    table: str
+    label: str
+    # (是否带阈值, 是否 halfvec 两阶段, 是否内积) -> SQL
+    statements: Dict[Tuple[bool, bool, bool], TextClause]
+
+    def statement(
+        self, with_threshold: bool, halfvec: bool, inner_product: bool
+    ) -> TextClause:
+        return self.statements[(with_threshold, halfvec, inner_product)]
+
+
+def _knn_query(
+    table: str,
+    alias: str,
+    inner_columns: Sequence[str],
+    outer_columns: Sequence[str],
+    joins: Sequence[str] = (),
+    *,
+    label: str,
+) -> _KnnQuery:
+    return _KnnQuery(
+        table=table,
+        label=label,
+        statements={
+            (with_threshold, halfvec, inner_product): _knn_sql(
+                table,
+                alias,
+                inner_columns,
+                outer_columns,
+                joins,
+                with_threshold=with_threshold,
+                halfvec=halfvec,
+                inner_product=inner_product,
+            )
+            for with_threshold in (True, False)
+            for halfvec in (True, False)
+            for inner_product in (True, False)
+        },
+    )
+
+
+# 检索名 -> (主表, 错误提示, SQL 变体)；SQL 输出列即返回字典的键
+_TABLE_QUERIES: Dict[str, _KnnQuery] = {
+    "panels": _knn_query(
+        "panels",
+        "k",
+        ["id", "semantic_id", "name_zh", "name_en", "description"],
+        ["k.id", "k.semantic_id", "k.name_zh", "k.name_en", "k.description"],
+        label="搜索科室失败",
+    ),
+    "topics": _knn_query(
+        "topics",
+        "t",
+        ["id", "semantic_id", "name_zh", "name_en", "description", "panel_id"],
+        [
+            "t.id", "t.semantic_id", "t.name_zh", "t.name_en", "t.description",
+            "p.name_zh AS panel_name",
+        ],
+        ["LEFT JOIN panels p ON t.panel_id = p.id"],
+        label="搜索主题失败",
+    ),
+    "scenarios": _knn_query(
+        "clinical_scenarios",
+        "s",
+        [
+            "id", "semantic_id", "description_zh", "description_en",
+            "patient_population", "risk_level", "age_group", "gender",
+            "urgency_level", "symptom_category", "panel_id", "topic_id",
+        ],
+        [
+            "s.id", "s.semantic_id", "s.description_zh", "s.description_en",
+            "s.patient_population", "s.risk_level", "s.age_group", "s.gender",
+            "s.urgency_level", "s.symptom_category",
+            "p.name_zh AS panel_name", "t.name_zh AS topic_name",
+        ],
+        [
+            "LEFT JOIN panels p ON s.panel_id = p.id",
+            "LEFT JOIN topics t ON s.topic_id = t.id",
+        ],
+        label="搜索临床场景失败",
+    ),
+    "procedures": _knn_query(
+        "procedure_dictionary",
+        "p",
+        [
+            "id", "semantic_id", "name_zh", "name_en", "modality", "body_part",
+            "contrast_used", "radiation_level", "exam_duration",
+            "preparation_required", "description_zh",
+        ],
+        [
+            "p.id", "p.semantic_id", "p.name_zh", "p.name_en", "p.modality",
+            "p.body_part", "p.contrast_used", "p.radiation_level",
+            "p.exam_duration", "p.preparation_required", "p.description_zh",
+        ],
+        label="搜索检查项目失败",
+    ),
+    "recommendations": _knn_query(
+        "clinical_recommendations",
+        "cr",
+        [
+            "id", "semantic_id", "scenario_id", "procedure_id",
+            "appropriateness_rating", "appropriateness_category_zh",
+            "reasoning_zh", "evidence_level", "pregnancy_safety",
+            "adult_radiation_dose", "pediatric_radiation_dose",
+        ],
+        [
+            "cr.id", "cr.semantic_id", "cr.appropriateness_rating",
+            "cr.appropriateness_category_zh", "cr.reasoning_zh",
+            "cr.evidence_level", "cr.pregnancy_safety",
+            "cr.adult_radiation_dose", "cr.pediatric_radiation_dose",
+            "s.description_zh AS scenario_description",
+            "s.patient_population", "s.risk_level",
+            "pd.name_zh AS procedure_name", "pd.modality", "pd.body_part",
+            "p.name_zh AS panel_name", "t.name_zh AS topic_name",
+        ],
+        [
+            "LEFT JOIN clinical_scenarios s ON cr.scenario_id = s.semantic_id",
+            "LEFT JOIN procedure_dictionary pd ON cr.procedure_id = pd.semantic_id",
+            "LEFT JOIN panels p ON s.panel_id = p.id",
+            "LEFT JOIN topics t ON s.topic_id = t.id",
+        ],
+        label="搜索临床推荐失败",
+    ),
+}
+
+
+# 场景 ID 以显式 text[] 展开后连接（计划形状与数组长度无关，可走 semantic_id 索引），
+# 每个场景用 LATERAL 只取评分最高的前 N 条推荐，
+# 依赖索引 idx_recommendations_scenario_rating (scenario_id, appropriateness_rating DESC NULLS LAST, id)
+_SCENARIO_RECOMMENDATIONS_SQL = text(
+    """
+    SELECT
+        s.semantic_id AS scenario_id,
+        s.description_zh,
+        s.description_en,
+        s.patient_population,
+        s.risk_level,
+        s.age_group,
+        s.gender,
+        s.urgency_level,
+        p.name_zh AS panel_name,
+        t.name_zh AS topic_name,
+        cr.recommendation_id,
+        cr.appropriateness_rating,
+        cr.appropriateness_category_zh,
+        cr.is_active,
+        cr.procedure_name,
+        cr.modality,
+        cr.body_part,
+        cr.contrast_used,
+        cr.radiation_level,
+        cr.rn
+    FROM unnest(CAST(:scenario_ids AS text[])) AS want(scenario_id)
+    JOIN clinical_scenarios s ON s.semantic_id = want.scenario_id
+    LEFT JOIN topics t ON t.id = s.topic_id
+    LEFT JOIN panels p ON p.id = s.panel_id
+    JOIN LATERAL (
+        SELECT
+            r.semantic_id AS recommendation_id,
+            r.appropriateness_rating::real AS appropriateness_rating,
+            r.appropriateness_category_zh,
+            r.is_active,
+            pd.name_zh AS procedure_name,
+            pd.modality,
+            pd.body_part,
+            pd.contrast_used,
+            pd.radiation_level,
+            ROW_NUMBER() OVER (
+                ORDER BY r.appropriateness_rating DESC NULLS LAST, r.id
+            ) AS rn
+        FROM clinical_recommendations r
+        JOIN procedure_dictionary pd ON pd.semantic_id = r.procedure_id
+        WHERE r.scenario_id = want.scenario_id
+        ORDER BY r.appropriateness_rating DESC NULLS LAST, r.id
+        LIMIT :limit
+    ) cr ON TRUE
+    WHERE (cr.appropriateness_rating IS NULL OR cr.appropriateness_rating >= :min_rating)
+    ORDER BY s.semantic_id, cr.rn
+    """
+)
+
+
+class EmbeddingError(RuntimeError):
+    """嵌入服务调用失败。"""
+
 
 class SiliconFlowEmbedder:
     """OpenAI-compatible embeddings client (SiliconFlow / Ollama).
@@ -43,30 +383,83 @@ class SiliconFlowEmbedder:
             or "https://api.siliconflow.cn/v1"
         ).rstrip("/")
         self.api_key = api_key or os.getenv("SILICONFLOW_API_KEY")
+        # 复用HTTP连接（keep-alive），配置重试与连接池
+        self._session = requests.Session()
+        self._session.headers.update({"Connection": "keep-alive"})
+        try:
+            retries = Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["POST"],
+            )
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retries)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        except Exception:
+            pass
+
+    def _request_embeddings(self, inputs: Any) -> List[Dict[str, Any]]:
+        prefers_ollama = ("11434" in self.endpoint) or (
+            "ollama" in self.endpoint.lower()
+        )
+        headers = {"Content-Type": "application/json"}
+        if not prefers_ollama and self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {"model": self.model, "input": inputs}
+        resp = self._session.post(
+            f"{self.endpoint}/embeddings", headers=headers, json=payload, timeout=30
+        )
+        resp.raise_for_status()
+        return resp.json().get("data") or []
+
+    def _fail(self, e: Exception) -> EmbeddingError:
+        logger.error(f"Embeddings failed ({self.endpoint}): {e}")
+        if EMBEDDING_FAILURES is not None:
+            EMBEDDING_FAILURES.labels(endpoint=self.endpoint).inc()
+        return EmbeddingError(f"embedding failed ({self.endpoint}): {e}")
 
     def generate_embedding(self, text: str) -> List[float]:
         try:
-            prefers_ollama = ("11434" in self.endpoint) or (
-                "ollama" in self.endpoint.lower()
-            )
-            headers = {"Content-Type": "application/json"}
-            if not prefers_ollama and self.api_key:
-                headers["Authorization"] = f"Bearer {self.api_key}"
-            payload = {"model": self.model, "input": text}
-            resp = requests.post(
-                f"{self.endpoint}/embeddings", headers=headers, json=payload, timeout=30
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            emb = (data.get("data") or [{}])[0].get("embedding")
+            emb = (self._request_embeddings(text) or [{}])[0].get("embedding")
             if not isinstance(emb, list):
                 raise ValueError("invalid embeddings response")
             return emb
         except Exception as e:
-            logger.error(
-                f"Embeddings failed ({self.endpoint}): {e}; using random vector"
-            )
-            return np.random.normal(0, 0.1, 1024).tolist()
+            raise self._fail(e) from e
+
+    def generate_embeddings(
+        self, texts: Sequence[str], batch_size: int = 32
+    ) -> List[List[float]]:
+        """批量生成向量，每批一次请求；返回顺序与输入一致。"""
+        vectors: List[List[float]] = []
+        step = max(1, int(batch_size))
+        for start in range(0, len(texts), step):
+            chunk = list(texts[start : start + step])
+            try:
+                items = sorted(
+                    self._request_embeddings(chunk), key=lambda d: d.get("index", 0)
+                )
+                embs = [item.get("embedding") for item in items]
+                if len(embs) != len(chunk) or not all(
+                    isinstance(e, list) for e in embs
+                ):
+                    raise ValueError("invalid embeddings response")
+            except Exception as e:
+                raise self._fail(e) from e
+            vectors.extend(embs)
+        return vectors
+
+
+_default_embedder: Optional[SiliconFlowEmbedder] = None
+
+
+def get_default_embedder() -> SiliconFlowEmbedder:
+    """进程内共享的嵌入客户端，使连接池可跨请求复用。"""
+    global _default_embedder
+    if _default_embedder is None:
+        _default_embedder = SiliconFlowEmbedder()
+    return _default_embedder
 
 
 class VectorSearchService:
@@ -74,321 +467,198 @@ class VectorSearchService:
 
     def __init__(self, db: Session):
         self.db = db
-        self.embedder = SiliconFlowEmbedder()
-        try:
-            self.pgvector_probes = int(os.getenv("PGVECTOR_PROBES", "20"))
-        except Exception:
-            self.pgvector_probes = 20
+        self.embedder = get_default_embedder()
+        self.pgvector_probes = int(settings.PGVECTOR_PROBES or 0)
 
     def generate_embedding(self, text: str) -> List[float]:
         """公开生成向量的方法，便于在上层复用同一个嵌入。"""
         return self.embedder.generate_embedding(text)
 
-    def _vector_to_sql(self, vector: Sequence[float]) -> str:
-        return "[" + ",".join(map(str, vector)) + "]"
+    def generate_embeddings(self, texts: Sequence[str]) -> List[List[float]]:
+        """批量生成向量（单次请求/批），供上层一次性预计算。"""
+        return self.embedder.generate_embeddings(texts)
 
-    def _apply_pgvector_probes(self) -> None:
+    def embed_query(self, query_text: str) -> Optional[List[float]]:
+        """生成查询向量；非严格模式（STRICT_EMBEDDING=false）下失败返回 None，由调用方直接返回空结果。"""
         try:
-            if self.pgvector_probes and self.pgvector_probes > 0:
-                self.db.execute(
-                    text(f"SET LOCAL ivfflat.probes = {int(self.pgvector_probes)}")
-                )
+            return self.embedder.generate_embedding(query_text)
+        except EmbeddingError:
+            if STRICT_EMBEDDING:
+                raise
+            logger.warning("STRICT_EMBEDDING=false → embedding failed, skip vector search")
+            return None
+
+    def _query_param(self, vector: Sequence[float]) -> _QueryVector:
+        """转为 float32 并 L2 归一化（余弦排序不受影响，内积检索的前提）。"""
+        values = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(values))
+        return _QueryVector(values / norm if norm > 0 else values)
+
+    @staticmethod
+    def _active_opclass() -> str:
+        """当前检索实际使用的索引操作符类（halfvec 两阶段走 embedding_hv，内积检索走 *_ip_ops）。"""
+        prefix = "halfvec" if settings.PGVECTOR_HALFVEC_RERANK else "vector"
+        return f"{prefix}_ip_ops" if settings.PGVECTOR_INNER_PRODUCT else f"{prefix}_cosine_ops"
+
+    def _ivfflat_lists(self, table: str) -> Optional[int]:
+        """
+        读取表上与当前操作符类匹配的 ivfflat 索引的 lists 参数（进程内缓存）。
+        在 SAVEPOINT 中查询，失败只回滚到保存点，不破坏调用方事务；失败结果不缓存。
+        """
+        cache_key = (table, self._active_opclass())
+        if cache_key in _IVFFLAT_LISTS:
+            return _IVFFLAT_LISTS[cache_key]
+        lists: Optional[int] = None
+        try:
+            with self.db.begin_nested():
+                rows = self.db.execute(
+                    _IVFFLAT_LISTS_SQL, {"table": table, "opclass": cache_key[1]}
+                ).all()
+        except Exception as e:
+            logger.warning(f"读取 {table} ivfflat lists 失败: {e}")
+            return None
+        for (options,) in rows:
+            for opt in options or []:
+                key, _, value = str(opt).partition("=")
+                if key.strip() == "lists" and value.strip().isdigit():
+                    lists = max(lists or 0, int(value))
+        _IVFFLAT_LISTS[cache_key] = lists
+        return lists
+
+    def _probes_for(self, table: str, top_k: int) -> int:
+        """probes 取 max(PGVECTOR_PROBES, ceil(sqrt(lists)))，且不超过 lists。"""
+        probes = int(self.pgvector_probes or 0)
+        lists = self._ivfflat_lists(table)
+        if lists:
+            probes = min(max(probes, math.ceil(math.sqrt(lists))), lists)
+            if top_k <= 10:
+                probes = min(probes, _MAX_PROBES_SMALL_K)
+        return probes
+
+    def _apply_pgvector_probes(self, table: str, top_k: int) -> None:
+        """
+        仅在与当前生效值不同时 SET LOCAL。SET LOCAL 持续到事务结束，因此按事务记录最近一次设置的值；
+        本事务未设置过时生效值为连接默认 probes（见 app.core.database）。
+        """
+        try:
+            probes = self._probes_for(table, top_k)
+            if probes <= 0:
+                return
+            txn_set, probes_set = self.db.info.get("ivfflat_probes", (None, None))
+            txn = self.db.get_transaction()
+            current = probes_set if txn is not None and txn is txn_set else int(settings.PGVECTOR_PROBES or 0)
+            if probes != current:
+                self.db.execute(text(f"SET LOCAL ivfflat.probes = {probes}"))
+                self.db.info["ivfflat_probes"] = (self.db.get_transaction(), probes)
         except Exception:
             pass
 
-    def search_panels(
-        self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
+    def _knn_search(
+        self,
+        table_key: str,
+        query_vector: Sequence[float],
+        top_k: int,
+        similarity_threshold: float,
     ) -> List[Dict[str, Any]]:
-        """搜索相似的科室"""
+        """按 _TABLE_QUERIES 中的配置执行向量检索。"""
+        spec = _TABLE_QUERIES[table_key]
         try:
-            query_vector = self.embedder.generate_embedding(query_text)
-            vector_str = self._vector_to_sql(query_vector)
-
-            self._apply_pgvector_probes()
-
-            query = text(
-                f"""
-                SELECT 
-                    id,
-                    semantic_id,
-                    name_zh,
-                    name_en,
-                    description,
-                    (1 - (embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM panels 
-                WHERE embedding IS NOT NULL
-                AND (1 - (embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-            """
+            self._apply_pgvector_probes(spec.table, top_k)
+            result = self.db.execute(
+                spec.statement(
+                    similarity_threshold > 0,
+                    settings.PGVECTOR_HALFVEC_RERANK,
+                    settings.PGVECTOR_INNER_PRODUCT,
+                ),
+                {
+                    "qv": self._query_param(query_vector),
+                    "sim": float(similarity_threshold),
+                    "top_k": int(top_k),
+                    "overfetch": max(1, int(settings.PGVECTOR_HALFVEC_OVERFETCH)),
+                },
             )
+            return [dict(row) for row in result.mappings().all()]
+        except Exception as e:
+            logger.error(f"{spec.label}: {e}")
+            raise Exception(f"{spec.label}: {str(e)}")
 
-            result = self.db.execute(query)
-            panels = []
-            for row in result:
-                panels.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "name_zh": row.name_zh,
-                        "name_en": row.name_en,
-                        "description": row.description,
-                        "similarity_score": float(row.similarity_score),
-                    }
-                )
-
-            return panels
+    def _search_by_text(
+        self,
+        table_key: str,
+        query_text: str,
+        top_k: int,
+        similarity_threshold: float,
+    ) -> List[Dict[str, Any]]:
+        query_vector = self.embed_query(query_text)
+        if query_vector is None:
+            return []
+        return self._knn_search(table_key, query_vector, top_k, similarity_threshold)
 
-        except Exception as e:
-            logger.error(f"搜索科室失败: {e}")
-            raise Exception(f"搜索科室失败: {str(e)}")
+    def search_panels(
+        self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """搜索相似的科室"""
+        return self._search_by_text("panels", query_text, top_k, similarity_threshold)
 
     def search_topics(
         self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
     ) -> List[Dict[str, Any]]:
         """搜索相似的主题"""
-        try:
-            query_vector = self.embedder.generate_embedding(query_text)
-            vector_str = self._vector_to_sql(query_vector)
-
-            self._apply_pgvector_probes()
-
-            query = text(
-                f"""
-                SELECT 
-                    t.id,
-                    t.semantic_id,
-                    t.name_zh,
-                    t.name_en,
-                    t.description,
-                    p.name_zh as panel_name,
-                    (1 - (t.embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM topics t
-                LEFT JOIN panels p ON t.panel_id = p.id
-                WHERE t.embedding IS NOT NULL
-                AND (1 - (t.embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY t.embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-            """
-            )
-
-            result = self.db.execute(query)
-            topics = []
-            for row in result:
-                topics.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "name_zh": row.name_zh,
-                        "name_en": row.name_en,
-                        "description": row.description,
-                        "panel_name": row.panel_name,
-                        "similarity_score": float(row.similarity_score),
-                    }
-                )
-
-            return topics
-
-        except Exception as e:
-            logger.error(f"搜索主题失败: {e}")
-            raise Exception(f"搜索主题失败: {str(e)}")
+        return self._search_by_text("topics", query_text, top_k, similarity_threshold)
 
     def search_scenarios(
         self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
     ) -> List[Dict[str, Any]]:
         """搜索相似的临床场景"""
-        try:
-            query_vector = self.embedder.generate_embedding(query_text)
-            vector_str = self._vector_to_sql(query_vector)
-
-            self._apply_pgvector_probes()
-
-            query = text(
-                f"""
-                SELECT 
-                    s.id,
-                    s.semantic_id,
-                    s.description_zh,
-                    s.description_en,
-                    s.patient_population,
-                    s.risk_level,
-                    s.age_group,
-                    s.gender,
-                    s.urgency_level,
-                    s.symptom_category,
-                    p.name_zh as panel_name,
-                    t.name_zh as topic_name,
-                    (1 - (s.embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM clinical_scenarios s
-                LEFT JOIN panels p ON s.panel_id = p.id
-                LEFT JOIN topics t ON s.topic_id = t.id
-                WHERE s.embedding IS NOT NULL
-                AND (1 - (s.embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY s.embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-            """
-            )
-
-            result = self.db.execute(query)
-            scenarios = []
-            for row in result:
-                scenarios.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "description_zh": row.description_zh,
-                        "description_en": row.description_en,
-                        "patient_population": row.patient_population,
-                        "risk_level": row.risk_level,
-                        "age_group": row.age_group,
-                        "gender": row.gender,
-                        "urgency_level": row.urgency_level,
-                        "symptom_category": row.symptom_category,
-                        "panel_name": row.panel_name,
-                        "topic_name": row.topic_name,
-                        "similarity_score": float(row.similarity_score),
-                    }
-                )
-
-            return scenarios
-
-        except Exception as e:
-            logger.error(f"搜索临床场景失败: {e}")
-            raise Exception(f"搜索临床场景失败: {str(e)}")
+        return self._search_by_text("scenarios", query_text, top_k, similarity_threshold)
 
     def search_procedures(
         self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
     ) -> List[Dict[str, Any]]:
         """搜索相似的检查项目"""
-        try:
-            query_vector = self.embedder.generate_embedding(query_text)
-            vector_str = self._vector_to_sql(query_vector)
-
-            self._apply_pgvector_probes()
-
-            query = text(
-                f"""
-                SELECT 
-                    p.id,
-                    p.semantic_id,
-                    p.name_zh,
-                    p.name_en,
-                    p.modality,
-                    p.body_part,
-                    p.contrast_used,
-                    p.radiation_level,
-                    p.exam_duration,
-                    p.preparation_required,
-                    p.description_zh,
-                    (1 - (p.embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM procedure_dictionary p
-                WHERE p.embedding IS NOT NULL
-                AND (1 - (p.embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY p.embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-            """
-            )
-
-            result = self.db.execute(query)
-            procedures = []
-            for row in result:
-                procedures.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "name_zh": row.name_zh,
-                        "name_en": row.name_en,
-                        "modality": row.modality,
-                        "body_part": row.body_part,
-                        "contrast_used": row.contrast_used,
-                        "radiation_level": row.radiation_level,
-                        "exam_duration": row.exam_duration,
-                        "preparation_required": row.preparation_required,
-                        "description_zh": row.description_zh,
-                        "similarity_score": float(row.similarity_score),
-                    }
-                )
-
-            return procedures
-
-        except Exception as e:
-            logger.error(f"搜索检查项目失败: {e}")
-            raise Exception(f"搜索检查项目失败: {str(e)}")
+        return self._search_by_text("procedures", query_text, top_k, similarity_threshold)
 
     def search_recommendations(
         self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
     ) -> List[Dict[str, Any]]:
         """搜索相似的临床推荐"""
-        try:
-            query_vector = self.embedder.generate_embedding(query_text)
-            vector_str = self._vector_to_sql(query_vector)
-
-            self._apply_pgvector_probes()
-
-            query = text(
-                f"""
-                SELECT 
-                    cr.id,
-                    cr.semantic_id,
-                    cr.appropriateness_rating,
-                    cr.appropriateness_category_zh,
-                    cr.reasoning_zh,
-                    cr.evidence_level,
-                    cr.pregnancy_safety,
-                    cr.adult_radiation_dose,
-                    cr.pediatric_radiation_dose,
-                    s.description_zh as scenario_description,
-                    s.patient_population,
-                    s.risk_level,
-                    pd.name_zh as procedure_name,
-                    pd.modality,
-                    pd.body_part,
-                    p.name_zh as panel_name,
-                    t.name_zh as topic_name,
-                    (1 - (cr.embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM clinical_recommendations cr
-                LEFT JOIN clinical_scenarios s ON cr.scenario_id = s.semantic_id
-                LEFT JOIN procedure_dictionary pd ON cr.procedure_id = pd.semantic_id
-                LEFT JOIN panels p ON s.panel_id = p.id
-                LEFT JOIN topics t ON s.topic_id = t.id
-                WHERE cr.embedding IS NOT NULL
-                AND (1 - (cr.embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY cr.embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-            """
+        return self._search_by_text(
+            "recommendations", query_text, top_k, similarity_threshold
+        )
+
+    def _knn_search_isolated(
+        self,
+        table_key: str,
+        query_vector: Sequence[float],
+        top_k: int,
+        similarity_threshold: float,
+    ) -> List[Dict[str, Any]]:
+        """在独立会话中检索（Session 非线程安全，并发检索各用一个连接，总数受 _ISOLATED_SESSIONS 限制）。"""
+        with _ISOLATED_SESSIONS, Session(bind=self.db.get_bind()) as db:
+            return VectorSearchService(db)._knn_search(
+                table_key, query_vector, top_k, similarity_threshold
             )
 
-            result = self.db.execute(query)
-            recommendations = []
-            for row in result:
-                recommendations.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "appropriateness_rating": row.appropriateness_rating,
-                        "appropriateness_category_zh": row.appropriateness_category_zh,
-                        "reasoning_zh": row.reasoning_zh,
-                        "evidence_level": row.evidence_level,
-                        "pregnancy_safety": row.pregnancy_safety,
-                        "adult_radiation_dose": row.adult_radiation_dose,
-                        "pediatric_radiation_dose": row.pediatric_radiation_dose,
-                        "scenario_description": row.scenario_description,
-                        "patient_population": row.patient_population,
-                        "risk_level": row.risk_level,
-                        "procedure_name": row.procedure_name,
-                        "modality": row.modality,
-                        "body_part": row.body_part,
-                        "panel_name": row.panel_name,
-                        "topic_name": row.topic_name,
-                        "similarity_score": float(row.similarity_score),
-                    }
+    async def asearch_all(
+        self, query_text: str, top_k: int = 10, similarity_threshold: float = 0.0
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """只生成一次查询向量，并发检索全部五类实体（科室/主题/场景/检查/推荐）。"""
+        query_vector = await asyncio.to_thread(self.embed_query, query_text)
+        if query_vector is None:
+            return {key: [] for key in _TABLE_QUERIES}
+        results = await asyncio.gather(
+            *(
+                asyncio.to_thread(
+                    self._knn_search_isolated,
+                    key,
+                    query_vector,
+                    top_k,
+                    similarity_threshold,
                 )
-
-            return recommendations
-
-        except Exception as e:
-            logger.error(f"搜索临床推荐失败: {e}")
-            raise Exception(f"搜索临床推荐失败: {str(e)}")
+                for key in _TABLE_QUERIES
+            )
+        )
+        return dict(zip(_TABLE_QUERIES, results))
 
     # --- Enhanced helpers for production recommendation flow ---
 
@@ -399,59 +669,7 @@ class VectorSearchService:
         similarity_threshold: float = 0.0,
     ) -> List[Dict[str, Any]]:
         """复用预计算向量的场景检索。"""
-        try:
-            vector_str = self._vector_to_sql(query_vector)
-            self._apply_pgvector_probes()
-            query = text(
-                f"""
-                SELECT 
-                    s.id,
-                    s.semantic_id,
-                    s.description_zh,
-                    s.description_en,
-                    s.patient_population,
-                    s.risk_level,
-                    s.age_group,
-                    s.gender,
-                    s.urgency_level,
-                    s.symptom_category,
-                    p.name_zh as panel_name,
-                    t.name_zh as topic_name,
-                    (1 - (s.embedding <=> '{vector_str}'::vector)) as similarity_score
-                FROM clinical_scenarios s
-                LEFT JOIN panels p ON s.panel_id = p.id
-                LEFT JOIN topics t ON s.topic_id = t.id
-                WHERE s.embedding IS NOT NULL
-                AND (1 - (s.embedding <=> '{vector_str}'::vector)) >= {similarity_threshold}
-                ORDER BY s.embedding <=> '{vector_str}'::vector
-                LIMIT {top_k}
-                """
-            )
-
-            result = self.db.execute(query)
-            scenarios: List[Dict[str, Any]] = []
-            for row in result:
-                scenarios.append(
-                    {
-                        "id": row.id,
-                        "semantic_id": row.semantic_id,
-                        "description_zh": row.description_zh,
-                        "description_en": row.description_en,
-                        "patient_population": row.patient_population,
-                        "risk_level": row.risk_level,
-                        "age_group": row.age_group,
-                        "gender": row.gender,
-                        "urgency_level": row.urgency_level,
-                        "symptom_category": row.symptom_category,
-                        "panel_name": row.panel_name,
-                        "topic_name": row.topic_name,
-                        "similarity_score": float(row.similarity_score),
-                    }
-                )
-            return scenarios
-        except Exception as e:
-            logger.error(f"搜索临床场景失败: {e}")
-            raise Exception(f"搜索临床场景失败: {str(e)}")
+        return self._knn_search("scenarios", query_vector, top_k, similarity_threshold)
 
     def fetch_recommendations_for_scenarios(
         self,
@@ -463,120 +681,64 @@ class VectorSearchService:
         if not scenario_ids:
             return {}
 
-        query = text(
-            """
-            WITH ranked AS (
-                SELECT
-                    s.semantic_id AS scenario_id,
-                    s.description_zh,
-                    s.description_en,
-                    s.patient_population,
-                    s.risk_level,
-                    s.age_group,
-                    s.gender,
-                    s.urgency_level,
-                    p.name_zh AS panel_name,
-                    t.name_zh AS topic_name,
-                    cr.semantic_id AS recommendation_id,
-                    cr.appropriateness_rating,
-                    cr.appropriateness_category_zh,
-                    cr.is_active,
-                    pd.name_zh AS procedure_name,
-                    pd.modality,
-                    pd.body_part,
-                    pd.contrast_used,
-                    pd.radiation_level,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY s.semantic_id
-                        ORDER BY cr.appropriateness_rating DESC NULLS LAST, cr.id
-                    ) AS rn
-                FROM clinical_recommendations cr
-                JOIN clinical_scenarios s ON s.semantic_id = cr.scenario_id
-                JOIN procedure_dictionary pd ON pd.semantic_id = cr.procedure_id
-                LEFT JOIN topics t ON t.id = s.topic_id
-                LEFT JOIN panels p ON p.id = s.panel_id
-                WHERE s.semantic_id = ANY(:scenario_ids)
-            )
-            SELECT * FROM ranked
-            WHERE rn <= :limit
-              AND (appropriateness_rating IS NULL OR appropriateness_rating >= :min_rating)
-            ORDER BY scenario_id, rn
-            """
-        )
-
         result = self.db.execute(
-            query,
+            _SCENARIO_RECOMMENDATIONS_SQL,
             {
-                "scenario_ids": list(scenario_ids),
+                # 去重：unnest 连接不会像 ANY() 那样自动忽略重复 ID
+                "scenario_ids": list(dict.fromkeys(scenario_ids)),
                 "limit": int(max(1, top_n)),
                 "min_rating": float(min_rating or 0.0),
             },
         )
 
         data: Dict[str, Dict[str, Any]] = {}
-        for row in result:
-            scenario_id = row.scenario_id
+        for row in result.mappings():
+            scenario_id = row["scenario_id"]
             scenario_entry = data.setdefault(
                 scenario_id,
                 {
                     "scenario": {
                         "semantic_id": scenario_id,
-                        "description_zh": row.description_zh,
-                        "description_en": row.description_en,
-                        "patient_population": row.patient_population,
-                        "risk_level": row.risk_level,
-                        "age_group": row.age_group,
-                        "gender": row.gender,
-                        "urgency_level": row.urgency_level,
-                        "panel_name": row.panel_name,
-                        "topic_name": row.topic_name,
+                        "description_zh": row["description_zh"],
+                        "description_en": row["description_en"],
+                        "patient_population": row["patient_population"],
+                        "risk_level": row["risk_level"],
+                        "age_group": row["age_group"],
+                        "gender": row["gender"],
+                        "urgency_level": row["urgency_level"],
+                        "panel_name": row["panel_name"],
+                        "topic_name": row["topic_name"],
                     },
                     "recommendations": [],
                 },
             )
             scenario_entry["recommendations"].append(
                 {
-                    "recommendation_id": row.recommendation_id,
-                    "procedure_name": row.procedure_name,
-                    "modality": row.modality,
-                    "body_part": row.body_part,
-                    "contrast_used": row.contrast_used,
-                    "radiation_level": row.radiation_level,
-                    "appropriateness_rating": float(row.appropriateness_rating)
-                    if row.appropriateness_rating is not None
-                    else None,
-                    "appropriateness_category": row.appropriateness_category_zh,
+                    "recommendation_id": row["recommendation_id"],
+                    "procedure_name": row["procedure_name"],
+                    "modality": row["modality"],
+                    "body_part": row["body_part"],
+                    "contrast_used": row["contrast_used"],
+                    "radiation_level": row["radiation_level"],
+                    "appropriateness_rating": row["appropriateness_rating"],
+                    "appropriateness_category": row["appropriateness_category_zh"],
                 }
             )
         return data
 
     def get_database_stats(self) -> Dict[str, Any]:
-        """获取数据库统计信息"""
+        """获取数据库统计信息（单次查询返回各表总数、向量数与估算行数）"""
         try:
             stats = {}
-
-            # 统计各表记录数
-            tables = [
-                "panels",
-                "topics",
-                "clinical_scenarios",
-                "procedure_dictionary",
-                "clinical_recommendations",
-            ]
-            for table in tables:
-                query = text(f"SELECT COUNT(*) as count FROM {table}")
-                result = self.db.execute(query)
-                count = result.scalar()
-                stats[f"{table}_count"] = count
-
+            result = self.db.execute(_DATABASE_STATS_SQL)
+            for row in result:
+                count = row.total_count or 0
+                stats[f"{row.table_name}_count"] = count
+                # pg_class.reltuples 为估算值（未 ANALYZE 时为 -1/0）
+                stats[f"{row.table_name}_approx_count"] = max(int(row.approx_count or 0), 0)
                 # 统计向量覆盖率
-                query = text(
-                    f"SELECT COUNT(*) as count FROM {table} WHERE embedding IS NOT NULL"
-                )
-                result = self.db.execute(query)
-                vector_count = result.scalar()
-                coverage = (vector_count / count * 100) if count > 0 else 0
-                stats[f"{table}_vector_coverage"] = round(coverage, 2)
+                coverage = (row.vector_count / count * 100) if count > 0 else 0
+                stats[f"{row.table_name}_vector_coverage"] = round(coverage, 2)
 
             return stats
 
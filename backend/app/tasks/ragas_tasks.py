@@ -1,19 +1,66 @@
 from celery import current_task
+from celery.signals import task_postrun, worker_process_init
 from app.celery_app import celery_app
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
 import logging
 import asyncio
+import threading
 import time as _time
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import scoped_session
 
 from app.core.database import SessionLocal
-from app.models.ragas_models import EvaluationTask
 from app.schemas.ragas_schemas import TaskStatus
-from app.services.ragas_service import run_real_rag_evaluation
+from app.services.ragas_service import (
+    run_real_rag_evaluation, overall_ragas_score, DEFAULT_EVAL_CONCURRENCY, TASK_BY_ID_STMT
+)
 
 logger = logging.getLogger(__name__)
 
+# 每个 worker 进程复用一个常驻事件循环（后台线程），避免每个任务 asyncio.run 重建循环，
+# 使协程内的 HTTP 连接池、TLS 会话在任务之间保持可用
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+# 任务内共用的会话（线程级），成功与失败路径复用同一会话，任务结束后统一释放
+TaskSession = scoped_session(SessionLocal)
+
+
+@task_postrun.connect
+def _remove_task_session(**kwargs):
+    TaskSession.remove()
+
+
+@worker_process_init.connect
+def _warmup_metric_agg(**kwargs):
+    """worker 进程启动时预热指标聚合（numba JIT 编译/加载缓存）"""
+    try:
+        from app.services.metric_agg import warmup
+        warmup()
+    except Exception as e:
+        logger.warning(f"指标聚合预热失败: {e}")
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """惰性创建常驻事件循环（fork 之后在子进程内首次调用时创建）"""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(
+                target=_LOOP.run_forever, name="ragas-event-loop", daemon=True
+            ).start()
+        return _LOOP
+
+
+def _run_async(coro):
+    """在常驻事件循环上执行协程并同步等待结果"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
 @celery_app.task(bind=True)
 def process_rag_llm_inference(self, scenario_data: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -172,52 +219,54 @@ def process_batch_evaluation(self, task_id: str, scenarios: List[Dict[str, Any]]
     try:
         total_scenarios = len(scenarios) if scenarios else 0
 
-        # 标记任务开始，读取配置
-        db = SessionLocal()
+        # 分三个阶段使用数据库，长时间的推理/评分期间不占用连接：
+        # (1) 读取配置并标记开始 → 提交并归还连接
+        # (2) 执行评测：会话仅在批量写进度/结果时短暂取连接，提交后即归还
+        # (3) 重新读取任务写入最终状态 → 提交
+        db = TaskSession()
         try:
-            task = db.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
+            task = db.execute(TASK_BY_ID_STMT, {"tid": task_id}).scalar_one_or_none()
             if not task:
                 raise ValueError(f"任务不存在: {task_id}")
 
             model_name = None
             base_url = None
+            concurrency = None
             if task.evaluation_config and isinstance(task.evaluation_config, dict):
                 model_name = task.evaluation_config.get("model_name")
                 base_url = task.evaluation_config.get("base_url")
+                concurrency = task.evaluation_config.get("concurrency")
 
+            # 开始时刻只取一次墙钟时间，耗时用单调时钟计算
+            started_at = datetime.now()
+            start_perf = _time.perf_counter()
             task.status = TaskStatus.PROCESSING
-            task.started_at = datetime.now()
+            task.started_at = started_at
             task.progress_percentage = 0.0
             db.commit()
+            db.close()
 
-            # 统一构造测试用例
-            test_cases = []
-            for i, s in enumerate(scenarios or []):
-                test_cases.append({
-                    "question_id": s.get("question_id") or s.get("scenario_id") or f"case_{i+1}",
-                    "question": s.get("clinical_query") or s.get("question") or s.get("clinical_scenario") or "",
-                    "ground_truth": s.get("ground_truth") or s.get("standard_answer") or "",
-                    "metadata": s.get("metadata") or {}
-                })
-
-            start_ts = _time.time()
-
-            result = asyncio.run(run_real_rag_evaluation(
-                test_cases=test_cases,
+            # 场景字典直接作为测试用例传入：字段别名（clinical_query/question、scenario_id 等）
+            # 由 run_real_rag_evaluation 统一解析，无需再复制一份用例列表
+            result = _run_async(run_real_rag_evaluation(
+                test_cases=scenarios or [],
                 model_name=model_name or "unknown",
                 base_url=base_url,
                 task_id=task_id,
-                db=db
+                db=db,
+                concurrency=concurrency or DEFAULT_EVAL_CONCURRENCY,
             ))
 
-            duration = _time.time() - start_ts
+            duration = _time.perf_counter() - start_perf
 
+            task = db.execute(TASK_BY_ID_STMT, {"tid": task_id}).scalar_one_or_none()
+            if not task:
+                raise ValueError(f"任务不存在: {task_id}")
             task.status = TaskStatus.COMPLETED if result.get("status") == "success" else TaskStatus.FAILED
             task.completed_scenarios = result.get("completed_cases", 0)
             task.failed_scenarios = result.get("failed_cases", 0)
             task.progress_percentage = 100.0
-            task.completed_at = datetime.now()
-            # removed: task.processing_time (no such ORM field)
+            task.completed_at = started_at + timedelta(seconds=duration)
             if result.get("status") != "success":
                 task.error_message = result.get("error")
             # 若有平均分统计则写入
@@ -227,15 +276,7 @@ def process_batch_evaluation(self, task_id: str, scenarios: List[Dict[str, Any]]
                 task.avg_answer_relevancy = summary.get("answer_relevancy")
                 task.avg_context_precision = summary.get("context_precision")
                 task.avg_context_recall = summary.get("context_recall")
-                try:
-                    task.avg_overall_score = (
-                        (task.avg_faithfulness or 0) +
-                        (task.avg_answer_relevancy or 0) +
-                        (task.avg_context_precision or 0) +
-                        (task.avg_context_recall or 0)
-                    ) / 4.0
-                except Exception:
-                    task.avg_overall_score = None
+                task.avg_overall_score = overall_ragas_score(summary)
 
             db.commit()
 
@@ -245,7 +286,8 @@ def process_batch_evaluation(self, task_id: str, scenarios: List[Dict[str, Any]]
                 "completed_scenarios": result.get("completed_cases", 0),
                 "individual_results": result.get("results", []),
                 "summary_statistics": result.get("summary"),
-                "status": result.get("status")
+                "status": result.get("status"),
+                "processing_time": round(duration, 3),
             }
 
             self.update_state(
@@ -264,16 +306,16 @@ def process_batch_evaluation(self, task_id: str, scenarios: List[Dict[str, Any]]
     except Exception as exc:
         logger.error(f"批量评估失败: {str(exc)}")
         try:
-            db2 = SessionLocal()
+            db = TaskSession()
             try:
-                task = db2.query(EvaluationTask).filter(EvaluationTask.task_id == task_id).first()
+                task = db.execute(TASK_BY_ID_STMT, {"tid": task_id}).scalar_one_or_none()
                 if task:
                     task.status = TaskStatus.FAILED
                     task.completed_at = datetime.now()
                     task.error_message = str(exc)
-                    db2.commit()
+                    db.commit()
             finally:
-                db2.close()
+                db.close()
         except Exception:
             pass
 
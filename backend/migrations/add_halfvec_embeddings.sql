@@ -0,0 +1,29 @@
+-- 为向量表添加 halfvec(FP16) 生成列与 ivfflat 索引，用于两阶段检索（粗排 FP16 + 精排 FP32）
+-- 需要 pgvector >= 0.7；执行后设置 PGVECTOR_HALFVEC_RERANK=true 启用
+-- 创建时间: 2026-10-17
+
+ALTER TABLE panels
+ADD COLUMN IF NOT EXISTS embedding_hv halfvec(1024) GENERATED ALWAYS AS (embedding::halfvec(1024)) STORED;
+ALTER TABLE topics
+ADD COLUMN IF NOT EXISTS embedding_hv halfvec(1024) GENERATED ALWAYS AS (embedding::halfvec(1024)) STORED;
+ALTER TABLE clinical_scenarios
+ADD COLUMN IF NOT EXISTS embedding_hv halfvec(1024) GENERATED ALWAYS AS (embedding::halfvec(1024)) STORED;
+ALTER TABLE procedure_dictionary
+ADD COLUMN IF NOT EXISTS embedding_hv halfvec(1024) GENERATED ALWAYS AS (embedding::halfvec(1024)) STORED;
+ALTER TABLE clinical_recommendations
+ADD COLUMN IF NOT EXISTS embedding_hv halfvec(1024) GENERATED ALWAYS AS (embedding::halfvec(1024)) STORED;
+
+SET maintenance_work_mem = '256MB';
+
+CREATE INDEX IF NOT EXISTS idx_panels_embedding_hv
+ON panels USING ivfflat (embedding_hv halfvec_cosine_ops) WITH (lists = 50);
+CREATE INDEX IF NOT EXISTS idx_topics_embedding_hv
+ON topics USING ivfflat (embedding_hv halfvec_cosine_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS idx_scenarios_embedding_hv
+ON clinical_scenarios USING ivfflat (embedding_hv halfvec_cosine_ops) WITH (lists = 200);
+CREATE INDEX IF NOT EXISTS idx_procedures_embedding_hv
+ON procedure_dictionary USING ivfflat (embedding_hv halfvec_cosine_ops) WITH (lists = 200);
+CREATE INDEX IF NOT EXISTS idx_recommendations_embedding_hv
+ON clinical_recommendations USING ivfflat (embedding_hv halfvec_cosine_ops) WITH (lists = 400);
+
+ANALYZE panels, topics, clinical_scenarios, procedure_dictionary, clinical_recommendations;
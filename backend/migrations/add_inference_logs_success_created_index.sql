@@ -0,0 +1,8 @@
+-- 为运行历史列表（WHERE success = true ORDER BY created_at DESC, id DESC LIMIT n）添加部分索引
+-- 只索引成功的运行，按索引倒序扫描取前 n 行，免去全表扫描 + top-N 排序
+-- 列表查询读取整行（含 result JSON），故不加 INCLUDE，取出的少量行回表即可
+-- 创建时间: 2026-10-17
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_inference_logs_success_created
+ON inference_logs (created_at DESC, id DESC)
+WHERE success = true;
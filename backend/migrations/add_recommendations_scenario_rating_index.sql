@@ -0,0 +1,5 @@
+-- 为按场景取评分最高推荐（LATERAL TOP-N）添加复合索引
+-- 创建时间: 2026-10-17
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_recommendations_scenario_rating
+ON clinical_recommendations (scenario_id, appropriateness_rating DESC NULLS LAST, id);
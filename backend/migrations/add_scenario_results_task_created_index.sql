@@ -0,0 +1,6 @@
+-- 为按任务查询最近评测结果（WHERE task_id = ? ORDER BY created_at DESC LIMIT n）添加复合索引
+-- evaluation_tasks.task_id 已有唯一约束索引，无需重复创建
+-- 创建时间: 2026-10-17
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_scenario_results_task_created
+ON scenario_results (task_id, created_at);
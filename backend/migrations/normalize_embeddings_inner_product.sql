@@ -0,0 +1,71 @@
+-- 向量归一化 + 内积索引：归一化后余弦距离排序不变，可用 <#>（负内积）代替 <=>
+-- 需要 pgvector >= 0.7（l2_normalize）；执行后设置 PGVECTOR_INNER_PRODUCT=true 启用
+-- 创建时间: 2026-10-17
+
+-- 入库时自动归一化
+CREATE OR REPLACE FUNCTION normalize_embedding() RETURNS trigger AS $$
+BEGIN
+    IF NEW.embedding IS NOT NULL THEN
+        NEW.embedding := l2_normalize(NEW.embedding);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'panels', 'topics', 'clinical_scenarios', 'procedure_dictionary', 'clinical_recommendations'
+    ]
+    LOOP
+        -- 归一化存量向量
+        EXECUTE format(
+            'UPDATE %I SET embedding = l2_normalize(embedding) WHERE embedding IS NOT NULL', t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_normalize_embedding ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_normalize_embedding BEFORE INSERT OR UPDATE OF embedding '
+            'ON %I FOR EACH ROW EXECUTE FUNCTION normalize_embedding()', t, t
+        );
+    END LOOP;
+END;
+$$;
+
+SET maintenance_work_mem = '256MB';
+
+CREATE INDEX IF NOT EXISTS idx_panels_embedding_ip
+ON panels USING ivfflat (embedding vector_ip_ops) WITH (lists = 50);
+CREATE INDEX IF NOT EXISTS idx_topics_embedding_ip
+ON topics USING ivfflat (embedding vector_ip_ops) WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS idx_scenarios_embedding_ip
+ON clinical_scenarios USING ivfflat (embedding vector_ip_ops) WITH (lists = 200);
+CREATE INDEX IF NOT EXISTS idx_procedures_embedding_ip
+ON procedure_dictionary USING ivfflat (embedding vector_ip_ops) WITH (lists = 200);
+CREATE INDEX IF NOT EXISTS idx_recommendations_embedding_ip
+ON clinical_recommendations USING ivfflat (embedding vector_ip_ops) WITH (lists = 400);
+
+-- 若已执行 add_halfvec_embeddings.sql，为 halfvec 生成列补充内积索引
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'panels', 'topics', 'clinical_scenarios', 'procedure_dictionary', 'clinical_recommendations'
+    ]
+    LOOP
+        IF EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = t AND column_name = 'embedding_hv'
+        ) THEN
+            EXECUTE format(
+                'CREATE INDEX IF NOT EXISTS idx_%s_embedding_hv_ip ON %I '
+                'USING ivfflat (embedding_hv halfvec_ip_ops) WITH (lists = 100)', t, t
+            );
+        END IF;
+    END LOOP;
+END;
+$$;
+
+ANALYZE panels, topics, clinical_scenarios, procedure_dictionary, clinical_recommendations;
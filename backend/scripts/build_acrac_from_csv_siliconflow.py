@@ -368,6 +368,7 @@ class ACRACBuilder:
                 "CREATE INDEX idx_recommendations_scenario ON clinical_recommendations (scenario_id);",
                 "CREATE INDEX idx_recommendations_procedure ON clinical_recommendations (procedure_id);",
                 "CREATE INDEX idx_recommendations_rating ON clinical_recommendations (appropriateness_rating);",
+                "CREATE INDEX idx_recommendations_scenario_rating ON clinical_recommendations (scenario_id, appropriateness_rating DESC NULLS LAST, id);",
                 "CREATE UNIQUE INDEX idx_panels_name_unique ON panels (name_en, name_zh);",
                 "CREATE UNIQUE INDEX idx_topics_name_unique ON topics (panel_id, name_en, name_zh);",
                 "CREATE UNIQUE INDEX idx_scenarios_desc_unique ON clinical_scenarios (topic_id, description_en, description_zh);",
@@ -16,11 +16,20 @@ import os
 import json
 import argparse
 import datetime as dt
+from collections import defaultdict
 from typing import Any, Dict, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+
+# rows fetched per round-trip by server-side cursors
+ITERSIZE = 500
 
 TABLES = [
     "panels",
@@ -42,6 +51,15 @@ def connect_db():
     return psycopg2.connect(**cfg)
 
 
+def write_json(path: str, obj: Any) -> None:
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2, default=str)
+
+
 def ensure_dir(path: str):
     os.makedirs(path, exist_ok=True)
 
@@ -53,17 +71,32 @@ def export_table_csv(cur, table: str, out_dir: str):
     return path
 
 
-def get_schema(cur, table: str) -> List[Dict[str, Any]]:
+def get_schemas(cur, tables: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Column schema for all tables in one information_schema round-trip."""
     cur.execute(
         """
-        SELECT column_name, data_type, is_nullable
+        SELECT table_name, column_name, data_type, is_nullable
         FROM information_schema.columns
-        WHERE table_schema='public' AND table_name=%s
-        ORDER BY ordinal_position
+        WHERE table_schema='public' AND table_name = ANY(%s)
+        ORDER BY table_name, ordinal_position
         """,
-        (table,),
+        (list(tables),),
     )
-    return [dict(r) for r in cur.fetchall()]
+    schemas: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for r in cur.fetchall():
+        r = dict(r)
+        schemas[r.pop("table_name")].append(r)
+    return schemas
+
+
+def get_counts(cur, tables: List[str]) -> Dict[str, Dict[str, int]]:
+    """Row count and embedding coverage for all tables in a single query."""
+    cur.execute(
+        " UNION ALL ".join(
+            f"SELECT '{t}' AS t, COUNT(*) AS c, COUNT(embedding) AS e FROM {t}" for t in tables
+        )
+    )
+    return {r["t"]: {"count": r["c"], "embedding": r["e"]} for r in cur.fetchall()}
 
 
 def extract_modalities_and_parts(name_en: str, name_zh: str) -> Tuple[set, set]:
@@ -116,22 +149,12 @@ def parse_contrast(name_en: str, name_zh: str) -> Optional[bool]:
 def calc_metrics(cur) -> Dict[str, Any]:
     metrics: Dict[str, Any] = {"tables": {}, "quality": {}}
 
-    # counts and schema
-    for t in TABLES:
-        cur.execute(f"SELECT COUNT(*) AS c FROM {t};")
-        cnt = (cur.fetchone() or {}).get("c", 0)
-        schema = get_schema(cur, t)
-        metrics["tables"][t] = {"count": cnt, "schema": schema}
-
-    # embedding coverage per table
-    emb_cov: Dict[str, int] = {}
+    # counts, schema and embedding coverage (one query each, not one per table)
+    counts = get_counts(cur, TABLES)
+    schemas = get_schemas(cur, TABLES)
     for t in TABLES:
-        try:
-            cur.execute(f"SELECT COUNT(embedding) AS c FROM {t};")
-            emb_cov[t] = (cur.fetchone() or {}).get("c", 0)
-        except Exception:
-            emb_cov[t] = 0
-    metrics["quality"]["embedding_coverage"] = emb_cov
+        metrics["tables"][t] = {"count": counts.get(t, {}).get("count", 0), "schema": schemas.get(t, [])}
+    metrics["quality"]["embedding_coverage"] = {t: counts.get(t, {}).get("embedding", 0) for t in TABLES}
 
     # orphan recommendations
     cur.execute(
@@ -143,31 +166,38 @@ def calc_metrics(cur) -> Dict[str, Any]:
     )
     metrics["quality"]["orphan_recommendations"] = (cur.fetchone() or {}).get("c", 0)
 
-    # procedure_dictionary attribute completeness + multi-values
-    cur.execute(
-        """
-        SELECT modality, body_part, contrast_used, radiation_level, name_en, name_zh
-        FROM procedure_dictionary;
-        """
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    total = len(rows)
-    mv_mod = sum(1 for r in rows if (r.get('modality') or '').find('|') >= 0)
-    mv_bp = sum(1 for r in rows if (r.get('body_part') or '').find('|') >= 0)
-    mv_rad = sum(1 for r in rows if (r.get('radiation_level') or '').find('|') >= 0)
-    nn_mod = sum(1 for r in rows if (r.get('modality') or '') != '')
-    nn_bp = sum(1 for r in rows if (r.get('body_part') or '') != '')
-    nn_con = sum(1 for r in rows if r.get('contrast_used') is not None)
-    nn_rad = sum(1 for r in rows if (r.get('radiation_level') or '') != '')
-    # cross-check contrast vs names (positive keyword implies should_be_true)
+    # procedure_dictionary attribute completeness + multi-values.
+    # Streamed through a server-side (named) cursor in ITERSIZE batches and tallied
+    # in a single pass, so client memory stays flat regardless of table size.
+    # Plain tuple rows (no per-row dict) since the six columns are fixed.
+    total = mv_mod = mv_bp = mv_rad = nn_mod = nn_bp = nn_con = nn_rad = 0
     pos_should_true = 0
     pos_but_false = 0
-    for r in rows:
-        inferred = parse_contrast(r.get('name_en'), r.get('name_zh'))
-        if inferred is True:
-            pos_should_true += 1
-            if r.get('contrast_used') is False:
-                pos_but_false += 1
+    with cur.connection.cursor(name="audit_procedure_attrs") as scan:
+        scan.itersize = ITERSIZE
+        scan.execute(
+            """
+            SELECT modality, body_part, contrast_used, radiation_level, name_en, name_zh
+            FROM procedure_dictionary;
+            """
+        )
+        for modality, body_part, contrast_used, radiation, name_en, name_zh in scan:
+            total += 1
+            modality = modality or ''
+            body_part = body_part or ''
+            radiation = radiation or ''
+            mv_mod += '|' in modality
+            mv_bp += '|' in body_part
+            mv_rad += '|' in radiation
+            nn_mod += modality != ''
+            nn_bp += body_part != ''
+            nn_con += contrast_used is not None
+            nn_rad += radiation != ''
+            # cross-check contrast vs names (positive keyword implies should_be_true)
+            if parse_contrast(name_en, name_zh) is True:
+                pos_should_true += 1
+                if contrast_used is False:
+                    pos_but_false += 1
     metrics["quality"]["procedure_attributes"] = {
         "total": total,
         "non_null": {"modality": nn_mod, "body_part": nn_bp, "contrast_used": nn_con, "radiation_level": nn_rad},
@@ -216,8 +246,7 @@ def snapshot(out_dir: Optional[str] = None) -> str:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             metrics = calc_metrics(cur)
     audit_path = os.path.join(base, f"db_audit_{ts}.json")
-    with open(audit_path, "w", encoding="utf-8") as f:
-        json.dump(metrics, f, ensure_ascii=False, indent=2)
+    write_json(audit_path, metrics)
     print(f"Snapshot saved to: {base}")
     return audit_path
 
@@ -13,19 +13,33 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-import pandas as pd
+from openpyxl import load_workbook
 from app.services.ragas_service import run_real_rag_evaluation
 
 
+def _cell(row, header, name):
+    i = header.get(name)
+    value = row[i] if i is not None and i < len(row) else None
+    return '' if value is None else str(value)
+
+
 def build_cases_from_excel(xlsx_path: Path, limit: int = 5):
-    df = pd.read_excel(xlsx_path).head(limit)
-    cases = []
-    for _, row in df.iterrows():
-        cases.append({
-            'question_id': str(row.get('题号', '')),
-            'clinical_query': str(row.get('临床场景', '')),
-            'ground_truth': str(row.get('首选检查项目（标准化）', '')),
-        })
+    # Read only the first `limit` data rows; no pandas needed for a handful of cases
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = {str(c): i for i, c in enumerate(next(rows, ())) if c is not None}
+        cases = []
+        for row in rows:
+            if len(cases) >= limit:
+                break
+            cases.append({
+                'question_id': _cell(row, header, '题号'),
+                'clinical_query': _cell(row, header, '临床场景'),
+                'ground_truth': _cell(row, header, '首选检查项目（标准化）'),
+            })
+    finally:
+        wb.close()
     return cases
 
 
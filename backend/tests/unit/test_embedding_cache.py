@@ -0,0 +1,39 @@
+from app.services.embedding_cache import EmbeddingCache
+
+
+class _FakePipeline:
+    def __init__(self, store):
+        self.store = store
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    def execute(self):
+        pass
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self.store)
+
+
+def test_embed_only_requests_misses_once():
+    calls = []
+
+    def _embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 0.5] for t in texts]
+
+    cache = EmbeddingCache(_FakeRedis(), ttl=60)
+    first = cache.embed(["a", "bb", "a"], "m", _embed)
+    second = cache.embed(["bb", "ccc"], "m", _embed)
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]]
+    assert second == [[2.0, 0.5], [3.0, 0.5]]
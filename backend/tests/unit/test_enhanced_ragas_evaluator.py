@@ -0,0 +1,192 @@
+import asyncio
+import importlib
+import json
+import sys
+import types
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+
+@dataclass
+class _Sample:
+    user_input: str = ""
+    response: str = ""
+    retrieved_contexts: List[str] = field(default_factory=list)
+    reference: str = ""
+
+
+class _Message:
+    def __init__(self, content):
+        self.content = content
+
+
+def _stub_modules():
+    """ragas / langchain 未安装时用最小桩模块替代，只覆盖评估器导入所需的名字。"""
+    stubs = {}
+    try:
+        import ragas.dataset_schema  # noqa: F401
+    except ImportError:
+        stubs["ragas"] = types.ModuleType("ragas")
+        stubs["ragas.dataset_schema"] = types.SimpleNamespace(SingleTurnSample=_Sample)
+        stubs["ragas.metrics"] = types.SimpleNamespace(
+            Faithfulness=object, ContextPrecision=object, ContextRecall=object
+        )
+    try:
+        import langchain_openai  # noqa: F401
+        import langchain.schema  # noqa: F401
+    except ImportError:
+        stubs["langchain_openai"] = types.SimpleNamespace(ChatOpenAI=object, OpenAIEmbeddings=object)
+        stubs["langchain"] = types.ModuleType("langchain")
+        stubs["langchain.schema"] = types.SimpleNamespace(HumanMessage=_Message, SystemMessage=_Message)
+    return stubs
+
+
+@pytest.fixture(scope="module")
+def ere():
+    stubs = _stub_modules()
+    saved = {name: sys.modules.get(name) for name in stubs}
+    sys.modules.update(stubs)
+    sys.modules.pop("app.services.enhanced_ragas_evaluator", None)
+    try:
+        yield importlib.import_module("app.services.enhanced_ragas_evaluator")
+    finally:
+        sys.modules.pop("app.services.enhanced_ragas_evaluator", None)
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+
+class _FakeLLM:
+    """按系统提示词返回预设内容；值为异常时抛出。"""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.calls = []
+
+    async def ainvoke(self, messages):
+        system = messages[0].content
+        self.calls.append(system)
+        reply = self.replies[system]
+        if isinstance(reply, Exception):
+            raise reply
+        return types.SimpleNamespace(content=reply)
+
+
+def _evaluator(ere, replies, score_db_path=None):
+    ev = object.__new__(ere.EnhancedRAGASEvaluator)
+    ev.evaluation_config = ere.EvaluationConfig(score_db_path=score_db_path)
+    ev.llm_json = _FakeLLM(replies)
+    ev._score_cache = {}
+    ev.score_store = ere.ScoreStore(score_db_path) if score_db_path else None
+    return ev
+
+
+_FUSED = {"faithfulness": 0.9, "context_precision": 0.7, "context_recall": 0.5, "answer_relevancy": 0.6}
+
+
+def _sample(question="头痛如何检查", answer="推荐头颅CT", reference=""):
+    return _Sample(question, answer, ["场景: 神经 - 头痛"], reference)
+
+
+def test_fused_scores_are_used_and_cached(ere):
+    ev = _evaluator(ere, {ere._ALL_METRICS_RUBRIC: json.dumps(_FUSED)})
+    sample = _sample()
+
+    first = asyncio.run(ev.evaluate_sample(sample))
+    second = asyncio.run(ev.evaluate_sample(sample))
+
+    assert first == second
+    assert first["faithfulness"] == 0.9 and first["context_precision"] == 0.7
+    # 无标准答案时召回率走启发式（以答案作参考且未出现在上下文中 → 0.6）
+    assert first["context_recall"] == 0.6
+    assert ev.llm_json.calls == [ere._ALL_METRICS_RUBRIC]
+
+
+def test_fused_parse_failure_falls_back_to_per_metric(ere):
+    ev = _evaluator(ere, {
+        ere._ALL_METRICS_RUBRIC: "not json",
+        ere._FAITHFULNESS_RUBRIC: json.dumps({"faithfulness_score": 0.8}),
+        ere._CONTEXT_PRECISION_RUBRIC: json.dumps({"precision_score": 0.6}),
+        ere._ANSWER_RELEVANCY_RUBRIC: json.dumps({"relevancy_score": 0.7}),
+    })
+
+    scores = asyncio.run(ev.evaluate_sample(_sample()))
+
+    assert scores["faithfulness"] == 0.8
+    assert scores["answer_relevancy"] == 0.7
+    assert ev.llm_json.calls[0] == ere._ALL_METRICS_RUBRIC
+    assert set(ev.llm_json.calls[1:]) == {
+        ere._FAITHFULNESS_RUBRIC, ere._CONTEXT_PRECISION_RUBRIC, ere._ANSWER_RELEVANCY_RUBRIC
+    }
+    assert len(ev._score_cache) == 1
+
+
+def test_llm_errors_are_not_cached(ere):
+    error = RuntimeError("timeout")
+    ev = _evaluator(ere, {
+        ere._ALL_METRICS_RUBRIC: error,
+        ere._FAITHFULNESS_RUBRIC: error,
+        ere._CONTEXT_PRECISION_RUBRIC: error,
+        ere._ANSWER_RELEVANCY_RUBRIC: error,
+    })
+
+    scores = asyncio.run(ev.evaluate_sample(_sample()))
+
+    assert scores["faithfulness"] == 0.0
+    assert ev._score_cache == {}
+
+
+def test_fast_path_skips_llm(ere):
+    ev = _evaluator(ere, {})
+
+    empty = asyncio.run(ev.evaluate_sample(_sample(answer="")))
+    placeholder = asyncio.run(ev.evaluate_sample(
+        ev.create_sample({"question": "头痛 检查", "answer": "头痛 CT", "contexts": []})
+    ))
+
+    assert empty == dict.fromkeys(ev._enabled_metrics(), 0.0)
+    assert placeholder["faithfulness"] == 0.0 and placeholder["context_recall"] == 0.0
+    assert placeholder["answer_relevancy"] == 0.5
+    assert ev.llm_json.calls == []
+
+
+def test_evaluate_batch_dedups_and_keeps_input_order(ere, tmp_path):
+    ev = _evaluator(ere, {}, score_db_path=str(tmp_path / "scores.db"))
+    seen = []
+
+    async def _fake_evaluate(sample):
+        seen.append(sample.response)
+        await asyncio.sleep(0.01 if sample.response == "a" else 0)
+        return dict.fromkeys(ere._SCORE_COLUMNS, 1.0 if sample.response == "a" else 0.5)
+
+    ev.evaluate_sample = _fake_evaluate
+    samples = [_sample(answer=a) for a in ("a", "b", "a", "c")]
+
+    out = asyncio.run(ev.evaluate_batch(samples, concurrency=2, task_id="t1"))
+
+    assert sorted(seen) == ["a", "b", "c"]
+    assert [r["faithfulness"] for r in out] == [1.0, 0.5, 1.0, 0.5]
+    assert out[0] is not out[2]
+    rows = list(ev.score_store.iter_scores("t1"))
+    assert [r["sample_idx"] for r in rows] == [0, 1, 2, 3]
+    assert ev.score_store.averages("t1")["faithfulness"] == pytest.approx(0.75)
+    ev.score_store.close()
+
+
+def test_score_store_persist_replaces_and_averages(ere, tmp_path):
+    store = ere.ScoreStore(str(tmp_path / "scores.db"))
+    store.persist("t", 0, {"faithfulness": 0.2, "context_recall": 1.0})
+    store.persist("t", 0, {"faithfulness": 0.4, "context_recall": 1.0})
+    store.persist("t", 1, {"faithfulness": 0.8})
+    store.persist("other", 0, {"faithfulness": 0.0})
+
+    averages = store.averages("t")
+
+    assert averages["faithfulness"] == pytest.approx(0.6)
+    assert averages["context_recall"] == pytest.approx(1.0)
+    assert averages["answer_relevancy"] is None
+    store.close()
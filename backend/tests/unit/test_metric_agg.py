@@ -0,0 +1,16 @@
+import numpy as np
+
+from app.services.metric_agg import nanmean_columns, overlap_ratio, token_ids
+
+
+def test_nanmean_columns_matches_numpy():
+    scores = np.array([[1.0, np.nan, 0.5], [0.0, np.nan, 1.0], [0.5, np.nan, np.nan]])
+    out = nanmean_columns(scores)
+    assert out[0] == 0.5 and np.isnan(out[1]) and out[2] == 0.75
+
+
+def test_overlap_ratio_counts_unique_query_tokens():
+    q = token_ids(["头痛", "ct", "头痛", "mri"])
+    assert overlap_ratio(q, token_ids(["ct", "mri", "头痛", "x"])) == 1.0
+    assert overlap_ratio(q, token_ids(["ct"])) == 1 / 3
+    assert overlap_ratio(token_ids([]), token_ids(["ct"])) == 0.0
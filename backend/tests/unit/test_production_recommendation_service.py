@@ -0,0 +1,35 @@
+import pytest
+
+import app.services.vector_search_service as vss
+from app.services.production_recommendation_service import ProductionRecommendationService
+from app.services.vector_search_service import EmbeddingError
+
+
+class _FailingEmbedder:
+    def generate_embedding(self, text):
+        raise EmbeddingError("offline")
+
+
+class _NoSQLSession:
+    def execute(self, *a, **kw):  # pragma: no cover - 不应被调用
+        raise AssertionError("recommend must not hit the DB on embedding failure")
+
+
+def _service():
+    svc = ProductionRecommendationService(_NoSQLSession())
+    svc._vector_service.embedder = _FailingEmbedder()
+    return svc
+
+
+def test_recommend_degrades_to_empty_result_when_not_strict(monkeypatch):
+    monkeypatch.setattr(vss, "STRICT_EMBEDDING", False)
+    out = _service().recommend("头痛", top_k=3)
+    assert out["recommendations"] == [] and out["scenarios"] == []
+    assert out["mode"] == "embedding-unavailable"
+    assert out["top_k"] == 3
+
+
+def test_recommend_raises_in_strict_mode(monkeypatch):
+    monkeypatch.setattr(vss, "STRICT_EMBEDDING", True)
+    with pytest.raises(EmbeddingError):
+        _service().recommend("头痛")
@@ -0,0 +1,185 @@
+import asyncio
+
+import app.services.ragas_service as rs
+
+
+def test_run_real_rag_evaluation_bounds_each_stage_and_keeps_order(monkeypatch):
+    infer = {"now": 0, "peak": 0}
+    score = {"now": 0, "peak": 0}
+
+    async def _track(stage, delay):
+        stage["now"] += 1
+        stage["peak"] = max(stage["peak"], stage["now"])
+        await asyncio.sleep(delay)
+        stage["now"] -= 1
+
+    async def _fake_infer(i, case, *args):
+        await _track(infer, 0.01 * (5 - i % 5))
+        return None if case["question"] == "fail" else {"rag_result": {}}
+
+    async def _fake_score(i, case, inferred, *args):
+        await _track(score, 0.02)
+        return {"result": {"question_id": case["question_id"]}, "record": {}}
+
+    monkeypatch.setattr(rs, "_infer_case", _fake_infer)
+    monkeypatch.setattr(rs, "_score_case", _fake_score)
+    cases = [{"question_id": f"q{i}", "question": "fail" if i == 3 else f"ok{i}"} for i in range(10)]
+    out = asyncio.run(rs.run_real_rag_evaluation(cases, model_name="m", concurrency=3))
+
+    assert infer["peak"] == 3 and score["peak"] == 3
+    assert [r["question_id"] for r in out["results"]] == [f"q{i}" for i in range(10) if i != 3]
+    assert out["completed_cases"] == 9 and out["failed_cases"] == 1
+
+
+def test_run_real_rag_evaluation_scores_duplicate_cases_once(monkeypatch):
+    seen = []
+
+    async def _fake_infer(i, case, *args):
+        seen.append(case["question_id"])
+        return {"rag_result": {}}
+
+    async def _fake_score(i, case, inferred, *args):
+        return {"result": {"question_id": case["question_id"]}, "record": {"scenario_id": case["question_id"]}}
+
+    monkeypatch.setattr(rs, "_infer_case", _fake_infer)
+    monkeypatch.setattr(rs, "_score_case", _fake_score)
+    cases = [
+        {"question_id": "a", "question": "头痛", "ground_truth": "CT"},
+        {"question_id": "b", "question": "胸痛", "ground_truth": "CT"},
+        {"question_id": "c", "question": "头痛", "ground_truth": "CT"},
+    ]
+    out = asyncio.run(rs.run_real_rag_evaluation(cases, model_name="m"))
+
+    assert sorted(seen) == ["a", "b"]
+    assert [r["question_id"] for r in out["results"]] == ["a", "b", "c"]
+    assert out["completed_cases"] == 3
+
+
+class _ProgressDB:
+    def __init__(self):
+        self.pending = []
+        self.commits = []
+
+    def bulk_insert_mappings(self, model, rows):
+        self.pending.extend(row["scenario_id"] for row in rows)
+
+    def execute(self, stmt, params=None):
+        return type("R", (), {"scalar_one_or_none": lambda self: None})()
+
+    def commit(self):
+        self.commits.append(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def test_run_real_rag_evaluation_writes_results_with_each_progress_commit(monkeypatch):
+    async def _fake_infer(i, case, *args):
+        return {"rag_result": {}}
+
+    async def _fake_score(i, case, inferred, *args):
+        return {"result": {"question_id": case["question_id"]}, "record": {"scenario_id": case["question_id"]}}
+
+    monkeypatch.setattr(rs, "_infer_case", _fake_infer)
+    monkeypatch.setattr(rs, "_score_case", _fake_score)
+    monkeypatch.setattr(rs, "_PROGRESS_COMMIT_EVERY", 5)
+    cases = [{"question_id": f"q{i}", "question": f"ok{i}"} for i in range(12)]
+    db = _ProgressDB()
+    asyncio.run(rs.run_real_rag_evaluation(cases, model_name="m", task_id="t", db=db, concurrency=1))
+
+    # 每次进度提交都带上此前完成的结果，不会等到整个任务结束才落库
+    assert [len(rows) for rows in db.commits[:3]] == [5, 5, 2]
+    assert sorted(sum(db.commits, [])) == sorted(c["question_id"] for c in cases)
+
+
+def test_rag_http_client_is_shared_per_event_loop():
+    async def _get_twice():
+        return rs.get_rag_http_client(), rs.get_rag_http_client()
+
+    first, again = asyncio.run(_get_twice())
+    other, _ = asyncio.run(_get_twice())
+    assert first is again
+    assert other is not first
+
+
+def test_summarize_ragas_scores_ignores_nan_and_missing():
+    results = [
+        {"ragas_scores": {"faithfulness": 1.0, "answer_relevancy": float("nan"), "context_precision": 0.5}},
+        {"ragas_scores": {"faithfulness": 0.5, "answer_relevancy": 0.8, "context_precision": 0.0}},
+    ]
+    summary = rs.summarize_ragas_scores(results)
+    assert summary == {
+        "faithfulness": 0.75,
+        "answer_relevancy": 0.8,
+        "context_precision": 0.25,
+        "context_recall": None,
+    }
+    assert rs.overall_ragas_score(summary) == (0.75 + 0.8 + 0.25) / 3
+
+
+
+def test_build_answer_text_and_contexts_take_top_three():
+    rag_result = {
+        "llm_recommendations": {
+            "recommendations": [
+                {"procedure_name": f"P{i}", "appropriateness_rating": i} for i in range(1, 5)
+            ]
+        },
+        "scenarios": [
+            {"panel_name": "神经", "topic_name": "头痛", "clinical_scenario": "成人急性头痛"},
+            {"panel_name": "胸部", "topic_name": "胸痛"},
+        ],
+    }
+    assert rs.build_answer_text(rag_result) == (
+        "推荐的影像学检查：\n- P1 (适宜性: 1)\n- P2 (适宜性: 2)\n- P3 (适宜性: 3)"
+    )
+    assert rs.build_contexts(rag_result) == [
+        "场景: 神经 - 头痛\n临床场景: 成人急性头痛",
+        "场景: 胸部 - 胸痛",
+    ]
+    assert rs.build_answer_text({}) == "暂无推荐的影像学检查"
+    assert rs.build_contexts(None) == []
+
+
+def test_fetch_rag_result_reuses_cached_response(monkeypatch):
+    posts = []
+
+    class _Resp:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"n": len(posts)}
+
+    class _Client:
+        async def post(self, url, json=None):
+            posts.append(json)
+            return _Resp()
+
+    monkeypatch.setattr(rs.settings, "RAG_EVAL_RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(rs, "_get_rag_response_redis", lambda: None)
+    monkeypatch.setattr(rs, "_rag_response_memo", rs.OrderedDict())
+
+    async def _run():
+        client = _Client()
+        a = await rs.fetch_rag_result(client, "http://rag", {"clinical_query": "头痛"})
+        b = await rs.fetch_rag_result(client, "http://rag", {"clinical_query": "头痛"})
+        c = await rs.fetch_rag_result(client, "http://rag", {"clinical_query": "胸痛"})
+        return a, b, c
+
+    a, b, c = asyncio.run(_run())
+    assert a == b == {"n": 1} and c == {"n": 2}
+    assert len(posts) == 2
+
+
+def test_build_contexts_from_payload_dedups_in_first_seen_order():
+    from app.services.rag.ragas_eval import build_contexts_from_payload
+
+    payload = {
+        "scenarios_with_recommendations": [
+            {"description_zh": "头痛", "recommendations": [{"reasoning_zh": "首选CT"}, {"reasoning_zh": "首选CT"}]},
+        ],
+        "scenarios": [{"description_zh": "头痛"}, {"description_zh": "胸痛"}],
+    }
+    assert build_contexts_from_payload(payload) == ["头痛", "首选CT", "胸痛"]
@@ -0,0 +1,296 @@
+import pytest
+
+import app.services.vector_search_service as vss
+from app.services.vector_search_service import EmbeddingError, VectorSearchService
+
+
+class _FailingEmbedder:
+    def generate_embedding(self, text):
+        raise EmbeddingError("offline")
+
+
+class _NoSQLSession:
+    def execute(self, *a, **kw):  # pragma: no cover - 不应被调用
+        raise AssertionError("vector search must not hit the DB on embedding failure")
+
+
+def _svc():
+    svc = VectorSearchService(_NoSQLSession())
+    svc.embedder = _FailingEmbedder()
+    return svc
+
+
+def test_embedding_failure_raises_in_strict_mode(monkeypatch):
+    monkeypatch.setattr(vss, "STRICT_EMBEDDING", True)
+    with pytest.raises(EmbeddingError):
+        _svc().search_panels("头痛")
+
+
+def test_embedding_failure_returns_empty_when_not_strict(monkeypatch):
+    monkeypatch.setattr(vss, "STRICT_EMBEDDING", False)
+    svc = _svc()
+    assert svc.search_scenarios("头痛") == []
+    assert svc.search_recommendations("头痛") == []
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class _FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        self.calls.append(json["input"])
+        data = [
+            {"index": i, "embedding": [float(len(t))]} for i, t in enumerate(json["input"])
+        ]
+        return _FakeResponse({"data": list(reversed(data))})
+
+
+def test_generate_embeddings_batches_and_preserves_order():
+    embedder = vss.SiliconFlowEmbedder(api_key="x")
+    embedder._session = _FakeSession()
+    out = embedder.generate_embeddings(["a", "bb", "ccc"], batch_size=2)
+    assert out == [[1.0], [2.0], [3.0]]
+    assert embedder._session.calls == [["a", "bb"], ["ccc"]]
+
+
+def test_vector_literal_is_compact_pgvector_literal():
+    assert vss._vector_literal([0.1, -0.25, 1e-8, 3]) == "[0.1,-0.25,1e-08,3]"
+
+
+def test_query_param_is_adapted_by_psycopg2():
+    from psycopg2.extensions import adapt
+
+    param = _svc()._query_param([0.6, 0.8])
+    assert adapt(param).getquoted() == b"'[0.6,0.8]'"
+
+
+def test_plain_ndarray_keeps_default_adaptation():
+    import numpy as np
+    from psycopg2 import ProgrammingError
+    from psycopg2.extensions import adapt
+
+    with pytest.raises(ProgrammingError):
+        adapt(np.zeros(2, dtype=np.float32))
+
+
+def test_probes_follow_sqrt_lists_heuristic(monkeypatch):
+    monkeypatch.setattr(
+        vss, "_IVFFLAT_LISTS", {
+            ("panels", "vector_cosine_ops"): 100,
+            ("clinical_scenarios", "vector_cosine_ops"): 2500,
+            ("topics", "vector_cosine_ops"): None,
+        }
+    )
+    svc = _svc()
+    svc.pgvector_probes = 5
+    assert svc._probes_for("panels", 10) == 10
+    assert svc._probes_for("clinical_scenarios", 10) == 50
+    assert svc._probes_for("topics", 10) == 5
+
+
+class _FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return list(self._rows)
+
+
+class _RecordingSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+        self.info = {}
+        self.transaction = None
+
+    def get_transaction(self):
+        return self.transaction
+
+    def execute(self, stmt, params=None):
+        if self.transaction is None:
+            self.transaction = object()  # 模拟 autobegin
+        self.statements.append((str(stmt), params))
+        return _FakeResult(self.rows if "knn" in str(stmt) else [])
+
+
+def test_probes_are_reset_after_a_lowered_set_local_in_same_transaction(monkeypatch):
+    monkeypatch.setattr(vss, "_IVFFLAT_LISTS", {("panels", "vector_cosine_ops"): 4, ("topics", "vector_cosine_ops"): None})
+    monkeypatch.setattr(vss.settings, "PGVECTOR_PROBES", 20)
+    db = _RecordingSession([])
+    svc = VectorSearchService(db)
+    svc.pgvector_probes = 20
+
+    def probes_sets():
+        return [sql for sql, _ in db.statements if "ivfflat.probes" in sql]
+
+    svc._knn_search("panels", [0.1, 0.2], 5, 0.0)
+    svc._knn_search("panels", [0.1, 0.2], 5, 0.0)
+    assert probes_sets() == ["SET LOCAL ivfflat.probes = 4"]
+
+    svc._knn_search("topics", [0.1, 0.2], 5, 0.0)
+    assert probes_sets()[-1] == "SET LOCAL ivfflat.probes = 20"
+
+    # 新事务中 SET LOCAL 已失效，默认值无需再设置
+    db.statements.clear()
+    db.transaction = object()
+    svc._knn_search("topics", [0.1, 0.2], 5, 0.0)
+    assert probes_sets() == []
+
+
+class _CatalogSession:
+    """lists 查询按需失败；记录 SAVEPOINT 的进入与回滚。"""
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.params = []
+        self.savepoints = []
+
+    def begin_nested(self):
+        session = self
+
+        class _Savepoint:
+            def __enter__(self):
+                session.savepoints.append("begin")
+
+            def __exit__(self, exc_type, *exc):
+                session.savepoints.append("rollback" if exc_type else "release")
+
+        return _Savepoint()
+
+    def execute(self, stmt, params=None):
+        self.params.append(params)
+        if self.fail:
+            raise RuntimeError("permission denied for pg_opclass")
+        return _FakeResult([(["lists=100"],), (None,)])
+
+
+def test_ivfflat_lists_failure_is_isolated_and_not_cached(monkeypatch):
+    monkeypatch.setattr(vss, "_IVFFLAT_LISTS", {})
+    db = _CatalogSession(fail=True)
+    assert VectorSearchService(db)._ivfflat_lists("panels") is None
+    assert db.savepoints == ["begin", "rollback"]
+    assert vss._IVFFLAT_LISTS == {}
+
+    db.fail = False
+    assert VectorSearchService(db)._ivfflat_lists("panels") == 100
+    assert vss._IVFFLAT_LISTS == {("panels", "vector_cosine_ops"): 100}
+
+
+def test_ivfflat_lists_filters_by_active_opclass(monkeypatch):
+    monkeypatch.setattr(vss, "_IVFFLAT_LISTS", {})
+    monkeypatch.setattr(vss.settings, "PGVECTOR_HALFVEC_RERANK", True)
+    monkeypatch.setattr(vss.settings, "PGVECTOR_INNER_PRODUCT", True)
+    db = _CatalogSession(fail=False)
+    VectorSearchService(db)._ivfflat_lists("topics")
+    assert db.params == [{"table": "topics", "opclass": "halfvec_ip_ops"}]
+
+
+def test_search_scenarios_by_vector_binds_params_and_shapes_rows(monkeypatch):
+    monkeypatch.setattr(vss, "_IVFFLAT_LISTS", {("clinical_scenarios", "vector_cosine_ops"): None})
+    row = {"id": 1, "semantic_id": "S0001", "panel_name": "神经", "similarity_score": 0.75}
+    db = _RecordingSession([row])
+    svc = VectorSearchService(db)
+    out = svc.search_scenarios_by_vector([0.1, 0.2], top_k=3, similarity_threshold=0.5)
+    assert out == [row]
+    sql, params = db.statements[-1]
+    assert "FROM clinical_scenarios" in sql
+    assert params["top_k"] == 3 and params["sim"] == 0.5
+    assert list(params["qv"].values) == pytest.approx([0.4472136, 0.8944272])
+    assert ">= :sim" in sql
+
+    svc.search_scenarios_by_vector([0.1, 0.2], top_k=3)
+    assert ">= :sim" not in db.statements[-1][0]
+
+
+def test_asearch_all_embeds_once_and_searches_every_table(monkeypatch):
+    import asyncio
+
+    calls = []
+
+    class _CountingEmbedder:
+        def generate_embedding(self, text):
+            calls.append(text)
+            return [0.1, 0.2]
+
+    svc = VectorSearchService(_NoSQLSession())
+    svc.embedder = _CountingEmbedder()
+    monkeypatch.setattr(
+        svc, "_knn_search_isolated", lambda key, vec, k, thr: [{"table": key}]
+    )
+    out = asyncio.run(svc.asearch_all("头痛", top_k=3))
+    assert calls == ["头痛"]
+    assert sorted(out) == sorted(vss._TABLE_QUERIES)
+    assert out["procedures"] == [{"table": "procedures"}]
+
+
+def test_asearch_all_caps_concurrent_isolated_sessions(monkeypatch):
+    import asyncio
+    import threading
+    import time
+
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    class _TrackingSession:
+        def __init__(self, bind=None):
+            pass
+
+        def __enter__(self):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            return self
+
+        def __exit__(self, *exc):
+            with lock:
+                active.pop()
+
+    class _Bindable(_NoSQLSession):
+        def get_bind(self):
+            return None
+
+    monkeypatch.setattr(vss, "_ISOLATED_SESSIONS", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(vss, "Session", _TrackingSession)
+    monkeypatch.setattr(VectorSearchService, "_knn_search", lambda self, key, vec, k, thr: [key])
+    svc = VectorSearchService(_Bindable())
+    svc.embedder = type("E", (), {"generate_embedding": lambda self, t: [0.1, 0.2]})()
+    out = asyncio.run(svc.asearch_all("头痛"))
+    assert out["panels"] == ["panels"]
+    assert max(peak) <= 2
+
+
+def test_halfvec_rerank_uses_two_stage_sql(monkeypatch):
+    monkeypatch.setattr(vss, "_IVFFLAT_LISTS", {("panels", "halfvec_cosine_ops"): None})
+    monkeypatch.setattr(vss.settings, "PGVECTOR_HALFVEC_RERANK", True)
+    db = _RecordingSession([])
+    VectorSearchService(db)._knn_search("panels", [0.1, 0.2], 5, 0.0)
+    sql, params = db.statements[-1]
+    assert "ORDER BY embedding_hv <=>" in sql
+    assert params["overfetch"] >= 1
+
+
+def test_query_param_is_l2_normalized():
+    import numpy as np
+
+    param = _svc()._query_param([3.0, 4.0])
+    assert param.values.dtype == np.float32
+    assert list(param.values) == pytest.approx([0.6, 0.8])